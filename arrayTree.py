@@ -0,0 +1,292 @@
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import binaryTree
+import lang
+
+# Array-backed storage for Boolean expressions.
+#
+# An ArrayTree stores an expression as parallel arrays instead of one
+# object per node:
+#
+#     op[i]     -- the opcode of node i (see below)
+#     left[i]   -- the index of the left operand of node i, or the index
+#                  of the variable when node i is a variable
+#     right[i]  -- the index of the right operand of node i
+#
+# Nodes are stored in postorder, so the operands of a node always come
+# before it and the root is the last node. Evaluation is therefore a
+# single forward sweep over the arrays, and a node takes 13 bytes (with
+# its level, below) rather than a Python object with a dictionary of
+# attributes.
+#
+# Each node also records its level: leaves are at level 0 and every
+# other node is one above its highest operand. Nodes at the same level
+# do not depend on each other. With NumPy, evaluate_batch evaluates all
+# nodes of a level at once, over a batch of assignments packed 64 to a
+# word, so the number of Python-level steps is the height of the tree
+# rather than its size. NumPy is optional; without it, batches are
+# packed into Python ints and evaluated node by node.
+#
+# Expressions can be built from postfix strings (see constructTree in
+# binaryTree.py), by the infix parser (an ArrayTree can be passed to
+# infix.parse as its builder), or converted from binaryTree nodes and
+# expressions of the root language.
+
+# Opcodes
+FALSE = 0
+TRUE = 1
+VAR = 2
+NOT = 3
+AND = 4
+OR = 5
+
+class ArrayTree:
+    def __init__(self):
+        self.op = array('b')
+        self.left = array('i')
+        self.right = array('i')
+        self.level = array('i')
+
+        # The variables, in order of first use, and their indexes.
+        self.names = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.op)
+
+    def add(self, op, l, r):
+        # Appends a node and returns its index. The operands must
+        # already have been added.
+        if op in (NOT, AND, OR):
+            h = self.level[l]
+            if op != NOT:
+                h = max(h, self.level[r])
+            self.level.append(h + 1)
+        else:
+            self.level.append(0)
+        self.op.append(op)
+        self.left.append(l)
+        self.right.append(r)
+        return len(self.op) - 1
+
+    def const(self, b):
+        return self.add(TRUE if b else FALSE, -1, -1)
+
+    def var(self, name):
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        return self.add(VAR, self.index[name], -1)
+
+    def not_(self, e):
+        return self.add(NOT, e, -1)
+
+    def and_(self, lhs, rhs):
+        return self.add(AND, lhs, rhs)
+
+    def or_(self, lhs, rhs):
+        return self.add(OR, lhs, rhs)
+
+    def root(self):
+        return len(self.op) - 1
+
+    def nbytes(self):
+        # The memory used by the node arrays, in bytes.
+        return sum(a.itemsize * len(a) for a in
+                   (self.op, self.left, self.right, self.level))
+
+def construct(postfix):
+    # Returns the ArrayTree of a postfix expression (see constructTree
+    # in binaryTree.py).
+    t = ArrayTree()
+    binaryTree.constructTree(postfix, t)
+    return t
+
+def from_tree(e):
+    # Returns the ArrayTree of a binaryTree expression. The operand of
+    # '!' may be in either child.
+    t = ArrayTree()
+    index = {}
+    stack = [(e, False)]
+    while stack:
+        n, done = stack.pop()
+        if n in index:
+            # A shared node, already converted.
+            continue
+        if not done:
+            stack.append((n, True))
+            for c in (n.right, n.left):
+                if c is not None:
+                    stack.append((c, False))
+            continue
+        if n.value == 'T' or n.value == 'F':
+            index[n] = t.const(n.value == 'T')
+        elif n.value == '!':
+            x = n.right if n.right is not None else n.left
+            index[n] = t.not_(index[x])
+        elif n.value == '^':
+            index[n] = t.and_(index[n.left], index[n.right])
+        elif n.value == 'v':
+            index[n] = t.or_(index[n.left], index[n.right])
+        else:
+            index[n] = t.var(n.value)
+    return t
+
+def from_expr(e):
+    # Returns the ArrayTree of an expression in the root language.
+    t = ArrayTree()
+    index = {}
+    stack = [(e, False)]
+    while stack:
+        n, done = stack.pop()
+        if id(n) in index:
+            # A shared subexpression (e.g., from dag.Interner), already
+            # converted.
+            continue
+        if type(n) is lang.BoolExpr:
+            index[id(n)] = t.const(n.value)
+        elif type(n) is lang.VarExpr:
+            index[id(n)] = t.var(n.name)
+        elif not done:
+            stack.append((n, True))
+            if type(n) is lang.NotExpr:
+                stack.append((n.expr, False))
+            else:
+                stack.append((n.rhs, False))
+                stack.append((n.lhs, False))
+        elif type(n) is lang.NotExpr:
+            index[id(n)] = t.not_(index[id(n.expr)])
+        elif type(n) is lang.AndExpr:
+            index[id(n)] = t.and_(index[id(n.lhs)], index[id(n.rhs)])
+        elif type(n) is lang.OrExpr:
+            index[id(n)] = t.or_(index[id(n.lhs)], index[id(n.rhs)])
+        else:
+            raise Exception(f"invalid expression {n}")
+    return t
+
+def evaluate(t, env = {}):
+    # Returns the value of t (a Python bool) when its variables have
+    # the values in env (a mapping from names to bools).
+    return bool(sweep(t, [1 if env[n] else 0 for n in t.names], 1))
+
+def sweep(t, inputs, ones):
+    # Evaluates every node of t in order, where the values are packed
+    # into ints (bit i is the value in assignment i) and ones has a bit
+    # set for each assignment. Returns the value of the root.
+    op = t.op
+    left = t.left
+    right = t.right
+    vals = [0] * len(op)
+    for i in range(len(op)):
+        o = op[i]
+        if o == AND:
+            vals[i] = vals[left[i]] & vals[right[i]]
+        elif o == OR:
+            vals[i] = vals[left[i]] | vals[right[i]]
+        elif o == NOT:
+            vals[i] = ones ^ vals[left[i]]
+        elif o == VAR:
+            vals[i] = inputs[left[i]]
+        elif o == TRUE:
+            vals[i] = ones
+    return vals[-1]
+
+def schedule(t):
+    # Returns, for each level, the arrays of NOT, AND and OR nodes at
+    # that level (as NumPy index arrays).
+    if len(t) == 0:
+        return []
+    op = numpy.frombuffer(t.op, dtype = numpy.int8)
+    level = numpy.frombuffer(t.level, dtype = numpy.int32)
+    order = numpy.argsort(level, kind = "stable")
+    bounds = numpy.searchsorted(level[order], numpy.arange(level.max() + 2))
+    levels = []
+    for k in range(1, len(bounds) - 1):
+        nodes = order[bounds[k]:bounds[k + 1]]
+        ops = op[nodes]
+        levels.append((nodes[ops == NOT], nodes[ops == AND], nodes[ops == OR]))
+    return levels
+
+def evaluate_batch(t, inputs):
+    # Evaluates t for a batch of assignments. inputs is a sequence of
+    # rows, one per assignment, each giving the values of t.names in
+    # order. Returns the list of values.
+    n = len(inputs)
+    if numpy is None:
+        # Pack each variable's column into an int.
+        cols = [0] * len(t.names)
+        for i, row in enumerate(inputs):
+            for k, v in enumerate(row):
+                if v:
+                    cols[k] |= 1 << i
+        root = sweep(t, cols, (1 << n) - 1)
+        return [bool((root >> i) & 1) for i in range(n)]
+
+    # Pack the columns into 64-bit words: cols[k, w] holds assignments
+    # 64w to 64w+63 of variable k.
+    rows = numpy.asarray(inputs, dtype = bool).reshape(n, len(t.names))
+    cols = numpy.packbits(rows.T, axis = 1, bitorder = "little")
+    pad = (-cols.shape[1]) % 8
+    cols = numpy.ascontiguousarray(numpy.pad(cols, ((0, 0), (0, pad))))
+    cols = cols.view(numpy.uint64)
+
+    op = numpy.frombuffer(t.op, dtype = numpy.int8)
+    left = numpy.frombuffer(t.left, dtype = numpy.int32)
+    right = numpy.frombuffer(t.right, dtype = numpy.int32)
+    vals = numpy.zeros((len(t), cols.shape[1]), dtype = numpy.uint64)
+    vals[op == TRUE] = ~numpy.uint64(0)
+    leaves = numpy.nonzero(op == VAR)[0]
+    vals[leaves] = cols[left[leaves]]
+    for nots, ands, ors in schedule(t):
+        vals[nots] = ~vals[left[nots]]
+        vals[ands] = vals[left[ands]] & vals[right[ands]]
+        vals[ors] = vals[left[ors]] | vals[right[ors]]
+    root = numpy.unpackbits(vals[-1].view(numpy.uint8), bitorder = "little")
+    return root[:n].astype(bool).tolist()
+
+if __name__ == "__main__":
+    # Compare the memory and evaluation time of object trees and array
+    # trees for a balanced million-node formula.
+    import random
+    import sys
+    import time
+    import tracemalloc
+
+
+    def formula(depth, rng):
+        # A balanced postfix formula over 16 variables.
+        if depth == 0:
+            return rng.choice("abcdefghijklmnop")
+        s = formula(depth - 1, rng) + formula(depth - 1, rng)
+        return s + rng.choice("^v") + ("!" if rng.random() < 0.2 else "")
+
+    rng = random.Random(0)
+    postfix = formula(19, rng)
+
+    tracemalloc.start()
+    tree = binaryTree.constructTree(postfix)
+    tree_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t = construct(postfix)
+    print(f"nodes:        {len(t)}")
+    print(f"object tree:  {tree_bytes / len(t):.1f} bytes/node")
+    print(f"array tree:   {t.nbytes() / len(t):.1f} bytes/node")
+
+    batch = [[rng.random() < 0.5 for _ in t.names] for _ in range(256)]
+    t0 = time.perf_counter()
+    values = evaluate_batch(t, batch)
+    t1 = time.perf_counter()
+    print(f"batch of {len(batch)}: {t1 - t0:.3f}s "
+          f"({'numpy' if numpy is not None else 'ints'})")
+
+    t0 = time.perf_counter()
+    for row in batch[:4]:
+        env = dict(zip(t.names, row))
+        assert evaluate(t, env) == values[batch.index(row)]
+    t1 = time.perf_counter()
+    print(f"one at a time: {(t1 - t0) / 4:.3f}s per assignment")
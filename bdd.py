@@ -0,0 +1,252 @@
+"""Reduced ordered binary decision diagrams (BDDs).
+
+A BDD represents a Boolean function as a directed acyclic graph. Each
+internal node tests a variable and has two children: lo (the function
+when the variable is false) and hi (when it is true). The leaves are
+the constants false and true. Variables are tested in a fixed order
+along every path, and no node is redundant (lo and hi differ) or
+duplicated (the unique table shares equal nodes). Under these rules,
+every function has exactly one BDD. Two expressions are equivalent
+exactly when their BDDs are the same node, which is a constant time
+check once the BDDs are built.
+
+Nodes are identified by integers: 0 is false, 1 is true, and every
+other node is an index into the node table of its BDD manager. All
+nodes that are compared or combined must come from the same manager.
+
+Operations are built on if-then-else (ITE), whose results are kept in
+a bounded cache. Satisfiability, model counting and finding a model
+take time proportional to the size of the BDD, not to the 2^n rows of
+its truth table.
+"""
+
+from collections import OrderedDict
+
+from lang import *
+
+# The terminal nodes.
+FALSE = 0
+TRUE = 1
+
+class BDD:
+    """A BDD manager, which owns the nodes of a set of BDDs that share
+    a variable order."""
+
+    def __init__(self, names = [], cache_size = 1 << 16):
+        # The variables, in order. Variables not given here are added
+        # to the end of the order when first used.
+        self.names = []
+        self.levels = {}
+
+        # The node table. Node u tests the variable at level[u] and has
+        # the children low[u] and high[u]. Terminals are at a level
+        # past every variable.
+        self.level = [None, None]
+        self.low = [None, None]
+        self.high = [None, None]
+
+        # The unique table maps (level, lo, hi) to a node.
+        self.unique = {}
+
+        # The ITE cache, ordered from least to most recently used.
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        for n in names:
+            self.declare(n)
+
+    def declare(self, name):
+        """Returns the level of the variable name, adding it to the end
+        of the order if it is new."""
+        if name not in self.levels:
+            self.levels[name] = len(self.names)
+            self.names.append(name)
+        return self.levels[name]
+
+    def top(self, u):
+        """Returns the level of the variable tested by u."""
+        if u <= TRUE:
+            return len(self.names)
+        return self.level[u]
+
+    def node(self, k, lo, hi):
+        """Returns the node testing level k with children lo and hi."""
+        if lo == hi:
+            return lo
+        key = (k, lo, hi)
+        u = self.unique.get(key)
+        if u is None:
+            u = len(self.level)
+            self.level.append(k)
+            self.low.append(lo)
+            self.high.append(hi)
+            self.unique[key] = u
+        return u
+
+    def var(self, name):
+        """Returns the BDD of the variable name."""
+        return self.node(self.declare(name), FALSE, TRUE)
+
+    def cofactors(self, u, k):
+        """Returns the children of u with respect to level k. If u does
+        not test k, both children are u."""
+        if self.top(u) == k:
+            return self.low[u], self.high[u]
+        return u, u
+
+    def ite(self, f, g, h):
+        """Returns the BDD of 'if f then g else h'."""
+        # Terminal cases.
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+
+        key = (f, g, h)
+        r = self.cache.get(key)
+        if r is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return r
+        self.misses += 1
+
+        # Split on the first variable tested by any operand.
+        k = min(self.top(f), self.top(g), self.top(h))
+        f0, f1 = self.cofactors(f, k)
+        g0, g1 = self.cofactors(g, k)
+        h0, h1 = self.cofactors(h, k)
+        r = self.node(k, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+
+        self.cache[key] = r
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+            self.evictions += 1
+        return r
+
+    def not_(self, f):
+        return self.ite(f, FALSE, TRUE)
+
+    def and_(self, f, g):
+        return self.ite(f, g, FALSE)
+
+    def or_(self, f, g):
+        return self.ite(f, TRUE, g)
+
+    def from_expr(self, e):
+        """Returns the BDD of an expression in the root language."""
+        if type(e) is BoolExpr:
+            return TRUE if e.value else FALSE
+        if type(e) is VarExpr:
+            return self.var(e.name)
+        if type(e) is NotExpr:
+            return self.not_(self.from_expr(e.expr))
+        if type(e) is AndExpr:
+            return self.and_(self.from_expr(e.lhs), self.from_expr(e.rhs))
+        if type(e) is OrExpr:
+            return self.or_(self.from_expr(e.lhs), self.from_expr(e.rhs))
+        raise Exception(f"invalid expression {e}")
+
+    def from_tree(self, e):
+        """Returns the BDD of a binaryTree expression. Operators are '!'
+        (not), '^' (and) and 'v' (or), the constants are 'T' and 'F',
+        and any other value is a variable. The operand of '!' may be in
+        either child."""
+        if e.value == 'T':
+            return TRUE
+        if e.value == 'F':
+            return FALSE
+        if e.value == '!':
+            x = e.right if e.right is not None else e.left
+            return self.not_(self.from_tree(x))
+        if e.value == '^':
+            return self.and_(self.from_tree(e.left), self.from_tree(e.right))
+        if e.value == 'v':
+            return self.or_(self.from_tree(e.left), self.from_tree(e.right))
+        return self.var(e.value)
+
+    def equivalent(self, e1, e2):
+        """Returns true if the expressions e1 and e2 have the same value
+        for every assignment of their variables."""
+        return self.from_expr(e1) == self.from_expr(e2)
+
+    def size(self, u):
+        """Returns the number of nodes reachable from u, including
+        terminals."""
+        seen = set()
+        work = [u]
+        while work:
+            v = work.pop()
+            if v in seen:
+                continue
+            seen.add(v)
+            if v > TRUE:
+                work.append(self.low[v])
+                work.append(self.high[v])
+        return len(seen)
+
+    def count(self, u):
+        """Returns the number of assignments to all declared variables
+        that satisfy u."""
+        memo = {FALSE: 0, TRUE: 1}
+        def walk(v):
+            # The number of assignments to the variables at the level of
+            # v and below that satisfy v.
+            if v not in memo:
+                k = self.level[v]
+                lo = self.low[v]
+                hi = self.high[v]
+                memo[v] = (walk(lo) << (self.top(lo) - k - 1)) + \
+                          (walk(hi) << (self.top(hi) - k - 1))
+            return memo[v]
+        return walk(u) << self.top(u)
+
+    def satisfiable(self, u):
+        """Returns true if some assignment satisfies u."""
+        return u != FALSE
+
+    def model(self, u):
+        """Returns an assignment (of the variables tested along a path)
+        that satisfies u, or None if u is unsatisfiable."""
+        if u == FALSE:
+            return None
+        env = {}
+        while u > TRUE:
+            name = self.names[self.level[u]]
+            if self.low[u] != FALSE:
+                env[name] = False
+                u = self.low[u]
+            else:
+                env[name] = True
+                u = self.high[u]
+        return env
+
+if __name__ == "__main__":
+    # Check De Morgan's law on a large formula. Its truth table has
+    # 2^64 rows, but its BDD has only a few nodes per variable.
+    import time
+
+    xs = [VarExpr(f"x{k}") for k in range(64)]
+    lhs = NotExpr(xs[0])
+    rhs = xs[0]
+    for x in xs[1:]:
+        lhs = OrExpr(lhs, NotExpr(x))
+        rhs = AndExpr(rhs, x)
+    rhs = NotExpr(rhs)
+
+    b = BDD()
+    t0 = time.perf_counter()
+    f = b.from_expr(lhs)
+    g = b.from_expr(rhs)
+    t1 = time.perf_counter()
+    print(f"equivalent:  {f == g} in {t1 - t0:.4f}s")
+    print(f"size:        {b.size(f)} nodes")
+    print(f"models:      {b.count(f)} of {2 ** len(xs)}")
+    print(f"cache:       {b.hits} hits, {b.misses} misses, "
+          f"{b.evictions} evictions")
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks for every language in the repository.
+#
+# Each package is measured over a fixed corpus of generated programs
+# (see generate.py in each package) in three classes of size: small,
+# medium and large. Programs are generated from fixed seeds, so every
+# run measures the same programs. For each phase of the package's
+# pipeline (resolve, check, instantiate, evaluate, reduce, ...) the
+# benchmark records:
+#
+#   time   -- the wall time of the phase over the corpus, in seconds
+#             (the best of several runs)
+#   peak   -- the peak memory allocated during the phase, in bytes
+#             (measured with tracemalloc, in a separate run)
+#   steps  -- the number of calls of the phase's main function, which
+#             visits each node (e.g. evaluate), or of step for reduction
+#             (counted in a separate run)
+#
+# The packages have modules with the same names (lang, check, ...), so
+# each package is measured in its own worker process, which imports
+# the package's modules from its directory.
+#
+# Usage:
+#
+#   python bench.py [--out FILE]                 run, optionally saving
+#   python bench.py --compare BASE [CURRENT]     compare with a baseline
+#
+# In compare mode, the current results are read from CURRENT, or
+# measured when it is not given (and saved with --out). A measure is a
+# regression when it exceeds the baseline by more than the threshold
+# (10% by default). Times below --min-time are too noisy to compare.
+# The exit status is 1 when there are regressions.
+
+PACKAGES = ["root", "tbn", "tlbn", "tlbnr", "tlbnrd", "f", "ulb"]
+
+# The number of programs and their size (in nodes) in each class.
+SIZES = {
+    "small": (20, 100),
+    "medium": (5, 5000),
+    "large": (1, 50000),
+}
+
+MEASURES = ["time", "peak", "steps"]
+
+def corpus(package, count, size):
+    # Returns the programs of a class (as text for the root language).
+    # The package's lang module imports its generate module.
+    import lang
+    import generate
+    if package == "root":
+        text = generate.TextBuilder()
+        return [generate.generate(size, seed, 0, text) for seed in range(count)]
+    return [generate.generate(size, seed) for seed in range(count)]
+
+def then(fn):
+    # Returns a phase that calls fn on a program and passes the program
+    # on to the next phase.
+    def run(e):
+        fn(e)
+        return e
+    return run
+
+def reduction(module):
+    # Returns a phase that reduces a program to a value, one step at a
+    # time. The reduce functions print each step, so they are not used.
+    def run(e):
+        v = e
+        while not module.is_value(v):
+            v = module.step(v)
+        return e
+    return run
+
+def phases(package, nodes, scratch):
+    # Returns the phases of a package for programs of about nodes nodes,
+    # as a list of triples (name, run, hook), where run maps a program
+    # to the input of the next phase and hook is the (module, function)
+    # whose calls are the steps. Phases that write files write them in
+    # the directory scratch.
+    import lang
+
+    if package == "root":
+        import infix
+        return [
+            ("parse", lambda e: infix.parse(e, infix.ExprBuilder()), None),
+            ("reduce", then(lang.reduce), (lang, "step")),
+        ]
+
+    import evaluate
+    if package == "tbn":
+        import check
+        import reduce
+        return [
+            ("check", then(lang.check), (check, "check")),
+            ("evaluate", then(lang.evaluate), (evaluate, "evaluate")),
+            ("reduce", reduction(reduce), (reduce, "step")),
+        ]
+
+    import lookup
+    if package in ("tlbn", "ulb"):
+        import reduce
+        ps = [
+            ("resolve", lang.resolve, (lookup, "resolve")),
+            ("evaluate", then(lambda e: lang.evaluate(e, {})), (evaluate, "evaluate")),
+        ]
+        # Reduction substitutes lambdas into the bodies of other lambdas,
+        # which can make terms grow exponentially, so it is only
+        # measured for smaller programs.
+        if nodes <= 5000:
+            ps.append(("reduce", reduction(reduce), (reduce, "step")))
+        return ps
+
+    # The reduce modules of tlbnr, tlbnrd and f are carried over from
+    # tlbn and only know its expressions (they fail on every generated
+    # program), so these packages have no reduce phase.
+    import check
+    if package == "tlbnr":
+        return [
+            ("resolve", lang.resolve, (lookup, "resolve")),
+            ("check", then(lang.check), (check, "check")),
+            ("evaluate", then(lambda e: lang.evaluate(e, {}, [])), (evaluate, "evaluate")),
+        ]
+
+    if package == "tlbnrd":
+        return [
+            ("resolve", lang.resolve, (lookup, "resolve")),
+            ("check", then(lang.check), (check, "check")),
+            ("evaluate", then(lambda e: lang.evaluate(e, {}, [])), (evaluate, "evaluate")),
+        ]
+
+    if package == "f":
+        import instantiate
+        import cache
+        # Compiling through the cache, without the entry of the program
+        # (which is then written) and with it.
+        c = lang.Cache(scratch, limit = 1 << 30)
+        def miss(e):
+            cache.remove(c.file(cache.key(e)))
+            c.compile(e, lang.SideTable())
+        return [
+            ("cache-miss", then(miss), None),
+            ("cache-hit", then(lambda e: c.compile(e, lang.SideTable())), None),
+            ("resolve", lang.resolve, (lookup, "resolve_expr")),
+            ("check", then(lang.check), (check, "check")),
+            ("instantiate", lang.instantiate, (instantiate, "instantiate")),
+            ("resolve-instance", lang.resolve, (lookup, "resolve_expr")),
+            ("check-instance", then(lang.check), (check, "check")),
+            ("evaluate", then(lambda e: lang.evaluate(e, {}, [])), (evaluate, "evaluate")),
+        ]
+
+    raise Exception(f"unknown package '{package}'")
+
+def run_phases(ps, programs, measure):
+    # Runs each phase over the programs in turn, calling measure(name,
+    # hook, fn) to run a phase, where fn runs it over the programs.
+    es = pickle.loads(programs)
+    for name, run, hook in ps:
+        es = measure(name, hook, lambda: [run(e) for e in es])
+
+def worker(package, size, repeat):
+    # Measures the phases of package over one class of programs and
+    # writes the results to stdout as JSON.
+    sys.setrecursionlimit(20000)
+    count, nodes = SIZES[size]
+    programs = pickle.dumps(corpus(package, count, nodes))
+    # The directory of the files written by phases, which is removed when
+    # the worker is done (or, if it fails, when it exits).
+    scratch = tempfile.TemporaryDirectory()
+    ps = phases(package, nodes, scratch.name)
+    results = {name: {} for name, run, hook in ps}
+
+    def timed(name, hook, fn):
+        start = time.perf_counter()
+        es = fn()
+        t = time.perf_counter() - start
+        results[name]["time"] = min(t, results[name].get("time", t))
+        return es
+
+    def traced(name, hook, fn):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        es = fn()
+        results[name]["peak"] = tracemalloc.get_traced_memory()[1] - base
+        return es
+
+    def counted(name, hook, fn):
+        if hook is None:
+            results[name]["steps"] = None
+            return fn()
+        module, attr = hook
+        original = getattr(module, attr)
+        calls = [0]
+        def count(*args):
+            calls[0] += 1
+            return original(*args)
+        setattr(module, attr, count)
+        try:
+            es = fn()
+        finally:
+            setattr(module, attr, original)
+        results[name]["steps"] = calls[0]
+        return es
+
+    for i in range(repeat):
+        run_phases(ps, programs, timed)
+    tracemalloc.start()
+    run_phases(ps, programs, traced)
+    tracemalloc.stop()
+    run_phases(ps, programs, counted)
+    scratch.cleanup()
+    json.dump(results, sys.stdout)
+
+def measure(packages, sizes, repeat):
+    # Runs a worker for each package and class of size. Returns the
+    # results, keyed by "package/size/phase".
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for package in packages:
+        cwd = here if package == "root" else os.path.join(here, package)
+        for size in sizes:
+            cmd = [sys.executable, os.path.abspath(__file__),
+                   "--worker", package, size, "--repeat", str(repeat)]
+            p = subprocess.run(cmd, cwd = cwd, capture_output = True, text = True)
+            if p.returncode != 0:
+                raise Exception(f"{package}/{size} failed:\n{p.stderr}")
+            for phase, r in json.loads(p.stdout).items():
+                key = f"{package}/{size}/{phase}"
+                results[key] = r
+                print(f"{key:32} {r['time']:9.4f}s {r['peak']:12} B "
+                      f"{r['steps'] if r['steps'] is not None else '-':>10} steps",
+                      file = sys.stderr)
+    return results
+
+def compare(base, current, threshold, min_time):
+    # Prints the measures that changed between base and current, and
+    # returns the number of regressions.
+    regressions = 0
+    for key in sorted(base.keys() & current.keys()):
+        for m in MEASURES:
+            b = base[key].get(m)
+            c = current[key].get(m)
+            if b is None or c is None or b == c:
+                continue
+            if m == "time" and max(b, c) < min_time:
+                continue
+            ratio = c / b if b else float("inf")
+            if ratio > 1 + threshold:
+                flag = "REGRESSION"
+                regressions += 1
+            elif ratio < 1 - threshold:
+                flag = "improved"
+            else:
+                continue
+            print(f"{key:32} {m:6} {b:>12.6g} -> {c:<12.6g} x{ratio:.2f} {flag}")
+    for key in sorted(base.keys() - current.keys()):
+        print(f"{key:32} missing")
+    return regressions
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save(path, results, args):
+    with open(path, "w") as f:
+        json.dump({
+            "python": sys.version.split()[0],
+            "sizes": {s: SIZES[s] for s in args.sizes},
+            "repeat": args.repeat,
+            "results": results,
+        }, f, indent = 1, sort_keys = True)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark the languages.")
+    parser.add_argument("--packages", type = lambda s: s.split(","), default = PACKAGES,
+                        help = "comma-separated packages to measure (default: all)")
+    parser.add_argument("--sizes", type = lambda s: s.split(","), default = list(SIZES),
+                        help = "comma-separated classes of size (default: all)")
+    parser.add_argument("--repeat", type = int, default = 3,
+                        help = "timed runs of each phase (the best is kept)")
+    parser.add_argument("--out", metavar = "FILE", help = "save the results to FILE")
+    parser.add_argument("--compare", nargs = "+", metavar = "FILE",
+                        help = "compare with the baseline BASE (and CURRENT)")
+    parser.add_argument("--threshold", type = float, default = 0.10,
+                        help = "relative increase that is a regression")
+    parser.add_argument("--min-time", type = float, default = 0.001,
+                        help = "times (in seconds) below this are not compared")
+    parser.add_argument("--worker", nargs = 2, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, os.getcwd())
+        worker(args.worker[0], args.worker[1], args.repeat)
+        return
+
+    if args.compare and len(args.compare) > 1:
+        current = load(args.compare[1])
+    else:
+        current = measure(args.packages, args.sizes, args.repeat)
+        if args.out:
+            save(args.out, current, args)
+    if args.compare:
+        n = compare(load(args.compare[0]), current, args.threshold, args.min_time)
+        print(f"{n} regressions")
+        sys.exit(1 if n else 0)
+
+if __name__ == "__main__":
+    main()
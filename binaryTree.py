@@ -29,40 +29,191 @@ def isOperator(c):
     else:
         return False
 
+# The traversals below do not recurse, so they work on expressions of
+# any depth. The original recursive versions are kept (with the suffix
+# _recursive) for comparison; they overflow the Python stack on deep
+# expressions. Each traversal calls visit with the value of each node.
+
 # A utility function to do inorder traversal
-def inorder(e):
+#
+# This is a Morris traversal, which needs no stack. It temporarily
+# threads the right pointer of each node's predecessor back to the
+# node, and restores it before returning.
+def inorder(e, visit = print):
+    while e is not None:
+        if e.left is None:
+            visit(e.value)
+            e = e.right
+        else:
+            pred = e.left
+            while pred.right is not None and pred.right is not e:
+                pred = pred.right
+            if pred.right is None:
+                pred.right = e
+                e = e.left
+            else:
+                pred.right = None
+                visit(e.value)
+                e = e.right
+
+def postorder(e, visit = print):
+    stack = [(e, False)]
+    while stack:
+        e, done = stack.pop()
+        if e is None:
+            continue
+        if done:
+            visit(e.value)
+        else:
+            stack.append((e, True))
+            stack.append((e.right, False))
+            stack.append((e.left, False))
+
+# Also a Morris traversal (see inorder)
+def preorder(e, visit = print):
+    while e is not None:
+        if e.left is None:
+            visit(e.value)
+            e = e.right
+        else:
+            pred = e.left
+            while pred.right is not None and pred.right is not e:
+                pred = pred.right
+            if pred.right is None:
+                visit(e.value)
+                pred.right = e
+                e = e.left
+            else:
+                pred.right = None
+                e = e.right
+
+# Yields the nodes of an expression in postorder (children before their
+# parents). The stack holds only the path from the root to the current
+# node, so it never grows beyond the height of the expression, and each
+# node is pushed and popped once.
+def walk(e):
+    stack = []
+    last = None
+    while e is not None or stack:
+        if e is not None:
+            stack.append(e)
+            e = e.left
+            continue
+        n = stack[-1]
+        if n.right is not None and n.right is not last:
+            e = n.right
+        else:
+            last = stack.pop()
+            yield n
+
+# Computes the size of an expression
+#
+# The stack holds the right children still to be counted, at most one
+# for each node on the path to the current node.
+def size(e):
+    n = 0
+    stack = []
+    while e is not None or stack:
+        if e is not None:
+            n += 1
+            stack.append(e.right)
+            e = e.left
+        else:
+            e = stack.pop()
+    return n
+
+# Computes height of an expression
+#
+# This is walk (above) inlined: the height is the greatest length of
+# the path on its stack.
+def height(e):
+    h = 0
+    stack = []
+    last = None
+    while e is not None or stack:
+        if e is not None:
+            stack.append(e)
+            if len(stack) > h:
+                h = len(stack)
+            e = e.left
+            continue
+        n = stack[-1]
+        if n.right is not None and n.right is not last:
+            e = n.right
+        else:
+            last = stack.pop()
+    return h
+
+# Returns 'T' or 'F' for the Python bool b
+def truth(b):
+    return 'T' if b else 'F'
+
+# Computes the value ('T' or 'F') of the operator op, given the values
+# of its left and right operands (the operand of '!' may be either).
+# Returns None if an operand is not a constant.
+def apply(op, lhs, rhs):
+    if op == '!':
+        x = rhs if rhs is not None else lhs
+        return None if x is None else truth(x == 'F')
+    if lhs is None or rhs is None:
+        return None
+    if op == '^':
+        return truth(lhs == 'T' and rhs == 'T')
+    if op == 'v':
+        return truth(lhs == 'T' or rhs == 'T')
+    return None
+
+# Computes the value of a node with no children
+def leaf(value):
+    return value if value in ('T', 'F') else None
+
+# Computes the size, height and value of an expression in a single
+# postorder walk, keeping the results of the subexpressions on a stack
+# as height does. The value is None if it depends on a variable.
+def measure(e):
+    results = []
+    for n in walk(e):
+        if n.left is None and n.right is None:
+            results.append((1, 1, leaf(n.value)))
+            continue
+        rs, rh, rv = results.pop() if n.right is not None else (0, 0, None)
+        ls, lh, lv = results.pop() if n.left is not None else (0, 0, None)
+        results.append((ls + rs + 1, max(lh, rh) + 1, apply(n.value, lv, rv)))
+    return results[-1] if results else (0, 0, None)
+
+# Recursive versions of the traversals above
+
+def inorder_recursive(e, visit = print):
     if e is not None:
-        inorder(e.left)
-        print(e.value)
-        inorder(e.right)
+        inorder_recursive(e.left, visit)
+        visit(e.value)
+        inorder_recursive(e.right, visit)
 
-def postorder(e):
+def postorder_recursive(e, visit = print):
     if e is not None:
-        postorder(e.left)
-        postorder(e.right)
-        print(e.value)
+        postorder_recursive(e.left, visit)
+        postorder_recursive(e.right, visit)
+        visit(e.value)
 
-def preorder(e):
+def preorder_recursive(e, visit = print):
     if e is not None:
-        print(e.value)
-        preorder(e.left)
-        preorder(e.right)
+        visit(e.value)
+        preorder_recursive(e.left, visit)
+        preorder_recursive(e.right, visit)
 
-# Computes the size of an expression
-def size(e):
+def size_recursive(e):
     if e is None:
         return 0
     else:
-        return (size(e.left)+ 1 + size(e.right))
+        return (size_recursive(e.left)+ 1 + size_recursive(e.right))
 
-# Computes height of an expression
-def height(e):
+def height_recursive(e):
     if e is None:
         return 0
     else:
         # Compute the depth of each subtree
-        lDepth = height(e.left)
-        rDepth = height(e.right)
+        lDepth = height_recursive(e.left)
+        rDepth = height_recursive(e.right)
 
         # Use the larger one
         if (lDepth > rDepth):
@@ -83,89 +234,110 @@ def step(e):
     pass
 
 # Calls step repeatedly until the expression is non-reducible
+#
+# Returns the reduced expression; e is not modified. Operators whose
+# operands reduce to constants are replaced by constants. Operators
+# applied to variables are kept, with their operands reduced. Unchanged
+# subexpressions are shared with e.
 def reduce(e):
+    results = []
+    for n in walk(e):
+        if n.left is None and n.right is None:
+            results.append(n)
+            continue
+        r = results.pop() if n.right is not None else None
+        l = results.pop() if n.left is not None else None
+        v = apply(n.value, l and leaf(l.value), r and leaf(r.value))
+        if v is not None:
+            results.append(Expr(v))
+        elif l is n.left and r is n.right:
+            results.append(n)
+        else:
+            m = Expr(n.value)
+            m.left = l
+            m.right = r
+            results.append(m)
+    return results[-1] if results else None
+
+# The original recursive reduce, which modifies e in place
+def reduce_recursive(e):
     if e is not None:
-        reduce(e.left)
-        if e.value is '^':
-            if e.left.value is 'T':
-                lhs = 'T'
-            if e.left.value is 'F':
-                lhs = 'F'
-            if e.right.value is 'T':
-                rhs = 'T'
-            if e.right.value is 'F':
-                rhs = 'F'
-            e.value = lhs and rhs
-            e.left = None
-            e.right = None
-        elif e.value is 'v':
-            if e.left.value is 'T':
-                lhs = 'T'
-            if e.left.value is 'F':
-                lhs = 'F'
-            if e.right.value is 'T':
-                rhs = 'T'
-            if e.right.value is 'F':
-                rhs = 'F'
-            e.value = lhs or rhs
-            e.left = None
-            e.right = None
-        elif e.value is '!':
-            leftChild = False
-            if e.left.value is 'T':
-                lhs = 'T'
-                leftChild = True
-            elif e.left.value is 'F':
-                lhs = 'F'
-                leftChild = True
-            else:
-                lhs = e.left.value
-                leftChild = False
-            if e.right.value is 'T':
-                rhs = 'T'
-                leftChild = False
-            elif e.right.value is 'F':
-                rhs = 'F'
-                leftChild = False
-            else:
-                rhs = e.right.value
-                leftChild = True
-            if leftChild:
-                e.value = not e.left.value
-            else:
-                e.value = not e.right.value
-        reduce(e.right)
+        reduce_recursive(e.left)
+        reduce_recursive(e.right)
+        if e.value == '!':
+            x = e.right if e.right is not None else e.left
+            if x.value not in ('T', 'F'):
+                return
+            e.value = truth(x.value == 'F')
+        elif e.value == '^' or e.value == 'v':
+            if e.left.value not in ('T', 'F') or e.right.value not in ('T', 'F'):
+                return
+            lhs = e.left.value == 'T'
+            rhs = e.right.value == 'T'
+            e.value = truth(lhs and rhs if e.value == '^' else lhs or rhs)
+        else:
+            return
+        e.left = None
+        e.right = None
 
 # Returns root of constructed tree for
 # given postfix expression
-def constructTree(postfix):
+def constructTree(postfix, builder = None):
+    # Builds the tree of a postfix expression. Any letter other than
+    # T, F and v is a variable, and '!' takes one operand, which becomes
+    # its right child. With a builder (such as an ArrayTree, see
+    # arrayTree.py), the nodes are made by calling its const, var, not_,
+    # and_ and or_ methods instead, and the result is whatever the
+    # builder returns for the root.
     stack = []
 
     # Traverse through every character of input expression
     for char in postfix:
 
         # if operand, simply push into stack
-        if char == 'T':
-            e = Expr('T')
+        if char == 'T' or char == 'F':
+            if builder is not None:
+                e = builder.const(char == 'T')
+            else:
+                e = Expr(char)
             stack.append(e)
 
-        elif char == 'F':
-            e = Expr('F')
+        elif char == '!':
+            e1 = stack.pop()
+            if builder is not None:
+                e = builder.not_(e1)
+            else:
+                e = Expr(char)
+                e.right = e1
             stack.append(e)
+
 		# Operator
         elif isOperator(char):
 
             # Pop two top nodes
-            e = Expr(char)
             e1 = stack.pop()
             e2 = stack.pop()
 
-			# make them children
-            e.right = e1
-            e.left = e2
+            if builder is not None:
+                if char == '^':
+                    e = builder.and_(e2, e1)
+                else:
+                    e = builder.or_(e2, e1)
+            else:
+                # make them children
+                e = Expr(char)
+                e.right = e1
+                e.left = e2
 
             # Add this subexpression to stack
             stack.append(e)
+
+        elif char.isalpha():
+            if builder is not None:
+                e = builder.var(char)
+            else:
+                e = Expr(char)
+            stack.append(e)
         else:
             pass
     # Only element will be the root of expression tree
@@ -178,3 +350,74 @@ def constructTree(postfix):
 # r = constructTree(postfix)
 # print "Infix expression is"
 # inorder(r)
+
+if __name__ == "__main__":
+    # Compare the iterative and recursive traversals on a balanced
+    # expression, then run the iterative ones on an expression of depth
+    # 10^6 (which the recursive ones cannot handle).
+    import sys
+    import time
+
+    def balanced(depth):
+        # Returns a balanced expression of the given depth.
+        level = [Expr('T' if k % 3 else 'F') for k in range(1 << (depth - 1))]
+        while len(level) > 1:
+            ops = []
+            for k in range(0, len(level), 2):
+                e = Expr('^' if k % 4 else 'v')
+                e.left = level[k]
+                e.right = level[k + 1]
+                ops.append(e)
+            level = ops
+        return level[0]
+
+    def deep(depth):
+        # Returns a left-leaning expression of the given depth.
+        e = Expr('T')
+        for k in range(depth - 1):
+            n = Expr('v' if k % 2 else '^')
+            n.left = e
+            n.right = Expr('T')
+            e = n
+        return e
+
+    def skip(value):
+        pass
+
+    def bench(name, fn, e):
+        t0 = time.perf_counter()
+        fn(e)
+        print(f"  {name:20} {time.perf_counter() - t0:.3f}s")
+
+    e = balanced(20)
+    print(f"balanced, {size(e)} nodes:")
+    for name, fn in [
+        ("size", size), ("size_recursive", size_recursive),
+        ("height", height), ("height_recursive", height_recursive),
+        ("inorder", lambda e: inorder(e, skip)),
+        ("inorder_recursive", lambda e: inorder_recursive(e, skip)),
+        ("preorder", lambda e: preorder(e, skip)),
+        ("preorder_recursive", lambda e: preorder_recursive(e, skip)),
+        ("postorder", lambda e: postorder(e, skip)),
+        ("postorder_recursive", lambda e: postorder_recursive(e, skip)),
+        ("measure", measure),
+        ("reduce", reduce),
+    ]:
+        bench(name, fn, e)
+
+    e = deep(10 ** 6)
+    print(f"deep, height {height(e)}:")
+    for name, fn in [
+        ("size", size),
+        ("height", height),
+        ("inorder", lambda e: inorder(e, skip)),
+        ("preorder", lambda e: preorder(e, skip)),
+        ("postorder", lambda e: postorder(e, skip)),
+        ("measure", measure),
+        ("reduce", reduce),
+    ]:
+        bench(name, fn, e)
+    try:
+        size_recursive(e)
+    except RecursionError:
+        print(f"  size_recursive       RecursionError (limit {sys.getrecursionlimit()})")
@@ -0,0 +1,180 @@
+from lang import *
+
+# Hash-consed expressions of the root language.
+#
+# The constructors in lang.py always allocate a new node, so a formula
+# that mentions the same subformula twice stores it twice, and reduce
+# evaluates it twice. An Interner builds expressions through a table of
+# the nodes it has already made: asking for a node with the same type
+# and the same children as an existing one returns the existing node.
+# Since the children are themselves interned, two expressions built by
+# the same Interner are structurally the same exactly when they are the
+# same object, and a formula becomes a directed acyclic graph (DAG) in
+# which every distinct subformula appears once.
+#
+# This matters for formulas made by unrolling circuits, where each stage
+# refers to the outputs of the previous one more than once. As trees,
+# they grow exponentially with the number of stages; as DAGs, linearly.
+# reduce (below) evaluates each node once, so it is linear too.
+#
+# An Interner has the same methods as the builders in infix.py, so it
+# can be passed to infix.parse to intern a formula as it is parsed.
+
+class Interner:
+    # A table of interned nodes. Nodes from different interners are
+    # never the same.
+
+    def __init__(self):
+        # Maps (type, fields) to a node, where the fields of a compound
+        # node are the ids of its (interned) children.
+        self.table = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    def make(self, key, make):
+        e = self.table.get(key)
+        if e is None:
+            e = make()
+            self.table[key] = e
+        return e
+
+    def const(self, b):
+        return self.make((BoolExpr, bool(b)), lambda: BoolExpr(bool(b)))
+
+    def var(self, name):
+        return self.make((VarExpr, name), lambda: VarExpr(name))
+
+    def not_(self, e):
+        return self.make((NotExpr, id(e)), lambda: NotExpr(e))
+
+    def and_(self, lhs, rhs):
+        return self.make((AndExpr, id(lhs), id(rhs)), lambda: AndExpr(lhs, rhs))
+
+    def or_(self, lhs, rhs):
+        return self.make((OrExpr, id(lhs), id(rhs)), lambda: OrExpr(lhs, rhs))
+
+    def intern(self, e):
+        # Returns the interned node structurally the same as e, which
+        # may be any expression of the root language.
+        done = {}
+        stack = [(e, False)]
+        while stack:
+            n, ready = stack.pop()
+            if id(n) in done:
+                continue
+            if type(n) is BoolExpr:
+                done[id(n)] = self.const(n.value)
+            elif type(n) is VarExpr:
+                done[id(n)] = self.var(n.name)
+            elif not ready:
+                stack.append((n, True))
+                stack.extend((c, False) for c in children(n))
+            elif type(n) is NotExpr:
+                done[id(n)] = self.not_(done[id(n.expr)])
+            elif type(n) is AndExpr:
+                done[id(n)] = self.and_(done[id(n.lhs)], done[id(n.rhs)])
+            elif type(n) is OrExpr:
+                done[id(n)] = self.or_(done[id(n.lhs)], done[id(n.rhs)])
+            else:
+                raise Exception(f"invalid expression {n}")
+        return done[id(e)]
+
+def children(e):
+    # The operands of e.
+    if type(e) is NotExpr:
+        return [e.expr]
+    if type(e) is AndExpr or type(e) is OrExpr:
+        return [e.lhs, e.rhs]
+    return []
+
+def same(e1, e2):
+    # Returns true when the interned nodes e1 and e2 (from the same
+    # Interner) are structurally the same.
+    return e1 is e2
+
+def postorder(e):
+    # Returns the distinct nodes of e, each after its operands.
+    order = []
+    seen = set()
+    stack = [(e, False)]
+    while stack:
+        n, ready = stack.pop()
+        if ready:
+            order.append(n)
+        elif id(n) not in seen:
+            seen.add(id(n))
+            stack.append((n, True))
+            stack.extend((c, False) for c in reversed(children(n)))
+    return order
+
+def size(e):
+    # Returns the number of distinct nodes in e.
+    return len(postorder(e))
+
+def tree_size(e):
+    # Returns the number of nodes e would have as a tree, counting each
+    # shared node once for every path to it.
+    counts = {}
+    for n in postorder(e):
+        counts[id(n)] = 1 + sum(counts[id(c)] for c in children(n))
+    return counts[id(e)]
+
+def reduce(e, env = {}):
+    # Returns the value of e (a Python bool), where the variables have
+    # the values in env. Each distinct node is evaluated once.
+    values = {}
+    for n in postorder(e):
+        if type(n) is BoolExpr:
+            v = n.value
+        elif type(n) is VarExpr:
+            if n.name not in env:
+                raise Exception(f"unbound variable '{n.name}'")
+            v = env[n.name]
+        elif type(n) is NotExpr:
+            v = not values[id(n.expr)]
+        elif type(n) is AndExpr:
+            v = values[id(n.lhs)] and values[id(n.rhs)]
+        elif type(n) is OrExpr:
+            v = values[id(n.lhs)] or values[id(n.rhs)]
+        else:
+            raise Exception(f"invalid expression {n}")
+        values[id(n)] = v
+    return values[id(e)]
+
+if __name__ == "__main__":
+    # Unroll a chain of multiplexers, where each stage selects between
+    # two functions of the previous stage's output:
+    #
+    #   s[k+1] = (s[k] and a[k]) or (not s[k] and b[k])
+    #
+    # As a tree, the formula doubles with every stage. As a DAG, each
+    # stage adds a constant number of nodes.
+    import time
+
+    stages = 60
+    d = Interner()
+    s = d.var("s0")
+    for k in range(stages):
+        a = d.var(f"a{k}")
+        b = d.var(f"b{k}")
+        s = d.or_(d.and_(s, a), d.and_(d.not_(s), b))
+
+    env = {"s0": True}
+    for k in range(stages):
+        env[f"a{k}"] = k % 3 != 0
+        env[f"b{k}"] = k % 2 == 0
+
+    t0 = time.perf_counter()
+    v = reduce(s, env)
+    t1 = time.perf_counter()
+    print(f"stages:     {stages}")
+    print(f"tree size:  {tree_size(s)} nodes")
+    print(f"DAG size:   {size(s)} nodes")
+    print(f"value:      {v} in {t1 - t0:.4f}s")
+
+    # Rebuilding the same formula yields the same node.
+    t = d.var("s0")
+    for k in range(stages):
+        t = d.or_(d.and_(t, d.var(f"a{k}")), d.and_(d.not_(t), d.var(f"b{k}")))
+    print(f"same:       {same(s, t)}")
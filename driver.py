@@ -1,5 +1,10 @@
 from binaryTree import *
-from postfix import *
+from infix import parse, ParseError
+
+import argparse
+import multiprocessing
+import sys
+import time
 
 # All expressions must be represented in this form:
 #   T for True
@@ -7,13 +12,107 @@ from postfix import *
 #   ! for Not
 #   ^ for And
 #   v for Or
+#
+# Parentheses, whitespace and the words true, false, not, and, or are
+# also accepted (see infix.py).
+#
+# By default, the driver reads one expression from the user. In batch
+# mode (--batch), it reads one expression per line from a file (or
+# stdin) and writes a record for each line as it is evaluated:
+#
+#   <line number> <result> <size> <height>
+#
+# where the line number is that of the line in the file (blank lines
+# are skipped, but counted), result is T or F (or ? if the expression
+# has variables), and size and height are those of the parsed
+# expression. Lines that fail to parse produce an error record. A
+# summary of the throughput and latency is written to stderr at the
+# end.
+
+def run(expression):
+    # Parse and reduce an expression, printing the result as the
+    # interactive driver always has.
+    try:
+        boolTree = parse(expression)
+    except ParseError as err:
+        print(f"error: {err}")
+        return
+    boolTree = reduce(boolTree)
+    inorder(boolTree)
+    print("Size:", size(boolTree))
+    print("Height:", height(boolTree))
+
+def evaluate_line(item):
+    # Evaluate a single line in batch mode, given with its line number.
+    # Returns the line number, the record (without it) and the time it
+    # took, in seconds.
+    number, line = item
+    start = time.perf_counter()
+    try:
+        n, h, v = measure(parse(line))
+        record = f"{v or '?'} {n} {h}"
+    except ParseError as err:
+        record = f"error: {err}"
+    return number, record, time.perf_counter() - start
+
+def lines(f):
+    # Yields the non-blank lines of f, with their line numbers.
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if line:
+            yield number, line
+
+def batch(f, out, jobs, chunksize):
+    # Evaluate each line of f, writing records to out in order.
+    latencies = []
+    start = time.perf_counter()
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(evaluate_line, lines(f), chunksize)
+    else:
+        pool = None
+        results = map(evaluate_line, lines(f))
+    for number, record, t in results:
+        out.write(f"{number} {record}\n")
+        latencies.append(t)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    report(latencies, elapsed)
+
+def report(latencies, elapsed):
+    # Write the throughput and latency summary to stderr.
+    n = len(latencies)
+    if n == 0:
+        print("no formulas", file = sys.stderr)
+        return
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(n - 1, int(p * n))] * 1e6
+    print(f"{n} formulas in {elapsed:.3f}s ({n / elapsed:.0f} formulas/sec)",
+          file = sys.stderr)
+    print(f"latency (us): mean {sum(latencies) / n * 1e6:.1f}, "
+          f"p50 {percentile(0.5):.1f}, p99 {percentile(0.99):.1f}, "
+          f"max {latencies[-1] * 1e6:.1f}", file = sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Evaluate Boolean expressions.")
+    parser.add_argument("--batch", nargs = "?", const = "-", metavar = "FILE",
+                        help = "evaluate one expression per line of FILE (default: stdin)")
+    parser.add_argument("--jobs", type = int, default = 1,
+                        help = "number of worker processes in batch mode")
+    parser.add_argument("--chunksize", type = int, default = 256,
+                        help = "lines sent to a worker at a time")
+    args = parser.parse_args()
+
+    if args.batch is None:
+        run(input("Type a Boolean Expression:"))
+    elif args.batch == "-":
+        batch(sys.stdin, sys.stdout, args.jobs, args.chunksize)
+    else:
+        with open(args.batch) as f:
+            batch(f, sys.stdout, args.jobs, args.chunksize)
 
-expression = input("Type a Boolean Expression:")
-obj = Conversion(len(expression))
-expression = obj.infixToPostfix(expression)
-boolTree = constructTree(expression)
-print(expression)
-reduce(boolTree)
-inorder(boolTree)
-print("Size:", size(boolTree))
-print("Height:", height(boolTree))
+if __name__ == "__main__":
+    main()
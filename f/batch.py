@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lang import *
+from pipeline import count, Pipeline, Phase, default_phases
+from quota import Quota
+from serialize import load
+
+# This module runs many programs in parallel.
+#
+# A Batch owns a pool of worker processes. Each worker imports the
+# language once, when it starts, and is reused for every program it is
+# given afterwards. A program is either an expression or its buffer
+# (as written by serialize.dump); each is run through the usual
+# pipeline (see pipeline.py), and its result is returned in the same
+# position as the program, along with any error it raised. An error in
+# one program does not affect the others.
+#
+# Programs are scheduled from the most to the least costly, so that a
+# large program started last does not keep the other workers idle at
+# the end of the batch. The cost of an expression is its number of
+# nodes, and that of a buffer, its length. Sending a program to a
+# worker has a fixed cost, so small programs are sent together, in
+# chunks of about the same cost as a single large program.
+#
+# Buffers are smaller than pickles of the same programs, so they are
+# cheaper to send to the workers, and reading one cannot run arbitrary
+# code.
+#
+# Usage:
+#
+#   with Batch() as b:
+#     for r in b.run(programs):
+#       print(r.value if r.error is None else r.error)
+
+class Result:
+  # The result of running a program: its value, or the error it
+  # raised (as a string), and the time the run took, in seconds.
+  def __init__(self, value, error, time):
+    self.value = value
+    self.error = error
+    self.time = time
+
+  def __str__(self):
+    if self.error is not None:
+      return f"error: {self.error}"
+    return str(self.value)
+
+def warm(path, limit):
+  # Prepares a worker: makes the modules of the language importable
+  # and imports them.
+  if path not in sys.path:
+    sys.path.insert(0, path)
+  sys.setrecursionlimit(limit)
+  import lang
+
+def run_one(e, limits):
+  # Runs the program e, which may be a buffer, within the limits given
+  # (the arguments of a Quota, or None). Returns a Result.
+  start = time.perf_counter()
+  try:
+    if type(e) is bytes:
+      e = load(e)
+    phases = default_phases()
+    if limits is not None:
+      q = Quota(**limits)
+      phases[-1] = Phase("evaluate", lambda e, a: evaluate(e, {}, [], a, q))
+    v = Pipeline(phases, memory = False).run(e).value
+    return Result(v, None, time.perf_counter() - start)
+  except Exception as x:
+    return Result(None, f"{type(x).__name__}: {x}", time.perf_counter() - start)
+
+def run_chunk(chunk, limits):
+  # Runs a chunk of programs, given as pairs of their positions in the
+  # batch and the programs. Returns pairs of positions and results.
+  return [(i, run_one(e, limits)) for i, e in chunk]
+
+def cost(e):
+  # Returns the estimated cost of running the program e.
+  if type(e) is bytes:
+    return len(e)
+  return count(e)
+
+def schedule(programs, workers):
+  # Returns the programs in chunks, from the most to the least costly.
+  # Each chunk holds pairs of positions and programs.
+  costs = [cost(e) for e in programs]
+  order = sorted(range(len(programs)), key = lambda i: -costs[i])
+
+  # Chunks are filled up to an equal share of the total cost for each
+  # of a few chunks per worker. A program that costs more than that is
+  # a chunk on its own.
+  share = max(sum(costs) // (workers * 4), 1)
+  chunks = []
+  chunk = []
+  total = 0
+  for i in order:
+    chunk.append((i, programs[i]))
+    total += costs[i]
+    if total >= share:
+      chunks.append(chunk)
+      chunk = []
+      total = 0
+  if chunk:
+    chunks.append(chunk)
+  return chunks
+
+class Batch:
+  def __init__(self, workers = None, limits = None, recursion = 10000):
+    # The number of workers (by default, one per processor), the limits
+    # of each program (as the arguments of a Quota, or None), and the
+    # recursion limit of the workers.
+    self.workers = workers or os.cpu_count() or 1
+    self.limits = limits
+    here = os.path.dirname(os.path.abspath(__file__))
+    self.pool = ProcessPoolExecutor(self.workers, initializer = warm,
+                                    initargs = (here, recursion))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    self.pool.shutdown()
+
+  def run(self, programs):
+    # Runs the programs, and returns a list of their results, in the
+    # same order.
+    programs = list(programs)
+    results = [None] * len(programs)
+    futures = [self.pool.submit(run_chunk, chunk, self.limits)
+               for chunk in schedule(programs, self.workers)]
+    for f in as_completed(futures):
+      for i, r in f.result():
+        results[i] = r
+    return results
+
+def run_batch(programs, workers = None, limits = None):
+  # Runs the programs in a new batch. Returns their results, in order.
+  with Batch(workers, limits) as b:
+    return b.run(programs)
+
+if __name__ == "__main__":
+  # Run a corpus: batch.py <path> [workers]
+  if len(sys.argv) < 2:
+    print("usage: batch.py path [workers]")
+    sys.exit(1)
+  workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+  programs = read_corpus(sys.argv[1])
+  start = time.perf_counter()
+  results = run_batch(programs, workers)
+  for i, r in enumerate(results):
+    print(f"{i}: {r} ({r.time:.3f}s)")
+  print(f"{len(results)} programs in {time.perf_counter() - start:.3f}s")
@@ -1,3 +1,4 @@
+import functools
 import inspect
 import typing
 
@@ -10,7 +11,9 @@ def checked(fn):
   # Grab the list of parameter names.
   parms = inspect.getfullargspec(fn).args
   
-  # Define the wrapper function.
+  # Define the wrapper function. It takes the name (and module) of fn,
+  # so that it can be found by them (see instrument.py).
+  @functools.wraps(fn)
   def wrap(*args):
     # Check that each argument is an instance of its corresponding
     # hinted type.
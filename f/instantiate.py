@@ -1,16 +1,17 @@
 from lang import *
 from decorate import *
+from annotate import *
 
-def inst_unary_expr(e : Expr, s : dict, T : object):
-  e1 = instantiate(e.expr)
+def inst_unary_expr(e : Expr, s : dict, T : object, a : Annotations = inplace):
+  e1 = instantiate(e.expr, s, a)
   return T(e1)
 
-def inst_binary_expr(e : Expr, s : dict, T : object):
-  e1 = instantiate(e.lhs)
-  e2 = instantiate(e.rhs)
+def inst_binary_expr(e : Expr, s : dict, T : object, a : Annotations = inplace):
+  e1 = instantiate(e.lhs, s, a)
+  e2 = instantiate(e.rhs, s, a)
   return T(e1, e2)
 
-def instantiate(e : Expr, s : dict = {}):
+def instantiate(e : Expr, s : dict = {}, a : Annotations = inplace):
   # Instantiate the given expression by applying instantiation
   # expressions.
   #
@@ -27,18 +28,18 @@ def instantiate(e : Expr, s : dict = {}):
     return e
 
   if type(e) is AndExpr:
-    return inst_binary_expr(e, s, AndExpr)
+    return inst_binary_expr(e, s, AndExpr, a)
 
   if type(e) is OrExpr:
-    return inst_binary_expr(e, s, OrExpr)
+    return inst_binary_expr(e, s, OrExpr, a)
 
   if type(e) is NotExpr:
-    return inst_unary_expr(e, s, NotExpr)
+    return inst_unary_expr(e, s, NotExpr, a)
 
   if type(e) is IfExpr:
-    e1 = instantiate(e.cond, s)
-    e2 = instantiate(e.true, s)
-    e3 = instantiate(e.false, s)
+    e1 = instantiate(e.cond, s, a)
+    e2 = instantiate(e.true, s, a)
+    e3 = instantiate(e.false, s, a)
     return IfExpr(e1, e2, e3)
 
   # Arithmetic expressions
@@ -47,42 +48,42 @@ def instantiate(e : Expr, s : dict = {}):
     return e
 
   if type(e) is AddExpr:
-    return inst_binary_expr(e, s, AddExpr)
+    return inst_binary_expr(e, s, AddExpr, a)
 
   if type(e) is SubExpr:
-    return inst_binary_expr(e, s, SubExpr)
+    return inst_binary_expr(e, s, SubExpr, a)
 
   if type(e) is MulExpr:
-    return inst_binary_expr(e, s, MulExpr)
+    return inst_binary_expr(e, s, MulExpr, a)
 
   if type(e) is DivExpr:
-    return inst_binary_expr(e, s, DivExpr)
+    return inst_binary_expr(e, s, DivExpr, a)
 
   if type(e) is RemExpr:
-    return inst_binary_expr(e, s, RemExpr)
+    return inst_binary_expr(e, s, RemExpr, a)
 
   if type(e) is NegExpr:
-    return subst_unary_expr(e, s, NegExpr)
+    return inst_unary_expr(e, s, NegExpr, a)
 
   # Relational expressions
 
   if type(e) is EqExpr:
-    return inst_binary_expr(e, s, EqExpr)
+    return inst_binary_expr(e, s, EqExpr, a)
 
   if type(e) is NeExpr:
-    return inst_binary_expr(e, s, NeExpr)
+    return inst_binary_expr(e, s, NeExpr, a)
 
   if type(e) is LtExpr:
-    return inst_binary_expr(e, s, LtExpr)
+    return inst_binary_expr(e, s, LtExpr, a)
 
   if type(e) is GtExpr:
-    return inst_binary_expr(e, s, GtExpr)
+    return inst_binary_expr(e, s, GtExpr, a)
 
   if type(e) is LeExpr:
-    return inst_binary_expr(e, s, LeExpr)
+    return inst_binary_expr(e, s, LeExpr, a)
 
   if type(e) is GeExpr:
-    return inst_binary_expr(e, s, GeExpr)
+    return inst_binary_expr(e, s, GeExpr, a)
 
   # Functional expressions
 
@@ -93,39 +94,56 @@ def instantiate(e : Expr, s : dict = {}):
   if type(e) is LambdaExpr:
     # Build new parameters for the lambda expression.
     ps = list(map(lambda p: VarDecl(p.id, p.type), e.vars))
-    e1 = instantiate(e.expr, s)
-    return LambdaExpr(e.vars, e1)
+    e1 = instantiate(e.expr, s, a)
+    return LambdaExpr(ps, e1)
 
   if type(e) is CallExpr:
-    e = instantiate(e.fn, s)
-    es = list(map(lambda x: instantiate(x, s), e.args))
-    return CallExpr(e, es)
+    e1 = instantiate(e.fn, s, a)
+    es = list(map(lambda x: instantiate(x, s, a), e.args))
+    return CallExpr(e1, es)
+
+  # Reference expressions
+
+  if type(e) is NewExpr:
+    return inst_unary_expr(e, s, NewExpr, a)
+
+  if type(e) is DerefExpr:
+    return inst_unary_expr(e, s, DerefExpr, a)
+
+  if type(e) is AssignExpr:
+    return inst_binary_expr(e, s, AssignExpr, a)
 
   # Data expressions
 
   if type(e) is TupleExpr:
-    es = subst_exprs(e.elems, s)
+    es = list(map(lambda x: instantiate(x, s, a), e.elems))
+    return TupleExpr(es)
 
   if type(e) is ProjExpr:
-    e1 = subst_expr(e.obj)
-    return ProjExp(e1, e.index)
+    e1 = instantiate(e.obj, s, a)
+    return ProjExpr(e1, e.index)
 
   if type(e) is RecordExpr:
     fs = []
     for f in e.fields:
-      e = subst_expr(f.value, s)
-      fs += [FieldInit(f.id, e)]
+      e1 = instantiate(f.value, s, a)
+      fs += [FieldInit(f.id, e1)]
     return RecordExpr(fs)
 
   if type(e) is MemberExpr:
-    e1 = subst_expr(e.obj)
+    e1 = instantiate(e.obj, s, a)
     return MemberExpr(e1, e.id)
 
   if type(e) is VariantExpr:
-    assert False
+    e1 = instantiate(e.field.value, s, a)
+    return VariantExpr(FieldInit(e.field.id, e1), e.variant)
 
   if type(e) is CaseExpr:
-    assert False
+    e1 = instantiate(e.expr, s, a)
+    cs = []
+    for c in e.cases:
+      cs += [Case(c.id, c.var.id, instantiate(c.expr, s, a))]
+    return CaseExpr(e1, cs)
 
   # Polymorphic expressions
 
@@ -140,7 +158,7 @@ def instantiate(e : Expr, s : dict = {}):
     # Recursively instantiate the generic... This *should* produce a
     # GenericExpr on the left, even if that was computed by another 
     # GenericExpr.
-    gen = instantiate(e.gen)
+    gen = instantiate(e.gen, s, a)
     assert type(gen) is GenericExpr
     assert len(gen.vars) == len(e.args)
 
@@ -150,8 +168,9 @@ def instantiate(e : Expr, s : dict = {}):
       sub[gen.vars[i]] = e.args[i]
 
     # Substitute through the expression to produce the instantiated
-    # form. Note that this the result is unresolved and untyped.
-    return subst(gen.expr, sub)
+    # form, and instantiate any generics nested within it. Note that
+    # the result is unresolved and untyped.
+    return instantiate(subst(gen.expr, sub, a), s, a)
 
   print(repr(e))
   raise Exception("unknown expression")
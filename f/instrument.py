@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+
+# This module profiles the interpreter by node type and handler.
+#
+# A Profiler replaces the functions of the modules it instruments
+# (by default, evaluate and check) with timed versions while
+# it is enabled, and puts the originals back when it is disabled.
+# Handlers call each other (and the dispatchers, e.g. evaluate) through
+# module globals, so every call is seen. When no profiler is enabled,
+# the original functions run untouched, at no extra cost.
+#
+# For each function, the profiler counts calls and accumulates their
+# inclusive time (including the functions they call) and exclusive
+# time (excluding them). The same is done for each class of node,
+# where a visit of a node starts with the first call that is passed
+# the node (e.g., evaluate(e)) and includes the handlers it calls for
+# the same node (e.g., eval_call(e)). The stacks of calls are also
+# recorded, with their exclusive time, in the collapsed format read by
+# flame graph tools:
+#
+#   evaluate;eval_call;evaluate;eval_add 1200
+#
+# where the count is in microseconds.
+#
+# Usage:
+#
+#   with Profiler() as p:
+#     evaluate(e)
+#   print(p.report())
+#
+# Calls through names bound before the profiler was enabled (e.g., by
+# 'from lang import *' in a script) are not themselves timed, though
+# the calls they make are. Instrumenting a function adds a frame to
+# each of its calls, so deep programs may need a higher recursion
+# limit while profiling.
+
+def replace(fns):
+  # Rebinds every name of a module of this package (including lang)
+  # that refers to a function in the dictionary fns to the function it
+  # maps to. Returns the rebindings, as (module, name, original), to be
+  # undone by restore.
+  here = os.path.dirname(os.path.abspath(__file__))
+  ids = {id(fn): fn for fn in fns}
+  saved = []
+  for m in list(sys.modules.values()):
+    path = getattr(m, "__file__", None)
+    if path is None or os.path.dirname(os.path.abspath(path)) != here:
+      continue
+    for name, fn in list(vars(m).items()):
+      if id(fn) in ids and ids[id(fn)] is fn:
+        saved.append((m, name, fn))
+        setattr(m, name, fns[fn])
+  return saved
+
+def restore(saved):
+  # Undoes the rebindings made by replace.
+  for m, name, fn in reversed(saved):
+    setattr(m, name, fn)
+
+class Stats:
+  # The statistics of a function or a class of nodes.
+  def __init__(self, name):
+    self.name = name
+    self.calls = 0
+    self.inclusive = 0.0
+    self.exclusive = 0.0
+
+class Frame:
+  # An active call of an instrumented function.
+  def __init__(self, name, node, visit):
+    self.name = name
+    self.node = node
+
+    # True if this call starts the visit of its node.
+    self.visit = visit
+
+    # The inclusive time of the calls made by this one and, for the
+    # start of a visit, of the visits of other nodes made during it.
+    self.children = 0.0
+    self.visits = 0.0
+
+class Profiler:
+  def __init__(self, modules = None):
+    # The modules to instrument, which are the modules named evaluate
+    # and check (in this package) by default. The reduce module cannot
+    # reduce programs of this language (see reduce.py), so it is left
+    # out.
+    if modules is None:
+      import evaluate, check
+      modules = [evaluate, check]
+    self.modules = modules
+
+    # Statistics by function name and by class of node.
+    self.functions = {}
+    self.nodes = {}
+
+    # Exclusive time by stack of function names.
+    self.stacks = {}
+
+    # The active calls, and the ones that start the visit of a node.
+    self.frames = []
+    self.visits = []
+
+    # The number of active calls of each function and class of node.
+    # Only the outermost call of a recursive function (or visit of a
+    # class) adds to the inclusive time, so it is not counted twice.
+    self.active = {}
+
+    # The rebindings made by enable, as (module, name, original).
+    self.saved = []
+
+  def __enter__(self):
+    self.enable()
+    return self
+
+  def __exit__(self, *args):
+    self.disable()
+
+  def enable(self):
+    # Replaces the functions of the instrumented modules with timed
+    # versions. Other modules of the package that refer to the same
+    # functions (e.g. lang, which re-exports evaluate) are updated as
+    # well.
+    if self.saved:
+      return
+    wrapped = {}
+    for m in self.modules:
+      for name, fn in list(vars(m).items()):
+        if callable(fn) and getattr(fn, "__module__", None) == m.__name__ \
+           and not isinstance(fn, type):
+          wrapped[fn] = self.wrap(name, fn)
+    self.saved = replace(wrapped)
+
+  def disable(self):
+    # Restores the original functions.
+    restore(self.saved)
+    self.saved = []
+
+  def wrap(self, name, fn):
+    # Returns a timed version of the function fn.
+    frames = self.frames
+    visits = self.visits
+    active = self.active
+    clock = time.perf_counter
+
+    def timed(*args, **kwargs):
+      node = args[0] if args else None
+      visit = not frames or frames[-1].node is not node
+      f = Frame(name, node, visit)
+      frames.append(f)
+      active[name] = active.get(name, 0) + 1
+      if visit:
+        visits.append(f)
+        cls = type(node)
+        active[cls] = active.get(cls, 0) + 1
+      start = clock()
+      try:
+        return fn(*args, **kwargs)
+      finally:
+        t = clock() - start
+        frames.pop()
+        active[name] -= 1
+        if visit:
+          visits.pop()
+          active[cls] -= 1
+        self.record(f, t)
+
+    return timed
+
+  def record(self, f, t):
+    # Accumulates the time t of the call f.
+    s = self.functions.get(f.name)
+    if s is None:
+      s = self.functions[f.name] = Stats(f.name)
+    s.calls += 1
+    if self.active[f.name] == 0:
+      s.inclusive += t
+    s.exclusive += t - f.children
+
+    stack = tuple(x.name for x in self.frames) + (f.name,)
+    self.stacks[stack] = self.stacks.get(stack, 0.0) + t - f.children
+
+    if self.frames:
+      self.frames[-1].children += t
+
+    if f.visit:
+      cls = type(f.node)
+      s = self.nodes.get(cls.__name__)
+      if s is None:
+        s = self.nodes[cls.__name__] = Stats(cls.__name__)
+      s.calls += 1
+      if self.active[cls] == 0:
+        s.inclusive += t
+      s.exclusive += t - f.visits
+      if self.visits:
+        self.visits[-1].visits += t
+
+  def reset(self):
+    # Discards the statistics collected so far.
+    self.functions.clear()
+    self.nodes.clear()
+    self.stacks.clear()
+
+  def report(self, key = "exclusive", limit = 20):
+    # Returns a table of the functions and of the classes of nodes,
+    # sorted by key (calls, inclusive or exclusive), each with at most
+    # limit rows.
+    lines = []
+    for title, table in (("function", self.functions), ("node", self.nodes)):
+      rows = sorted(table.values(), key = lambda s: getattr(s, key), reverse = True)
+      lines.append(f"{title:24} {'calls':>10} {'inclusive':>12} {'exclusive':>12}")
+      for s in rows[:limit]:
+        lines.append(f"{s.name:24} {s.calls:10} {s.inclusive:12.6f} {s.exclusive:12.6f}")
+      lines.append("")
+    return "\n".join(lines)
+
+  def collapsed(self):
+    # Returns the stacks in the collapsed format, one per line.
+    lines = []
+    for stack, t in sorted(self.stacks.items()):
+      lines.append(f"{';'.join(stack)} {round(t * 1e6)}")
+    return "\n".join(lines)
@@ -51,7 +51,16 @@ class Type:
   #       Ref T1
   #       ...
   #       Dep
-  pass
+  #
+  # Types are compared structurally (see same_node below).
+  def __eq__(self, other):
+    return same_node(self, other)
+
+  def __hash__(self):
+    return hash_node(self)
+
+  def __getstate__(self):
+    return node_state(self)
 
 # Fundamental types
 
@@ -267,10 +276,27 @@ class Expr:
   #         e1.x
   #         <x1=e> as T
   #         case e1 of <xi=li> => ei
+  #
+  # Expressions are compared structurally (see same_node below), so
+  # they can be used as dictionary keys.
   
   def __init__(self):
+    # The type of the expression, computed by check().
     self.type = None
 
+    # The effects of evaluating the expression, computed by
+    # effects().
+    self.effect = None
+
+  def __eq__(self, other):
+    return same_node(self, other)
+
+  def __hash__(self):
+    return hash_node(self)
+
+  def __getstate__(self):
+    return node_state(self)
+
 ## Boolean expressions
 
 class BoolExpr(Expr):
@@ -290,7 +316,7 @@ class AndExpr(Expr):
     self.rhs = expr(e2)
 
   def __str__(self):
-    return f"({self.lhs} and {self.rhs})"
+    return f"({group(self.lhs, opened)} and {self.rhs})"
 
 class OrExpr(Expr):
   # Represents expressions of the form `e1 or e2`.
@@ -300,7 +326,7 @@ class OrExpr(Expr):
     self.rhs = expr(e2)
 
   def __str__(self):
-    return f"({self.lhs} or {self.rhs})"
+    return f"({group(self.lhs, opened)} or {self.rhs})"
 
 class NotExpr(Expr):
   # Represents expressions of the form `not e1`.
@@ -359,27 +385,27 @@ class AddExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} + {self.rhs})"
+    return f"({group(self.lhs, opened)} + {self.rhs})"
 
 class SubExpr(Expr):
-  # Represents expressions of the form `e1 + e2`.
+  # Represents expressions of the form `e1 - e2`.
   def __init__(self, lhs, rhs):
     Expr.__init__(self)
     self.lhs = expr(lhs)
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} + {self.rhs})"
+    return f"({group(self.lhs, opened)} - {self.rhs})"
 
 class MulExpr(Expr):
-  # Represents expressions of the form `e1 - e2`.
+  # Represents expressions of the form `e1 * e2`.
   def __init__(self, lhs, rhs):
     Expr.__init__(self)
     self.lhs = expr(lhs)
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} - {self.rhs})"
+    return f"({group(self.lhs, opened)} * {self.rhs})"
 
 class DivExpr(Expr):
   # Represents expressions of the form `e1 / e2`.
@@ -389,7 +415,7 @@ class DivExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} / {self.rhs})"
+    return f"({group(self.lhs, opened)} / {self.rhs})"
 
 class RemExpr(Expr):
   # Represents expressions of the form `e1 % e2`.
@@ -399,7 +425,7 @@ class RemExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} % {self.rhs})"
+    return f"({group(self.lhs, opened)} % {self.rhs})"
 
 class NegExpr(Expr):
   # Represents expressions of the form `-e1`.
@@ -420,7 +446,7 @@ class EqExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} == {self.rhs})"
+    return f"({group(self.lhs, opened)} == {self.rhs})"
 
 class NeExpr(Expr):
   # Represents expressions of the form `e1 != e2`.
@@ -430,7 +456,7 @@ class NeExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} != {self.rhs})"
+    return f"({group(self.lhs, opened)} != {self.rhs})"
 
 class LtExpr(Expr):
   # Represents expressions of the form `e1 < e2`.
@@ -440,7 +466,7 @@ class LtExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} < {self.rhs})"
+    return f"({group(self.lhs, opened)} < {self.rhs})"
 
 class GtExpr(Expr):
   # Represents expressions of the form `e1 > e2`.
@@ -450,7 +476,7 @@ class GtExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} > {self.rhs})"
+    return f"({group(self.lhs, opened)} > {self.rhs})"
 
 class LeExpr(Expr):
   # Represents expressions of the form `e1 <= e2`.
@@ -460,7 +486,7 @@ class LeExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} <= {self.rhs})"
+    return f"({group(self.lhs, opened)} <= {self.rhs})"
 
 class GeExpr(Expr):
   # Represents expressions of the form `e1 >= e2`.
@@ -470,7 +496,7 @@ class GeExpr(Expr):
     self.rhs = expr(rhs)
 
   def __str__(self):
-    return f"({self.lhs} >= {self.rhs})"
+    return f"({group(self.lhs, opened)} >= {self.rhs})"
 
 ## Lambda terms
 
@@ -483,6 +509,9 @@ class LambdaExpr(Expr):
     self.vars = list(map(decl, vars))
     self.expr = expr(e1)
 
+    # The effects of calling the lambda, computed by effects().
+    self.latent = None
+
   def __str__(self):
     parms = ",".join(str(v) for v in self.vars)
     return f"λ({parms}).{self.expr}"
@@ -497,7 +526,7 @@ class CallExpr(Expr):
 
   def __str__(self):
     args = ",".join(str(a) for a in self.args)
-    return f"{self.fn} ({args})"
+    return f"{group(self.fn)} ({args})"
 
 class PlaceholderExpr(Expr):
   def __init__(self):
@@ -516,7 +545,7 @@ class NewExpr(Expr):
     self.expr = expr(e)
 
   def __str__(self):
-    return f"new {self.expr}"
+    return f"new {group(self.expr)}"
 
 class DerefExpr(Expr):
   # Returns the value at a location.
@@ -525,7 +554,7 @@ class DerefExpr(Expr):
     self.expr = expr(e)
 
   def __str__(self):
-    return f"*{self.expr}"
+    return f"*{group(self.expr)}"
 
 class AssignExpr(Expr):
   # Represents assignment.
@@ -535,7 +564,7 @@ class AssignExpr(Expr):
     self.rhs = expr(e2)
 
   def __str__(self):
-    return f"{self.lhs} = {self.rhs}"
+    return f"{group(self.lhs, opened)} = {self.rhs}"
 
 # Data expressions
 class TupleExpr(Expr):
@@ -544,7 +573,7 @@ class TupleExpr(Expr):
     self.elems = list(map(expr, es))
 
   def __str__(self):
-    es = ",".join(str(e) for e in self.elems)
+    es = ",".join(group(e, (AssignExpr, DerefExpr)) for e in self.elems)
     return f"{{{es}}}"
 
 class ProjExpr(Expr):
@@ -554,7 +583,7 @@ class ProjExpr(Expr):
     self.index = n
 
   def __str__(self):
-    return f"{str(self.obj)}.{self.index}"
+    return f"{group(self.obj)}.{self.index}"
 
 class RecordExpr(Expr):
   def __init__(self, fs):
@@ -573,10 +602,10 @@ class MemberExpr(Expr):
 
     # Binds to the corresponding field declaration, so we can
     # easily determine the type of the expression.
-    self.Ref = None
+    self.ref = None
 
   def __str__(self):
-    return f"{str(self.obj)}.{self.id}"
+    return f"{group(self.obj)}.{self.id}"
 
 class VariantExpr(Expr):
   # Expressions '<x1=e1> as T1'.
@@ -586,7 +615,7 @@ class VariantExpr(Expr):
     self.variant = type_expr(t)
 
   def __str__(self):
-    return f"<{str(self.field)}> as {str(self.type)}"
+    return f"<{str(self.field)}> as {str(self.variant)}"
 
 class Case:
   # An individual case '<l1=x1> => e1'.
@@ -600,7 +629,7 @@ class Case:
     self.expr = expr(e) # The expression to evaluate
   
   def __str__(self):
-    return f"<{str(self.id)}={str(self.var)}> => {str(self.expr)}"
+    return f"<{str(self.id)}={self.var.id}> => {str(self.expr)}"
 
 class CaseExpr(Expr):
   # Expressions 'case e1 of <li=xi> => ei'.
@@ -610,8 +639,11 @@ class CaseExpr(Expr):
     self.cases = list(map(case, cs))
 
   def __str__(self):
-    cs = " | ".join([str(c) for c in self.cases])
-    return f"case {str(self.expr)} of {cs}"
+    # All but the last case are grouped, so that a case within them
+    # does not take the cases that follow.
+    cs = [f"<{c.id}={c.var.id}> => {group(c.expr, opened)}" for c in self.cases[:-1]]
+    cs += [str(c) for c in self.cases[-1:]]
+    return f"case {str(self.expr)} of {' | '.join(cs)}"
 
 # Polymorphic terms
 
@@ -638,7 +670,7 @@ class InstExpr(Expr):
 
   def __str__(self):
     ts = ",".join([str(t) for t in self.args])
-    return f"{str(self.gen)} [{ts}]"
+    return f"{group(self.gen)} [{ts}]"
 
 class PackExpr(Expr):
   # Terms of the form '{*t1, e} as t2', which embed concrete
@@ -647,12 +679,12 @@ class PackExpr(Expr):
   # is unpacking them (see below).
   def __init__(self, t1, e, t2):
     Expr.__init__(self)
-    self.rep = t2 # The representation type
+    self.rep = t1 # The representation type
     self.expr = e # The representation value
     self.exist = t2 # The existential type
 
   def __str__(self):
-    return f"{{*{str(self.rep)},{str(self.expr)} as {str(self.exist)}"
+    return f"{{*{str(self.rep)},{str(self.expr)}}} as {str(self.exist)}"
 
 class UnpackExpr(Expr):
   # Terms of the form 'let {[Xi], x}=e1 in e2'.
@@ -672,7 +704,137 @@ class UnpackExpr(Expr):
     self.expr = e2 # remaining expression
 
   def __str__(self):
-    return f"{{*{str(self.rep)},{str(self.expr)} as {str(self.exist)}"
+    vs = ",".join(str(v) for v in self.vars)
+    return f"let {{[{vs}],{self.var.id}}}={str(self.pack)} in {str(self.expr)}"
+
+# Structural hashing and equality
+#
+# Two expressions (or types) are equal when they are built by the same
+# constructors from equal parts. Annotations computed by resolution and
+# checking (the type of an expression and the declarations that names
+# are bound to) are not part of the structure, so two uses of the same
+# name are equal, even if they are bound to different declarations.
+#
+# The variable of a case is declared without a type, which checking
+# computes and assigns to it, so that type is an annotation too: only
+# the name of the variable is part of the structure of a case. The
+# declared types of other declarations (e.g., the parameters of a
+# lambda) are part of the structure.
+#
+# The hash of a node is computed once and cached in the node. Since
+# resolution and checking only write annotations, annotating a node
+# does not change its hash. The structure of a node should not be
+# modified after it has been hashed. The cached hash is not pickled
+# (see node_state).
+
+# Declarations are compared structurally as parts of nodes, but they
+# keep identity semantics of their own since they are used as keys
+# in environments and substitutions.
+parts = (VarDecl, TypeDecl, FieldDecl, FieldInit, Case)
+
+def is_annotation(x, k):
+  # Returns true if the attribute k of the node x is an annotation
+  # rather than part of its structure.
+  if k == "hash":
+    return True
+  if isinstance(x, Expr):
+    return k in ("type", "ref", "effect", "latent")
+  if type(x) is IdType:
+    return k == "ref"
+  return False
+
+def node_state(x):
+  # Returns the attributes of x to be pickled. The cached hash is left
+  # out: it depends on the hashes of classes, which differ from one
+  # process to the next.
+  state = dict(vars(x))
+  state.pop("hash", None)
+  return state
+
+def structure(x):
+  # Returns the structural attributes of x.
+  return [v for k, v in vars(x).items() if not is_annotation(x, k)]
+
+def hash_node(x):
+  # Returns the (cached) structural hash of the node x.
+  h = x.__dict__.get("hash")
+  if h is None:
+    h = hash((type(x), *map(hash_part, structure(x))))
+    x.hash = h
+  return h
+
+def part_structure(v):
+  # Returns the structural attributes of the part v of a node.
+  if type(v) is Case:
+    return [v.id, v.var.id, v.expr]
+  return [w for k, w in vars(v).items() if not is_annotation(v, k)]
+
+def hash_part(v):
+  # Returns the structural hash of a part of a node.
+  if type(v) is list:
+    return hash(tuple(map(hash_part, v)))
+  if isinstance(v, parts):
+    return hash((type(v), *map(hash_part, part_structure(v))))
+  return hash(v)
+
+def same_node(x, y):
+  # Returns true if the nodes x and y are structurally equal. Nodes
+  # with different hashes are rejected without further comparison.
+  if x is y:
+    return True
+  if type(x) is not type(y):
+    return False
+  if hash_node(x) != hash_node(y):
+    return False
+  return all(map(same_part, structure(x), structure(y)))
+
+def same_part(v, w):
+  # Returns true if two parts of a node are structurally equal.
+  if type(v) is not type(w):
+    return False
+  if type(v) is list:
+    return len(v) == len(w) and all(map(same_part, v, w))
+  if isinstance(v, parts):
+    return all(map(same_part, part_structure(v), part_structure(w)))
+  return v == w
+
+# Traversal
+
+def children(e):
+  # Yields the immediate subexpressions of the expression e, in the
+  # order in which they appear in the node.
+  for k, v in vars(e).items():
+    if is_annotation(e, k):
+      continue
+    if type(v) is not list:
+      v = [v]
+    for x in v:
+      if isinstance(x, Expr):
+        yield x
+      elif type(x) is FieldInit:
+        yield x.value
+      elif type(x) is Case:
+        yield x.expr
+
+# Printing
+#
+# Expressions are printed so that they can be parsed back (see
+# parse.py). Some forms extend as far to the right as they can (e.g.,
+# the body of a lambda), and some bind less tightly than a call or a
+# projection; these are put in parentheses where they would otherwise
+# take in what follows them.
+
+# The forms that extend as far to the right as they can.
+opened = (LambdaExpr, GenericExpr, CaseExpr, AssignExpr, UnpackExpr)
+
+# The forms that bind less tightly than a call.
+loose = opened + (NewExpr, DerefExpr, VariantExpr, PackExpr)
+
+def group(e, forms = loose):
+  # Returns the text of e, in parentheses if it is one of the forms.
+  if isinstance(e, forms):
+    return f"({e})"
+  return str(e)
 
 def type_expr(x):
   if x is bool:
@@ -722,8 +884,21 @@ def case(x):
     return Case(x[0], x[1], x[2])
   return x
 
+from annotate import Annotations, SideTable
 from lookup import resolve
 from check import check
 from substitute import subst_expr, subst_type, subst
 from evaluate import evaluate
 from instantiate import instantiate
+from template import instantiate_template
+from effects import effects, latent, describe, PURE, ALLOCATES, READS, WRITES
+from generate import generate, write_corpus, read_corpus
+from instrument import Profiler
+from sample import Sampler
+from pipeline import Pipeline, Phase
+from quota import Quota, QuotaExceeded
+from batch import Batch, run_batch
+from serialize import dump, load, dump_file, load_file
+from cache import Cache
+from parse import parse, parse_type, parse_file, ParseError
+from pretty import pretty, render
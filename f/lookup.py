@@ -1,5 +1,6 @@
 from lang import *
 from decorate import *
+from annotate import *
 
 @checked
 def lookup(id : str, scope : list):
@@ -12,27 +13,30 @@ def lookup(id : str, scope : list):
   return None
 
 @checked
-def resolve_unary_expr(e : Expr, scope : list):
-  resolve_expr(e.expr, scope)
+def resolve_unary_expr(e : Expr, scope : list, a : Annotations):
+  resolve_expr(e.expr, scope, a)
   return e
 
 @checked
-def resolve_binary_expr(e : Expr, scope : list):
-  resolve_expr(e.lhs, scope)
-  resolve_expr(e.rhs, scope)
+def resolve_binary_expr(e : Expr, scope : list, a : Annotations):
+  resolve_expr(e.lhs, scope, a)
+  resolve_expr(e.rhs, scope, a)
   return e
 
-def resolve_exprs(es, scope):
+def resolve_exprs(es, scope, a):
   # Resolve each expression in es.
   for e in es:
-    resolve_expr(e, scope)
+    resolve_expr(e, scope, a)
 
 @checked
-def resolve_expr(e : Expr, scope : list):
+def resolve_expr(e : Expr, scope : list, a : Annotations = inplace):
   # Resolve references to declared variables. This requires a scope
   # stack. A scope is a mappings from names to their declarations.
   #
-  # Returns the modified (in-place) tree.
+  # Bindings are recorded in the annotation layer a. By default, that
+  # modifies the tree in place.
+  #
+  # Returns the tree.
 
   # Boolean expressions
 
@@ -40,18 +44,18 @@ def resolve_expr(e : Expr, scope : list):
     return e
 
   if type(e) is AndExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is OrExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is NotExpr:
-    return resolve_unary_expr(e, scope)
+    return resolve_unary_expr(e, scope, a)
 
   if type(e) is IfExpr:
-    resolve_expr(e.cond, scope)
-    resolve_expr(e.true, scope)
-    resolve_expr(e.false, scope)
+    resolve_expr(e.cond, scope, a)
+    resolve_expr(e.true, scope, a)
+    resolve_expr(e.false, scope, a)
     return e
 
   # Arithmetic expressions
@@ -60,42 +64,42 @@ def resolve_expr(e : Expr, scope : list):
     return e
 
   if type(e) is AddExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is SubExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is MulExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is DivExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is RemExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is NegExpr:
-    return resolve_unary_expr(e, scope)
+    return resolve_unary_expr(e, scope, a)
 
   # Relational expressions
 
   if type(e) is EqExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is NeExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is LtExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is GtExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is LeExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   if type(e) is GeExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   # Lambda expressions
 
@@ -108,94 +112,94 @@ def resolve_expr(e : Expr, scope : list):
       raise Exception(f"'{str(d)}' does not declare a value")
 
     # Bind the expression to its declaration.
-    e.ref = d
+    a.bind(e, d)
     return e
 
   if type(e) is LambdaExpr:
     # Because of generics, we have to resolve parameter types.
     for v in e.vars:
-      resolve_type(v.type, scope)
+      resolve_type(v.type, scope, a)
 
     # Create a new stack for resolving parameters.
     new = scope + [{var.id:var for var in e.vars}]
-    resolve_expr(e.expr, new)
+    resolve_expr(e.expr, new, a)
     return e
 
   if type(e) is CallExpr:
-    resolve_expr(e.fn, scope)
-    resolve_exprs(e.args, scope)
+    resolve_expr(e.fn, scope, a)
+    resolve_exprs(e.args, scope, a)
     return e
 
   # Reference expressions
 
   if type(e) is NewExpr:
-    return resolve_unary_expr(e, scope)
+    return resolve_unary_expr(e, scope, a)
 
   if type(e) is DerefExpr:
-    return resolve_unary_expr(e, scope)
+    return resolve_unary_expr(e, scope, a)
 
   if type(e) is AssignExpr:
-    return resolve_binary_expr(e, scope)
+    return resolve_binary_expr(e, scope, a)
 
   # Data expressions
 
   if type(e) is TupleExpr:
-    resolve_exprs(e.elems, scope)
+    resolve_exprs(e.elems, scope, a)
     return e
 
   if type(e) is ProjExpr:
     # We can't check the validity of the index because
     # we don't haver the type of the object, only the
     # expression that computes the tuple.
-    resolve_expr(e.obj)
+    resolve_expr(e.obj, scope, a)
     return e
 
   if type(e) is RecordExpr:
     for f in e.fields:
-      resolve_expr(f.value)
+      resolve_expr(f.value, scope, a)
     return e
 
   if type(e) is MemberExpr:
     # We can't check the validity of the index because
     # we don't haver the type of the object, only the
     # expression that computes the tuple.
-    resolve_expr(e.obj)
+    resolve_expr(e.obj, scope, a)
     return e
 
   if type(e) is VariantExpr:
     # We could hypothetically check the label against the
     # type, but we'll defer until typing so that all of
     # these operations are done at the same time.
-    resolve_expr(e.field.value)
+    resolve_expr(e.field.value, scope, a)
     return e
 
   if type(e) is CaseExpr:
-    resolve(e.expr)
+    resolve_expr(e.expr, scope, a)
     for c in e.cases:
-      new = scope + [{c.var.id, c.var}]
-      resolve_expr(c.expr, new)
+      new = scope + [{c.var.id:c.var}]
+      resolve_expr(c.expr, new, a)
     return e
 
   if type(e) is GenericExpr:
     # Push type variables and resolve expression.
     new = scope + [{var.id:var for var in e.vars}]
-    resolve_expr(e.expr, new)
+    resolve_expr(e.expr, new, a)
     return e
 
   if type(e) is InstExpr:
-    resolve_expr(e.gen, scope)
-    resolve_types(e.args, scope)
+    resolve_expr(e.gen, scope, a)
+    resolve_types(e.args, scope, a)
     return e
 
   print(repr(e))
   assert False
 
-def resolve_types(ts, scope):
+def resolve_types(ts, scope, a):
   # Recursively resolve a list of types.
   for t in ts:
-    resolve(t, scope)
+    resolve_type(t, scope, a)
 
-def resolve_type(t : Type, scope : list = []):
+def resolve_type(t : Type, scope : list = [], a : Annotations = inplace):
   # Lookup and resolve id types in t.
 
   # Fundamental types
@@ -209,30 +213,30 @@ def resolve_type(t : Type, scope : list = []):
   # Functional types
 
   if type(t) is FnType:
-    resolve_types(t.parms, scope)
-    resolve_type(t.ret, scope)
+    resolve_types(t.parms, scope, a)
+    resolve_type(t.ret, scope, a)
     return t
 
   # Reference types
 
   if type(t) is RefType:
-    resolve_type(t.ref, scope)
+    resolve_type(t.ref, scope, a)
     return t
 
   # Data types
 
   if type(t) is TupleType:
-    resolve_types(t.elems, scope)
+    resolve_types(t.elems, scope, a)
     return t
 
   if type(t) is RecordType:
     for f in t.fields:
-      resolve(f.type, scope)
+      resolve_type(f.type, scope, a)
     return t
 
   if type(t) is VariantType:
     for f in t.fields:
-      resolve(f.type, scope)
+      resolve_type(f.type, scope, a)
     return t
 
   # Polymorphic types
@@ -246,28 +250,28 @@ def resolve_type(t : Type, scope : list = []):
       raise Exception(f"'{str(d)}' does not declare a type")
 
     # Bind the expression to its declaration.
-    t.ref = d
+    a.bind(t, d)
     return t
 
   if type(t) is UniversalType:
     # Push a new lexical scope for type variables.
     new = scope + [{p.id:p for p in t.parms}]
-    resolve(t.type, new)
+    resolve_type(t.type, new, a)
     return t
 
   if type(t) is ExistentialType:
     # Push a new lexical scope for type variables.
     new = scope + [{p.id:p for p in t.parms}]
-    resolve(t.type, new)
+    resolve_type(t.type, new, a)
     return t
 
   print(repr(t))
   assert False
 
-def resolve(x, scope = []):
+def resolve(x, scope = [], a = inplace):
   if isinstance(x, Expr):
-    return resolve_expr(x, scope)
+    return resolve_expr(x, scope, a)
   if isinstance(x, Type):
-    return resolve_type(x, scope)
+    return resolve_type(x, scope, a)
   print(repr(x))
   assert False
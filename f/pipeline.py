@@ -0,0 +1,182 @@
+import json
+import time
+import tracemalloc
+
+from lang import *
+from annotate import *
+
+# This module runs the phases of the language on a program and records
+# where the time and memory go.
+#
+# The usual pipeline resolves and checks a program, instantiates its
+# generics, resolves and checks the instance, and evaluates it. For
+# each phase, a Pipeline records:
+#
+#   wall   -- the elapsed time of the phase, in seconds
+#   cpu    -- the processor time of the phase, in seconds
+#   nodes  -- the number of nodes of the program it is given (nodes_in)
+#             and of the one it produces (nodes_out, or None when the
+#             phase produces a value rather than a program)
+#   peak   -- the peak memory allocated during the phase, in bytes, or
+#             None when memory is not traced
+#
+# Memory is traced with tracemalloc, which slows every allocation, so
+# it can be turned off. Node counts are taken between phases, and do
+# not count towards the time of any phase.
+#
+# The results of a run are returned as a Run. When a log file is
+# given, each run is also appended to it as a JSON record on a line of
+# its own, so that the logs of many runs can be aggregated (e.g., into
+# percentiles of the time of each phase).
+#
+# Usage:
+#
+#   p = Pipeline(log = "phases.jsonl")
+#   r = p.run(e)
+#   print(r.value, r.phase("check").wall)
+
+def count(e):
+  # Returns the number of nodes in the expression e.
+  n = 0
+  todo = [e]
+  while todo:
+    x = todo.pop()
+    n += 1
+    todo.extend(children(x))
+  return n
+
+class Phase:
+  # A phase of the pipeline: a name and a function that maps a program
+  # and an annotation layer to the input of the next phase. When keep
+  # is true, the function's result is discarded, and the phase passes
+  # its own input on (e.g., check returns a type).
+  def __init__(self, name, fn, keep = False):
+    self.name = name
+    self.fn = fn
+    self.keep = keep
+
+class Measure:
+  # The measures of a single phase of a run.
+  def __init__(self, name, wall, cpu, nodes_in, nodes_out, peak):
+    self.name = name
+    self.wall = wall
+    self.cpu = cpu
+    self.nodes_in = nodes_in
+    self.nodes_out = nodes_out
+    self.peak = peak
+
+  def __str__(self):
+    peak = "-" if self.peak is None else self.peak
+    nodes_in = "-" if self.nodes_in is None else self.nodes_in
+    out = "-" if self.nodes_out is None else self.nodes_out
+    return f"{self.name:12} {self.wall:10.6f}s {self.cpu:10.6f}s " \
+           f"{nodes_in:>8} -> {out:<8} {peak:>10} B"
+
+  def record(self):
+    # Returns the measures as a dictionary.
+    return dict(vars(self))
+
+class Run:
+  # The result of running a pipeline on a program: the value (or the
+  # program, if the last phase produces one) and the measures of each
+  # phase, in order.
+  def __init__(self, value, measures, tag = None):
+    self.value = value
+    self.measures = measures
+    self.tag = tag
+
+    # The time at which the run finished, in seconds since the epoch.
+    self.time = time.time()
+
+  def __str__(self):
+    return "\n".join(str(m) for m in self.measures)
+
+  def phase(self, name):
+    # Returns the measures of the first phase with the given name.
+    for m in self.measures:
+      if m.name == name:
+        return m
+    raise Exception(f"no phase named '{name}'")
+
+  def wall(self):
+    return sum(m.wall for m in self.measures)
+
+  def cpu(self):
+    return sum(m.cpu for m in self.measures)
+
+  def record(self):
+    # Returns the run as a dictionary, ready to be written as JSON.
+    return {
+      "time": self.time,
+      "tag": self.tag,
+      "wall": self.wall(),
+      "cpu": self.cpu(),
+      "phases": [m.record() for m in self.measures],
+    }
+
+def default_phases():
+  # Returns the phases of the usual pipeline. Resolution and checking
+  # are repeated after instantiation, since the instance is a new tree.
+  return [
+    Phase("resolve", lambda e, a: resolve(e, [], a)),
+    Phase("check", lambda e, a: check(e, a), keep = True),
+    Phase("instantiate", lambda e, a: instantiate(e, {}, a)),
+    Phase("resolve", lambda e, a: resolve(e, [], a)),
+    Phase("check", lambda e, a: check(e, a), keep = True),
+    Phase("evaluate", lambda e, a: evaluate(e, {}, [], a)),
+  ]
+
+class Pipeline:
+  def __init__(self, phases = None, memory = True, log = None):
+    # The phases to run, in order (by default, the usual pipeline).
+    if phases is None:
+      phases = default_phases()
+    self.phases = phases
+
+    # True if the peak memory of each phase is traced.
+    self.memory = memory
+
+    # The path of the file to which runs are appended, if any.
+    self.log = log
+
+  def run(self, e, a = None, tag = None):
+    # Runs the phases on the expression e, with the annotation layer a
+    # (by default, a new SideTable, so e is not modified by resolution
+    # or checking). The tag is recorded with the run, e.g. to tell
+    # requests apart in the log.
+    if a is None:
+      a = SideTable()
+    tracing = self.memory and not tracemalloc.is_tracing()
+    if tracing:
+      tracemalloc.start()
+    try:
+      measures = []
+      x = e
+      n = count(x)
+      for p in self.phases:
+        if self.memory:
+          tracemalloc.reset_peak()
+          base = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        y = p.fn(x, a)
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        peak = None
+        if self.memory:
+          peak = tracemalloc.get_traced_memory()[1] - base
+        out = n
+        if not p.keep:
+          x = y
+          out = count(x) if isinstance(x, Expr) else None
+        measures.append(Measure(p.name, wall, cpu, n, out, peak))
+        n = out
+    finally:
+      if tracing:
+        tracemalloc.stop()
+    r = Run(x, measures, tag)
+    if self.log is not None:
+      with open(self.log, "a") as f:
+        f.write(json.dumps(r.record()))
+        f.write("\n")
+    return r
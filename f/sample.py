@@ -0,0 +1,220 @@
+import threading
+import time
+
+from lang import *
+from instrument import replace, restore
+
+# This module profiles programs, rather than the interpreter.
+#
+# A Python profiler (or the one in instrument.py) shows which handlers
+# of the interpreter are hot, e.g. eval_call, but not which lambdas of
+# the program being evaluated. A Sampler keeps a shadow stack of the
+# calls of the program while it is evaluated, and samples that stack
+# either every so many evaluation steps (calls of evaluate) or, from a
+# timer thread, every so many seconds. Samples are aggregated by the
+# lambda called, so that:
+#
+#   self   -- is the number of samples taken while the lambda was at
+#             the top of the stack (i.e., evaluating its own body)
+#   total  -- is the number of samples taken while the lambda was on
+#             the stack at all (each sample counts once per lambda)
+#
+# A call enters its lambda once its arguments have been evaluated, so
+# time spent evaluating the arguments is charged to the caller.
+#
+# Lambdas have no names of their own, so each is named after the
+# first variable it was called through (e.g. 'f'), or when it is only
+# called directly, after its text, cut short. Lambdas that would share
+# a name are numbered (e.g. 'f#2').
+#
+# Like the Profiler in instrument.py, a Sampler rebinds evaluate,
+# eval_lambda and eval_call while it is enabled, and restores them when
+# it is disabled.
+#
+# Usage:
+#
+#   with Sampler(steps = 1000) as s:
+#     evaluate(e, {}, [])
+#   print(s.report())
+#   print(s.collapsed())
+
+class Call:
+  # An active call of the program. The lambda is None until the call
+  # enters the lambda's body.
+  def __init__(self, site):
+    self.site = site
+    self.abs = None
+
+class Sampler:
+  def __init__(self, steps = 1000, interval = None):
+    # Take a sample every steps evaluation steps or, when interval is
+    # given, every interval seconds.
+    self.steps = steps
+    self.interval = interval
+
+    # The shadow stack of calls.
+    self.stack = []
+
+    # Samples by stack of lambdas (as a tuple of their ids).
+    self.samples = {}
+
+    # The lambdas whose closures were made while sampling, by the ids
+    # of their bodies, and the first variable each was called through,
+    # by the id of the lambda.
+    self.bodies = {}
+    self.callers = {}
+
+    self.saved = []
+    self.thread = None
+    self.running = False
+
+  def __enter__(self):
+    self.enable()
+    return self
+
+  def __exit__(self, *args):
+    self.disable()
+
+  def enable(self):
+    if self.saved:
+      return
+    import evaluate
+    self.saved = replace({
+      evaluate.evaluate: self.wrap_evaluate(evaluate.evaluate),
+      evaluate.eval_lambda: self.wrap_lambda(evaluate.eval_lambda),
+      evaluate.eval_call: self.wrap_call(evaluate.eval_call),
+    })
+    if self.interval is not None:
+      self.running = True
+      self.thread = threading.Thread(target = self.timer, daemon = True)
+      self.thread.start()
+
+  def disable(self):
+    if self.thread is not None:
+      self.running = False
+      self.thread.join()
+      self.thread = None
+    restore(self.saved)
+    self.saved = []
+
+  def timer(self):
+    # Samples the stack every interval seconds, until disabled.
+    while self.running:
+      time.sleep(self.interval)
+      self.sample()
+
+  def wrap_evaluate(self, fn):
+    # Counts the steps and notices when a call enters a lambda.
+    stack = self.stack
+    bodies = self.bodies
+    callers = self.callers
+    count = [self.steps]
+    sampled = self.interval is None
+
+    def evaluate(e, *args, **kwargs):
+      if stack and stack[-1].abs is None and id(e) in bodies:
+        c = stack[-1]
+        c.abs = bodies[id(e)]
+        if type(c.site.fn) is IdExpr and id(c.abs) not in callers:
+          callers[id(c.abs)] = c.site.fn.id
+      if sampled:
+        count[0] -= 1
+        if count[0] == 0:
+          count[0] = self.steps
+          self.sample()
+      return fn(e, *args, **kwargs)
+
+    return evaluate
+
+  def wrap_lambda(self, fn):
+    # Records the lambdas whose bodies may be entered.
+    bodies = self.bodies
+
+    def eval_lambda(e, *args, **kwargs):
+      bodies[id(e.expr)] = e
+      return fn(e, *args, **kwargs)
+
+    return eval_lambda
+
+  def wrap_call(self, fn):
+    # Pushes and pops the calls of the program.
+    stack = self.stack
+
+    def eval_call(e, *args, **kwargs):
+      stack.append(Call(e))
+      try:
+        return fn(e, *args, **kwargs)
+      finally:
+        stack.pop()
+
+    return eval_call
+
+  def sample(self):
+    # Records the lambdas on the stack. The stack may change during a
+    # sample from the timer thread, so a copy is used.
+    key = tuple(id(c.abs) for c in list(self.stack) if c.abs is not None)
+    self.samples[key] = self.samples.get(key, 0) + 1
+
+  def names(self):
+    # Returns the names of the lambdas sampled, by their ids. Lambdas
+    # are named in the order their closures were first made.
+    sampled = {k for key in self.samples for k in key}
+    names = {}
+    taken = set()
+    for abs in self.bodies.values():
+      k = id(abs)
+      if k not in sampled or k in names:
+        continue
+      n = self.callers.get(k)
+      if n is None:
+        n = str(abs)
+        if len(n) > 40:
+          n = n[:37] + "..."
+      if n in taken:
+        i = 2
+        while f"{n}#{i}" in taken:
+          i += 1
+        n = f"{n}#{i}"
+      taken.add(n)
+      names[k] = n
+    return names
+
+  def stacks(self):
+    # Returns the samples by stack of lambda names.
+    names = self.names()
+    stacks = {}
+    for key, k in self.samples.items():
+      key = tuple(names[x] for x in key)
+      stacks[key] = stacks.get(key, 0) + k
+    return stacks
+
+  def ranked(self):
+    # Returns a list of (name, self, total) for each lambda sampled,
+    # from the hottest (by self samples) to the coldest.
+    own = {}
+    total = {}
+    for key, k in self.stacks().items():
+      if key:
+        own[key[-1]] = own.get(key[-1], 0) + k
+      for n in set(key):
+        total[n] = total.get(n, 0) + k
+    rows = [(n, own.get(n, 0), t) for n, t in total.items()]
+    return sorted(rows, key = lambda r: (-r[1], -r[2], r[0]))
+
+  def report(self, limit = 20):
+    # Returns a table of the lambdas, ranked by self samples, with the
+    # percentage of all samples taken.
+    n = sum(self.samples.values()) or 1
+    lines = [f"{'lambda':40} {'self':>8} {'%':>6} {'total':>8} {'%':>6}"]
+    for name, own, total in self.ranked()[:limit]:
+      lines.append(f"{name:40} {own:8} {100 * own / n:6.1f} {total:8} {100 * total / n:6.1f}")
+    return "\n".join(lines)
+
+  def collapsed(self):
+    # Returns the sampled stacks in the collapsed format read by flame
+    # graph tools, one per line. Samples outside any lambda are charged
+    # to '<main>'.
+    lines = []
+    for key, k in sorted(self.stacks().items()):
+      lines.append(f"{';'.join(('<main>',) + key)} {k}")
+    return "\n".join(lines)
@@ -0,0 +1,416 @@
+import gc
+import struct
+import sys
+
+from array import array
+from itertools import chain
+
+from lang import *
+from annotate import *
+
+# This module writes programs in a compact binary format, and reads
+# them back.
+#
+# Programs are graphs of Python objects: expressions, types and the
+# declarations that resolution binds names to. They can be pickled,
+# but pickles are large, and reading one runs arbitrary code. The
+# format here only holds the nodes of the language, and is read from
+# any buffer (e.g., bytes).
+#
+# Each node, type, declaration and list of the program is a record: a
+# class code and one 32-bit word for each attribute of the class (or,
+# for a list, the code LIST and a word for each element). The low 3
+# bits of a word are a tag:
+#
+#   NONE     -- None
+#   BOOL     -- False or True (the rest of the word is 0 or 1)
+#   INT      -- a small integer (zig-zag encoded in the rest of the word)
+#   STR      -- a string, by its index in the table of strings
+#   FLOAT    -- a float, by the index of its text
+#   BIG      -- a large integer, by the index of its text
+#   RECORD   -- a record, by its index
+#
+# Records refer to each other by index, so a declaration (or any other
+# object) that is referred to from many places is written once, and
+# reading the program restores the sharing (and any cycles). Types are
+# interned: structurally equal types (including the declarations that
+# type names are bound to) are written as a single record, and are
+# read as a single object. The annotations of a node (its type, binding
+# and effects) are read from an annotation layer when it is written,
+# and written to one when it is read, so a program can be resolved and
+# checked before it is written and used without being checked again
+# once it is read.
+#
+# The buffer starts with a header of words:
+#
+#   magic, version, classes, strings, records, root,
+#   offset of the classes, of the strings, of the codes, of the starts
+#   and of the fields
+#
+# where the offsets are in bytes, and words are little-endian. The
+# classes section lists, for each class code, the string index of the
+# name of the class, the number of its attributes and their names. The
+# same class may have several codes, if its instances do not all have
+# the same attributes. The strings section has the byte offset of each
+# string (and of the end of the last), followed by the strings in
+# UTF-8. The codes section has the class code of each record, and the
+# starts section the index of its first word in the fields section
+# (and the end of the last), which holds the words of the records.
+#
+# A program is read whole. Its nodes are not decoded lazily, when they
+# are first used: the passes over programs dispatch on the class of
+# each node and walk its attributes (see structure in lang.py), so
+# every node they reach must be a complete object. The objects of all
+# records are made first, then all the words of the fields are
+# decoded, and then each object is given its attributes. Each of these
+# steps is a single pass over an array, so reading a program takes time
+# linear in its size and does not recurse. Reading a checked program takes about a third of
+# the time of resolving and checking it again; writing one takes about
+# as long as that, and recurses as deeply as the program is nested.
+
+MAGIC = 0x54534146 # 'FAST'
+VERSION = 2
+
+NONE, BOOL, INT, STR, FLOAT, BIG, RECORD = range(7)
+
+# The code of lists; classes are numbered from 1.
+LIST = 0
+
+# The largest (and smallest) integer encoded in a word.
+SMALL = 1 << 27
+
+HEADER = struct.Struct("<11I")
+
+# The annotations of a node, by attribute, and the methods of an
+# annotation layer that get and set them.
+annotations = {
+  "ref": ("ref", "bind"),
+  "type": ("type", "assign"),
+  "effect": ("effect", "set_effect"),
+  "latent": ("latent", "set_latent"),
+}
+
+# The classes of objects that are written as records.
+nodes = (Expr, Type, VarDecl, TypeDecl, FieldDecl, FieldInit, Case)
+
+class Writer:
+  def __init__(self, a = inplace):
+    # The annotation layer that annotations are read from.
+    self.a = a
+
+    # The strings and their indexes.
+    self.strings = []
+    self.string_index = {}
+
+    # The classes with the names of their attributes, and their codes,
+    # with the names and the getters of the annotations among them.
+    self.classes = []
+    self.codes = {}
+
+    # The code and the words of each record.
+    self.record_codes = []
+    self.records = []
+
+    # The words of the objects written, by object id, and of the types
+    # (and lists in types) written, by their contents.
+    self.written = {}
+    self.interned = {}
+
+    # The objects written, so that their ids are not reused.
+    self.objects = []
+
+  def string(self, s):
+    # Returns the index of the string s.
+    i = self.string_index.get(s)
+    if i is None:
+      i = self.string_index[s] = len(self.strings)
+      self.strings.append(s)
+    return i
+
+  def klass(self, v):
+    # Returns the code of the class of v, the names of its attributes
+    # and, for each, the method of the annotation layer that gets it,
+    # or None if it is not an annotation.
+    d = vars(v)
+    names = tuple(d)
+    if "hash" in d:
+      names = tuple(k for k in names if k != "hash")
+    key = (type(v), names)
+    c = self.codes.get(key)
+    if c is None:
+      getters = [getattr(self.a, annotations[k][0])
+                 if k in annotations and is_annotation(v, k) else None
+                 for k in names]
+      c = self.codes[key] = (len(self.classes) + 1, names, getters)
+      self.classes.append((type(v), names))
+    return c
+
+  def word(self, v, interned = False):
+    # Returns the word for the value v, writing records as needed.
+    # Lists are interned by their contents if interned is true.
+    if v is None:
+      return NONE
+    t = type(v)
+    if t is bool:
+      return BOOL | (int(v) << 3)
+    if t is int:
+      if -SMALL <= v < SMALL:
+        return INT | ((v << 1 if v >= 0 else (-v << 1) - 1) << 3)
+      return BIG | (self.string(str(v)) << 3)
+    if t is float:
+      return FLOAT | (self.string(repr(v)) << 3)
+    if t is str:
+      return STR | (self.string(v) << 3)
+    w = self.written.get(id(v))
+    if w is not None:
+      return w
+    if t is list:
+      ws = [self.word(x, interned) for x in v]
+      if interned:
+        return self.intern(v, LIST, ws)
+      return self.record(v, LIST, ws)
+    if not isinstance(v, nodes):
+      raise Exception(f"cannot serialize '{t.__name__}'")
+    code, names, getters = self.klass(v)
+    if isinstance(v, Type):
+      # Types are written after their parts, so that equal types have
+      # equal contents. A type name that is not bound yet is not
+      # interned, since it may be bound to different declarations.
+      ws = self.fields(v, names, getters, True)
+      if t is IdType and self.a.ref(v) is None:
+        return self.record(v, code, ws)
+      return self.intern(v, code, ws)
+    # Other objects are written before their parts, which may refer
+    # back to them.
+    w = self.record(v, code, None)
+    self.records[w >> 3] = self.fields(v, names, getters, False)
+    return w
+
+  def fields(self, v, names, getters, interned):
+    # Returns the words of the attributes names of v.
+    d = vars(v)
+    word = self.word
+    return [word(d[k] if get is None else get(v), interned)
+            for k, get in zip(names, getters)]
+
+  def record(self, v, code, ws):
+    # Adds the record ws, of the class code, for v, and returns its word.
+    w = RECORD | (len(self.records) << 3)
+    self.record_codes.append(code)
+    self.records.append(ws)
+    self.written[id(v)] = w
+    self.objects.append(v)
+    return w
+
+  def intern(self, v, code, ws):
+    # Returns the word of the record ws for v, which is only added if no
+    # equal record was.
+    key = (code, *ws)
+    w = self.interned.get(key)
+    if w is None:
+      w = self.interned[key] = self.record(v, code, ws)
+    else:
+      self.written[id(v)] = w
+      self.objects.append(v)
+    return w
+
+  def bytes(self, root):
+    # Returns the buffer for the program whose root has the word root.
+    classes = []
+    for cls, names in self.classes:
+      classes += [self.string(cls.__name__), len(names)]
+      classes += [self.string(k) for k in names]
+
+    strings = [s.encode("utf-8") for s in self.strings]
+    offsets = [0]
+    for s in strings:
+      offsets.append(offsets[-1] + len(s))
+    text = b"".join(strings)
+    text += b"\0" * (-len(text) % 4)
+
+    starts = [0]
+    for ws in self.records:
+      starts.append(starts[-1] + len(ws))
+
+    at_classes = HEADER.size
+    at_strings = at_classes + 4 * len(classes)
+    at_codes = at_strings + 4 * len(offsets) + len(text)
+    at_starts = at_codes + 4 * len(self.records)
+    at_fields = at_starts + 4 * len(starts)
+    header = HEADER.pack(MAGIC, VERSION, len(self.classes), len(self.strings),
+                         len(self.records), root, at_classes, at_strings,
+                         at_codes, at_starts, at_fields)
+    return b"".join([header, words(classes), words(offsets), text,
+                     words(self.record_codes), words(starts),
+                     words(chain.from_iterable(self.records))])
+
+def words(ws):
+  # Returns the little-endian bytes of the words ws.
+  a = array("I", ws)
+  if sys.byteorder != "little":
+    a.byteswap()
+  return a.tobytes()
+
+class Constants(dict):
+  # The values of the words that are not records, decoded when first
+  # needed.
+  def __init__(self, reader):
+    self.reader = reader
+
+  def __missing__(self, w):
+    v = self[w] = self.reader.value(w)
+    return v
+
+class Reader:
+  def __init__(self, data, a = inplace):
+    # Reads the program in data (bytes or any other buffer),
+    # writing its annotations to the layer a.
+    self.data = memoryview(data)
+    self.a = a
+    if len(self.data) < HEADER.size or len(self.data) % 4:
+      raise Exception("invalid program buffer")
+    magic, version, classes, strings, records, root, \
+      at_classes, at_strings, at_codes, at_starts, at_fields = HEADER.unpack_from(self.data)
+    if magic != MAGIC:
+      raise Exception("invalid program buffer")
+    if version != VERSION:
+      raise Exception(f"unsupported program version {version}")
+    if sys.byteorder != "little":
+      raise Exception("programs can only be read on little-endian machines")
+    self.root_word = root
+
+    ws = self.data.cast("I")
+    self.string_offsets = ws[at_strings // 4 : at_strings // 4 + strings + 1]
+    self.text = at_strings + 4 * (strings + 1)
+    self.codes = ws[at_codes // 4 : at_starts // 4]
+    self.starts = ws[at_starts // 4 : at_fields // 4]
+    self.fields = ws[at_fields // 4:]
+    if len(self.codes) != records or len(self.starts) != records + 1:
+      raise Exception("invalid program buffer")
+
+    # The strings decoded so far.
+    self.strings = {}
+
+    # The classes, the names of their attributes and, for annotations,
+    # the methods of the annotation layer that set them. Annotations
+    # kept in the tree (by the default layer) are set like any other
+    # attribute.
+    self.classes = [list]
+    self.names = [None]
+    self.setters = [None]
+    cs = ws[at_classes // 4 : at_strings // 4]
+    i = 0
+    for c in range(classes):
+      name = self.string(cs[i])
+      n = cs[i + 1]
+      cls = globals().get(name)
+      if not isinstance(cls, type) or not issubclass(cls, nodes):
+        raise Exception(f"unknown class '{name}'")
+      x = cls.__new__(cls)
+      names = tuple(self.string(k) for k in cs[i + 2 : i + 2 + n])
+      setters = []
+      if type(a) is not Annotations:
+        for k in names:
+          if k in annotations and is_annotation(x, k):
+            setters.append((k, getattr(a, annotations[k][1])))
+      self.classes.append(cls)
+      self.names.append(names)
+      self.setters.append(setters)
+      i += 2 + n
+
+  def string(self, i):
+    # Returns the string with the index i.
+    s = self.strings.get(i)
+    if s is None:
+      start = self.text + self.string_offsets[i]
+      end = self.text + self.string_offsets[i + 1]
+      s = self.strings[i] = str(self.data[start:end], "utf-8")
+    return s
+
+  def value(self, w):
+    # Returns the value of the word w, which is not a record.
+    tag = w & 7
+    p = w >> 3
+    if tag == INT:
+      return p >> 1 if not p & 1 else -((p + 1) >> 1)
+    if tag == NONE:
+      return None
+    if tag == BOOL:
+      return bool(p)
+    if tag == STR:
+      return self.string(p)
+    if tag == FLOAT:
+      return float(self.string(p))
+    if tag == BIG:
+      return int(self.string(p))
+    raise Exception(f"invalid word {w}")
+
+  def root(self):
+    # Returns the program.
+    codes = self.codes.tolist()
+    starts = self.starts.tolist()
+    classes = self.classes
+    names = self.names
+    setters = self.setters
+    new = object.__new__
+
+    # Reading makes many objects and no garbage, so the collector,
+    # which would otherwise run many times over the objects made so far,
+    # is paused.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+      # The objects of the records, and the values of their words.
+      objects = [new(classes[c]) if c else [] for c in codes]
+      constants = Constants(self)
+      vs = [objects[w >> 3] if w & 7 == RECORD else constants[w]
+            for w in self.fields.tolist()]
+
+      for x, c, i, j in zip(objects, codes, starts, starts[1:]):
+        if c == LIST:
+          x += vs[i:j]
+          continue
+        d = x.__dict__
+        d.update(zip(names[c], vs[i:j]))
+        for k, set in setters[c]:
+          v = d[k]
+          d[k] = None
+          if v is not None:
+            set(x, v)
+    finally:
+      if enabled:
+        gc.enable()
+
+    w = self.root_word
+    if w & 7 == RECORD:
+      return objects[w >> 3]
+    return self.value(w)
+
+def dump(e, a = inplace):
+  # Returns the buffer for the program e, with the annotations in a.
+  # As in reading, the collector is paused.
+  enabled = gc.isenabled()
+  gc.disable()
+  try:
+    w = Writer(a)
+    root = w.word(e)
+    return w.bytes(root)
+  finally:
+    if enabled:
+      gc.enable()
+
+def load(data, a = inplace):
+  # Returns the program in the buffer data, writing its annotations to
+  # the layer a.
+  return Reader(data, a).root()
+
+def dump_file(path, e, a = inplace):
+  # Writes the program e to the file path.
+  with open(path, "wb") as f:
+    f.write(dump(e, a))
+
+def load_file(path, a = inplace):
+  # Reads the program in the file path. The program is decoded whole
+  # (see above), so the file is read whole too.
+  with open(path, "rb") as f:
+    return load(f.read(), a)
@@ -1,23 +1,23 @@
 from lang import *
 from decorate import *
+from annotate import *
 
-def subst_unary_expr(e : Expr, s : dict, T : object):
+def subst_unary_expr(e : Expr, s : dict, T : object, a : Annotations = inplace):
   # [x->s]@e1 = @[x->s]e1
-  e1 = subst_expr(e.lhs, s)
-  e2 = subst_expr(e.rhs, s)
-  return T(e1, e2)
+  e1 = subst_expr(e.expr, s, a)
+  return T(e1)
 
-def subst_binary_expr(e : Expr, s : dict, T : object):
+def subst_binary_expr(e : Expr, s : dict, T : object, a : Annotations = inplace):
   # [x->s](e1 @ e2) = [x->s]e1 @ [x->s]e2
-  e1 = subst_expr(e.lhs, s)
-  e2 = subst_expr(e.rhs, s)
+  e1 = subst_expr(e.lhs, s, a)
+  e2 = subst_expr(e.rhs, s, a)
   return T(e1, e2)
 
-def subst_exprs(es, s):
+def subst_exprs(es, s, a = inplace):
   # Substitute through a list of expressions.
-  return list(map(subst_expr, es))
+  return [subst_expr(e, s, a) for e in es]
 
-def subst_expr(e, s):
+def subst_expr(e, s, a = inplace):
   # Rewrite the expression 'e' by substituting references to variables
   # in 's' with their corresponding value.
   
@@ -26,19 +26,19 @@ def subst_expr(e, s):
     return e
 
   if type(e) is AndExpr:
-    return subst_binary_expr(e, s, AndExpr)
+    return subst_binary_expr(e, s, AndExpr, a)
 
   if type(e) is OrExpr:
-    return subst_binary_expr(e, s, OrExpr)
+    return subst_binary_expr(e, s, OrExpr, a)
 
   if type(e) is NotExpr:
-    return subst_unary_expr(e, s, NotExpr)
+    return subst_unary_expr(e, s, NotExpr, a)
 
   if type(e) is IfExpr:
     # [x->s](if e1 then e2 else e3) = if [x->s]e1 then [x->s]e2 else [x->s]e3
-    e1 = subst_expr(e.cond, s)
-    e2 = subst_expr(e.true, s)
-    e3 = subst_expr(e.false, s)
+    e1 = subst_expr(e.cond, s, a)
+    e2 = subst_expr(e.true, s, a)
+    e3 = subst_expr(e.false, s, a)
     return IfExpr(e1, e2, e3)
 
   # Arithmetic expressions
@@ -47,52 +47,55 @@ def subst_expr(e, s):
     return e
 
   if type(e) is AddExpr:
-    return subst_binary_expr(e, s, AddExpr)
+    return subst_binary_expr(e, s, AddExpr, a)
 
   if type(e) is SubExpr:
-    return subst_binary_expr(e, s, SubExpr)
+    return subst_binary_expr(e, s, SubExpr, a)
 
   if type(e) is MulExpr:
-    return subst_binary_expr(e, s, MulExpr)
+    return subst_binary_expr(e, s, MulExpr, a)
 
   if type(e) is DivExpr:
-    return subst_binary_expr(e, s, DivExpr)
+    return subst_binary_expr(e, s, DivExpr, a)
 
   if type(e) is RemExpr:
-    return subst_binary_expr(e, s, RemExpr)
+    return subst_binary_expr(e, s, RemExpr, a)
 
   if type(e) is NegExpr:
-    return subst_unary_expr(e, s, NegExpr)
+    return subst_unary_expr(e, s, NegExpr, a)
 
   # Relational expressions
 
   if type(e) is EqExpr:
-    return subst_binary_expr(e, s, EqExpr)
+    return subst_binary_expr(e, s, EqExpr, a)
 
   if type(e) is NeExpr:
-    return subst_binary_expr(e, s, NeExpr)
+    return subst_binary_expr(e, s, NeExpr, a)
 
   if type(e) is LtExpr:
-    return subst_binary_expr(e, s, LtExpr)
+    return subst_binary_expr(e, s, LtExpr, a)
 
   if type(e) is GtExpr:
-    return subst_binary_expr(e, s, GtExpr)
+    return subst_binary_expr(e, s, GtExpr, a)
 
   if type(e) is LeExpr:
-    return subst_binary_expr(e, s, LeExpr)
+    return subst_binary_expr(e, s, LeExpr, a)
 
   if type(e) is GeExpr:
-    return subst_binary_expr(e, s, GeExpr)
+    return subst_binary_expr(e, s, GeExpr, a)
 
   # Functional expressions
 
   if type(e) is IdExpr:
     # [x->s]x = v
     # [x->s]y = y (y != x)
-    if e.ref in s:
-      return s[e.ref]
+    d = a.ref(e)
+    if d in s:
+      return s[d]
     else:
-      return e
+      # Return a new unbound id expression, since the type of its
+      # declaration may be substituted.
+      return IdExpr(e.id)
 
   if type(e) is LambdaExpr:
     # [x->s]\(x1, x2, ...).e1 = \([x->s]x1, [x->s]x2, ...).[x->s]e1
@@ -102,50 +105,79 @@ def subst_expr(e, s):
     # vs = list(map(lambda p: subst_type(p.type, s), e.vars))
     ps = []
     for p in e.vars:
-      ps += [VarDecl(p.id, subst_type(p.type, s))]
-    e1 = subst_expr(e.expr, s)
+      ps += [VarDecl(p.id, subst_type(p.type, s, a))]
+    e1 = subst_expr(e.expr, s, a)
     return LambdaExpr(ps, e1)
 
   if type(e) is CallExpr:
     # [x->s]e1(ei) = [x->s]e1([x->s]ei)
-    e = subst_expr(e.fn, s)
-    es = list(map(lambda x: subst_expr(x, s), e.args))
-    return CallExpr(e, es)
+    e1 = subst_expr(e.fn, s, a)
+    es = subst_exprs(e.args, s, a)
+    return CallExpr(e1, es)
+
+  # Reference expressions
+
+  if type(e) is NewExpr:
+    return subst_unary_expr(e, s, NewExpr, a)
+
+  if type(e) is DerefExpr:
+    return subst_unary_expr(e, s, DerefExpr, a)
+
+  if type(e) is AssignExpr:
+    return subst_binary_expr(e, s, AssignExpr, a)
 
   # Data expressions
 
   if type(e) is TupleExpr:
-    es = subst_exprs(e.elems, s)
+    es = subst_exprs(e.elems, s, a)
+    return TupleExpr(es)
 
   if type(e) is ProjExpr:
-    e1 = subst_expr(e.obj)
-    return ProjExp(e1, e.index)
+    e1 = subst_expr(e.obj, s, a)
+    return ProjExpr(e1, e.index)
 
   if type(e) is RecordExpr:
     fs = []
     for f in e.fields:
-      e = subst_expr(f.value, s)
-      fs += [FieldInit(f.id, e)]
+      e1 = subst_expr(f.value, s, a)
+      fs += [FieldInit(f.id, e1)]
     return RecordExpr(fs)
 
   if type(e) is MemberExpr:
-    e1 = subst_expr(e.obj)
+    e1 = subst_expr(e.obj, s, a)
     return MemberExpr(e1, e.id)
 
   if type(e) is VariantExpr:
-    assert False
+    e1 = subst_expr(e.field.value, s, a)
+    t = subst_type(e.variant, s, a)
+    return VariantExpr(FieldInit(e.field.id, e1), t)
 
   if type(e) is CaseExpr:
-    assert False
+    e1 = subst_expr(e.expr, s, a)
+    cs = []
+    for c in e.cases:
+      cs += [Case(c.id, c.var.id, subst_expr(c.expr, s, a))]
+    return CaseExpr(e1, cs)
 
   # Polymorphism expressions
 
-  # FIXME
+  if type(e) is GenericExpr:
+    # [X->s]\[Yi].e1 = \[Yi].[X->s]e1
+    #
+    # The type variables are kept, since they are distinct from X.
+    e1 = subst_expr(e.expr, s, a)
+    return GenericExpr(e.vars, e1)
+
+  if type(e) is InstExpr:
+    # [X->s]e1 [Ti] = [X->s]e1 [[X->s]Ti]
+    e1 = subst_expr(e.gen, s, a)
+    ts = list(map(lambda x: subst_type(x, s, a), e.args))
+    return InstExpr(e1, ts)
 
   assert False
 
 
-def subst_type(t : Type, s : dict):
+def subst_type(t : Type, s : dict, a : Annotations = inplace):
   # Substitute through the given type.
 
   if type(t) is BoolType:
@@ -155,24 +187,37 @@ def subst_type(t : Type, s : dict):
     return t
 
   if type(t) is FnType:
-    ts = list(map(lambda x: subst_type(x, s), t.parms))
-    t = subst_type(t.ret, s)
+    ts = list(map(lambda x: subst_type(x, s, a), t.parms))
+    t = subst_type(t.ret, s, a)
     return FnType(ts, t)
 
+  if type(t) is RefType:
+    return RefType(subst_type(t.ref, s, a))
+
+  if type(t) is TupleType:
+    return TupleType([subst_type(x, s, a) for x in t.elems])
+
+  if type(t) is RecordType:
+    return RecordType([(f.id, subst_type(f.type, s, a)) for f in t.fields])
+
+  if type(t) is VariantType:
+    return VariantType([(f.id, subst_type(f.type, s, a)) for f in t.fields])
+
   if type(t) is IdType:
     # [X->s]X = s
     # [X->s]Y = Y (Y != X)
-    if t.ref in s:
-      return s[t.ref]
+    d = a.ref(t)
+    if d in s:
+      return s[d]
     else:
       return t
 
   print(repr(t))
   assert False
 
-def subst(x : object, s : dict):
+def subst(x : object, s : dict, a : Annotations = inplace):
   if isinstance(x, Expr):
-    return subst_expr(x, s)
+    return subst_expr(x, s, a)
   if isinstance(x, Type):
-    return subst_type(x, s)
+    return subst_type(x, s, a)
   assert False
\ No newline at end of file
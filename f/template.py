@@ -0,0 +1,47 @@
+from lang import *
+
+# Programs are often written once (as a template) and then resolved,
+# checked and evaluated many times. Because resolution and checking
+# annotate the tree in place by default, each use needs its own copy
+# of the template.
+#
+# Copying with copy.deepcopy is expensive: it copies every object
+# reachable from the tree, including types, which are never modified
+# by resolution or checking. instantiate_template copies only the
+# parts of the tree that hold annotations (expressions and variable
+# declarations) and shares everything else with the template.
+#
+# Note that sharing a tree between requests with a SideTable (see
+# annotate.py) avoids copying altogether.
+
+def copy_node(x, memo):
+  # Returns a copy of the expression or declaration x. The memo maps
+  # the ids of copied declarations to their copies so that bound
+  # identifiers refer to the new declarations.
+  if id(x) in memo:
+    return memo[id(x)]
+
+  y = object.__new__(type(x))
+  memo[id(x)] = y
+  for k, v in vars(x).items():
+    setattr(y, k, copy_value(v, memo))
+
+  if isinstance(x, Expr):
+    # The copy has not been checked.
+    y.type = None
+  return y
+
+def copy_value(v, memo):
+  # Copy an attribute value of a node.
+  if type(v) is list:
+    return [copy_value(x, memo) for x in v]
+  if isinstance(v, (Expr, VarDecl, FieldInit, Case)):
+    return copy_node(v, memo)
+  # Types, type declarations, field declarations and literal values
+  # are shared.
+  return v
+
+def instantiate_template(e : Expr):
+  # Returns a fresh copy of the expression e that can be resolved and
+  # checked independently of e.
+  return copy_node(e, {})
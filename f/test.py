@@ -1,8 +1,7 @@
 
 from lang import *
-import copy
 
-clone = copy.deepcopy
+clone = instantiate_template
 
 print("---- types ----")
 f1 = resolve(FnType([int, int], bool))
@@ -96,3 +95,105 @@ print(f"* expr 0:  {e12}")
 print(f"* type 0:  {check(e12)}")
 
 
+
+# A single tree can be shared by many requests when each request keeps
+# its annotations in its own side table.
+lt = LambdaExpr([("a", int), ("b", int)], LtExpr("a", "b"))
+for args in ([1, 2], [2, 1]):
+  a = SideTable()
+  e13 = resolve(CallExpr(lt, args), [], a)
+  print(f"* expr:  {e13}")
+  print(f"* type:  {check(e13, a)}")
+  print(f"* value: {evaluate(e13, {}, [], a)}")
+
+# Effects record how an expression uses the heap.
+incr = LambdaExpr([("r", RefType(int))], AssignExpr("r", AddExpr(DerefExpr("r"), 1)))
+e14 = resolve(CallExpr(incr, [NewExpr(1)]))
+print(f"* expr:    {e14}")
+print(f"* effects: {describe(effects(e14))}")
+print(f"* latent:  {describe(latent(incr))}")
+
+# Random well-typed programs, for benchmarks. Generated programs call
+# generics, which are instantiated before evaluation.
+e15 = resolve(generate(30, seed = 7))
+print(f"* expr:  {e15}")
+print(f"* type:  {check(e15)}")
+e15 = resolve(instantiate(e15))
+print(f"* value: {evaluate(e15, {}, [])}")
+
+# Profile the checker and evaluator by handler and by class of node.
+with Profiler() as p:
+  e16 = resolve(generate(200, seed = 7))
+  check(e16)
+  e16 = resolve(instantiate(e16))
+  evaluate(e16, {}, [])
+print(p.report(key = "calls", limit = 3))
+
+# Sample the lambdas of a program, every 100 evaluation steps.
+#
+# fib = \(f, n). if n < 2 then n else f(f, n - 1) + f(f, n - 2)
+fib = LambdaExpr([("f", int), ("n", int)],
+  IfExpr(LtExpr("n", 2), "n",
+    AddExpr(CallExpr("f", ["f", SubExpr("n", 1)]),
+            CallExpr("f", ["f", SubExpr("n", 2)]))))
+with Sampler(steps = 100) as s:
+  evaluate(resolve(CallExpr(fib, [fib, 12])), {}, [])
+print(s.report(limit = 3))
+
+# Run the usual pipeline on a program, measuring each phase. The
+# program is annotated in a side table, so it can be run again.
+r = Pipeline().run(generate(200, seed = 7))
+print(f"* value:  {r.value}")
+for m in r.measures:
+  print(f"* {m.name + ':':12} {m.nodes_in} -> {m.nodes_out} nodes")
+
+# Write a checked program in the binary format and read it back. Its
+# annotations are read with it, so it need not be checked again.
+e16 = resolve(generate(200, seed = 7))
+check(e16)
+b = dump(e16)
+e17 = load(b)
+print(f"* bytes: {len(b)}")
+print(f"* same:  {e17 == e16 and e17.type == e16.type}")
+print(f"* value: {evaluate(resolve(instantiate(e17)), {}, [])}")
+
+# Cache a program once it is resolved and checked. The second time it
+# is compiled, it is read from the cache instead. The program may also
+# be given as its text. The cache only removes the directories it made,
+# so it may share its directory.
+import os
+import tempfile
+scratch = tempfile.TemporaryDirectory()
+d = scratch.name
+os.mkdir(os.path.join(d, "0123456789abcdef"))
+c = Cache(d)
+e18 = c.compile(generate(200, seed = 7), SideTable())
+e19 = c.compile(generate(200, seed = 7), SideTable())
+print(f"* same:  {e18 == e19 == c.compile(str(generate(200, seed = 7)), SideTable())}")
+print(f"* cache: {c.hits} hits, {c.misses} misses")
+c.limit = 0
+c.evict()
+print(f"* kept:  {sorted(os.listdir(d)) == sorted(['0123456789abcdef', os.path.basename(c.path)])}")
+scratch.cleanup()
+
+print("---- parsing ----")
+# Programs are printed in a syntax that can be parsed back.
+e20 = parse("(λ[T].λ(a:T,b:T).(a < b)) [Int] (1,2)")
+print(f"* expr:  {e20}")
+e21 = generate(200, seed = 7)
+print(f"* same:  {parse(str(e21)) == e21}")
+# Checking only adds annotations, so the program is still equal to it.
+check(resolve(e21))
+print(f"* same:  {parse(str(e21)) == e21}")
+print(f"* type:  {parse_type('∀[T].(T,Ref T)->{T,<l:Int>}')}")
+try:
+  parse("λ(x:Int).\n  (x + )")
+except ParseError as x:
+  print(f"* error: {x}")
+
+print("---- printing ----")
+# Large programs can be printed without recursion, broken over lines
+# of a given width, or cut short.
+e22 = generate(60, seed = 3)
+print(pretty(e22, width = 60))
+print(pretty(e22, limit = 40))
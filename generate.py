@@ -0,0 +1,89 @@
+"""Random Boolean formulas.
+
+generate builds a random formula with about size nodes. Each node is
+a constant, a variable, or a negation, conjunction or disjunction; the
+nodes below a binary operator are shared at random between its
+operands, so formulas are neither balanced nor degenerate. The
+formula is built through a builder with the interface of those in
+infix.py, so it can be made as lang.py expressions (the default),
+binaryTree nodes, an ArrayTree or an interned DAG, or as text.
+
+The generator is seeded: a seed and a size always produce the same
+formula. write_corpus writes formulas as text, one per line, in the
+format read by the driver's batch mode.
+"""
+
+import random
+
+from infix import ExprBuilder, parse
+
+class TextBuilder:
+    """Builds the infix text of a formula (see infix.py). Operands are
+    parenthesized, so the text does not depend on precedence."""
+
+    def const(self, b):
+        return 'T' if b else 'F'
+
+    def var(self, name):
+        return name
+
+    def not_(self, e):
+        return f"!{e}"
+
+    def and_(self, lhs, rhs):
+        return f"({lhs} ^ {rhs})"
+
+    def or_(self, lhs, rhs):
+        return f"({lhs} v {rhs})"
+
+def generate(size, seed = 0, variables = 0, builder = ExprBuilder(), depth = 60):
+    """Returns a random formula with about size nodes, built by
+    builder. The leaves are constants, or when variables is non-zero,
+    mostly the variables x0, x1, ... up to that number. No node is
+    more than depth below the root."""
+    rng = random.Random(seed)
+
+    def leaf():
+        if variables and rng.random() < 0.8:
+            return builder.var(f"x{rng.randrange(variables)}")
+        return builder.const(rng.random() < 0.5)
+
+    def make(size, depth):
+        if size <= 1 or depth == 0:
+            return leaf()
+        k = rng.randrange(5)
+        if k == 0:
+            return builder.not_(make(size - 1, depth - 1))
+        n = rng.randrange(1, size - 1) if size > 2 else 1
+        lhs = make(n, depth - 1)
+        rhs = make(size - 1 - n, depth - 1)
+        if k < 3:
+            return builder.and_(lhs, rhs)
+        return builder.or_(lhs, rhs)
+
+    return make(size, depth)
+
+def write_corpus(path, count, size, seed = 0, variables = 0):
+    """Writes count formulas of about size nodes to the file path, one
+    per line. The formulas are generated from consecutive seeds,
+    starting with seed."""
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(generate(size, seed + i, variables, TextBuilder()))
+            f.write("\n")
+
+def read_corpus(path, builder = ExprBuilder()):
+    """Returns the list of formulas written to path by write_corpus,
+    parsed by builder."""
+    with open(path) as f:
+        return [parse(line, builder) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    import sys
+
+    # Write a corpus: generate.py <path> <count> <size> [seed] [variables]
+    if len(sys.argv) < 4:
+        print("usage: generate.py path count size [seed] [variables]")
+        sys.exit(1)
+    args = [int(x) for x in sys.argv[2:]]
+    write_corpus(sys.argv[1], *args)
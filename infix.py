@@ -0,0 +1,191 @@
+"""A single-pass parser for infix Boolean expressions.
+
+This replaces the conversion of infix text to a postfix string (see
+postfix.py) followed by a second scan to build the tree (see
+constructTree in binaryTree.py). The parser reads the input once,
+using the shunting-yard algorithm, and builds the tree as it goes.
+
+The syntax is:
+
+    e ::= T | true          -- true
+          F | false         -- false
+          x                 -- variables
+          ! e1 | not e1     -- negation
+          e1 ^ e2           -- conjunction (also 'and')
+          e1 v e2           -- disjunction (also 'or')
+          ( e1 )
+
+Negation binds tightest, then conjunction, then disjunction; binary
+operators associate to the left. Words are runs of letters, digits
+and underscores, so 'v' is an operator but 'vx' is a variable. Tokens
+may be separated by whitespace.
+
+Input can be a string, a file (which is read in chunks) or any other
+iterable of strings, so very long formulas need not be held in memory
+as text. Syntax errors raise a ParseError that records the position
+(character offset) of the offending token.
+"""
+
+import re
+
+import lang
+from binaryTree import Expr as Node
+
+class ParseError(Exception):
+    def __init__(self, message, pos):
+        Exception.__init__(self, f"{message} at position {pos}")
+        self.pos = pos
+
+class TreeBuilder:
+    """Builds binaryTree nodes. The operand of '!' is its right child."""
+
+    def const(self, b):
+        return Node('T' if b else 'F')
+
+    def var(self, name):
+        return Node(name)
+
+    def not_(self, e):
+        n = Node('!')
+        n.right = e
+        return n
+
+    def binary(self, op, lhs, rhs):
+        n = Node(op)
+        n.left = lhs
+        n.right = rhs
+        return n
+
+    def and_(self, lhs, rhs):
+        return self.binary('^', lhs, rhs)
+
+    def or_(self, lhs, rhs):
+        return self.binary('v', lhs, rhs)
+
+class ExprBuilder:
+    """Builds expressions in the root language (see lang.py)."""
+
+    def const(self, b):
+        return lang.BoolExpr(b)
+
+    def var(self, name):
+        return lang.VarExpr(name)
+
+    def not_(self, e):
+        return lang.NotExpr(e)
+
+    def and_(self, lhs, rhs):
+        return lang.AndExpr(lhs, rhs)
+
+    def or_(self, lhs, rhs):
+        return lang.OrExpr(lhs, rhs)
+
+# Maps words to their tokens.
+words = {
+    'T': 'T', 'true': 'T',
+    'F': 'F', 'false': 'F',
+    'not': '!',
+    'and': '^',
+    'v': 'v', 'or': 'v',
+}
+
+# The precedence of each operator.
+precedence = {'!': 3, '^': 2, 'v': 1}
+
+lexeme = re.compile(r"(\s+)|(\w+)|(.)", re.DOTALL)
+
+def chunks(source, size = 1 << 16):
+    """Yields the text of source in chunks."""
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, "read"):
+        while True:
+            text = source.read(size)
+            if not text:
+                break
+            yield text
+    else:
+        yield from source
+
+def tokenize(source):
+    """Yields the tokens of source as pairs (pos, token). A token is an
+    operator, a parenthesis, 'T', 'F', or a variable name. The last
+    token is None, at the end of the input."""
+    pos = 0
+    carry = ""
+    for text in chunks(source):
+        # A word at the end of the previous chunk may continue in this
+        # one, so it is carried over.
+        start = pos - len(carry)
+        text = carry + text
+        carry = ""
+        for m in lexeme.finditer(text):
+            if m.lastindex == 1:
+                continue
+            if m.lastindex == 2 and m.end() == len(text):
+                carry = m.group()
+                break
+            yield start + m.start(), words.get(m.group(), m.group())
+        pos = start + len(text)
+    if carry:
+        yield pos - len(carry), words.get(carry, carry)
+    yield pos, None
+
+def parse(source, builder = TreeBuilder()):
+    """Parses an infix Boolean expression and returns its tree, as built
+    by builder."""
+    operands = []
+    operators = [] # Pairs (pos, token)
+
+    def apply(op):
+        if op == '!':
+            operands.append(builder.not_(operands.pop()))
+        else:
+            rhs = operands.pop()
+            lhs = operands.pop()
+            if op == '^':
+                operands.append(builder.and_(lhs, rhs))
+            else:
+                operands.append(builder.or_(lhs, rhs))
+
+    # True when the next token must start an operand.
+    expect = True
+    for pos, tok in tokenize(source):
+        if tok is None:
+            break
+        if expect:
+            if tok == '(' or tok == '!':
+                operators.append((pos, tok))
+            elif tok == 'T' or tok == 'F':
+                operands.append(builder.const(tok == 'T'))
+                expect = False
+            elif tok[0].isalnum() or tok[0] == '_':
+                operands.append(builder.var(tok))
+                expect = False
+            else:
+                raise ParseError(f"expected an operand but found '{tok}'", pos)
+        else:
+            if tok == ')':
+                while operators and operators[-1][1] != '(':
+                    apply(operators.pop()[1])
+                if not operators:
+                    raise ParseError("unmatched ')'", pos)
+                operators.pop()
+            elif tok == '^' or tok == 'v':
+                p = precedence[tok]
+                while operators and operators[-1][1] != '(' and \
+                      precedence[operators[-1][1]] >= p:
+                    apply(operators.pop()[1])
+                operators.append((pos, tok))
+                expect = True
+            else:
+                raise ParseError(f"expected an operator but found '{tok}'", pos)
+
+    if expect:
+        raise ParseError("unexpected end of input", pos)
+    while operators:
+        p, op = operators.pop()
+        if op == '(':
+            raise ParseError("unmatched '('", p)
+        apply(op)
+    return operands.pop()
@@ -4,6 +4,7 @@ class Expr:
 
     e ::= true
           false
+          x
           not e1
           e1 and e2
           e1 or e2
@@ -21,6 +22,15 @@ class BoolExpr(Expr):
     def __str__(self):
         return str(self.value)
 
+class VarExpr(Expr):
+    # A propositional variable. Variables are not values; they must be
+    # replaced by true or false before an expression can be reduced.
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
 class NotExpr(Expr):
     def __init__(self, e):
         self.expr = e
@@ -51,6 +61,11 @@ def same(e1, e2):
     # returns true when e1 and e2 the same string?
     # (or when are the not the same).
 
+    # A node is the same as itself. Interned expressions (see dag.py)
+    # share equal subexpressions, so this ends most comparisons early.
+    if e1 is e2:
+        return True
+
     if (type(e1) is not type(e2)):
         return False
 
@@ -59,6 +74,9 @@ def same(e1, e2):
     if type(e1) is BoolExpr:
         return e1.value == e2.value
 
+    if type(e1) is VarExpr:
+        return e1.name == e2.name
+
     if type(e1) is NotExpr:
         return same(e1.expr, e2.expr)
 
@@ -66,7 +84,7 @@ def same(e1, e2):
         return same(e1.lhs, e2.lhs) and same(e1.rhs, e2.rhs)
 
     if type(e1) is OrExpr:
-        return same(e1.lhs, e2.lhs) or same(e1.rhs, e2.rhs)
+        return same(e1.lhs, e2.lhs) and same(e1.rhs, e2.rhs)
 
 def is_value(e):
     """Returns true if e is a value (i.e) irreducible)."""
@@ -89,8 +107,7 @@ def step_and(e):
 
     if (is_value(e.lhs) and is_value(e.rhs)):
         # implement the truth table
-        # return BoolExpr(e.lhs.value and e.rhs.value)
-        return (e.lhs.value and e.rhs.value)
+        return BoolExpr(e.lhs.value and e.rhs.value)
 
     if is_reducible(e.lhs):
         return AndExpr(step(e.lhs), e.rhs)
@@ -114,8 +131,7 @@ def step_or(e):
 
     if (is_value(e.lhs) and is_value(e.rhs)):
         # implement the truth table
-        # return BoolExpr(e.lhs.value or e.rhs.value)
-        return (e.lhs.value or e.rhs.value)
+        return BoolExpr(e.lhs.value or e.rhs.value)
 
     if is_reducible(e.lhs): # Applies Or-L
         return OrExpr(step(e.lhs), e.rhs)
@@ -141,11 +157,9 @@ def step_not(e):
 
     if is_value(e.expr):
         if e.expr.value == True:
-            # return BoolExpr(False)
-            return False
+            return BoolExpr(False)
         else:
-            # return BoolExpr(True)
-            return True
+            return BoolExpr(True)
     return NotExpr(step(e.expr))
 
     assert False
@@ -164,6 +178,8 @@ def step(e):
     if type(e) is OrExpr:
         return step_or(e)
 
+    raise Exception(f"cannot reduce {e}")
+
 def reduce(e):
     while is_reducible(e):
         e = step(e)
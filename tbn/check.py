@@ -66,25 +66,66 @@ def check_and(e):
   # e1 : Bool   e2 : Bool
   # --------------------- T-And
   #   e1 and e2 : Bool
-  if is_bool(e1) and is_bool(e2):
+  if is_bool(e.lhs) and is_bool(e.rhs):
     return boolType
   raise Exception("invalid operands to 'and'")
 
-def check_add(e):
+def check_or(e):
+  # e1 : Bool   e2 : Bool
+  # --------------------- T-Or
+  #   e1 or e2 : Bool
+  if is_bool(e.lhs) and is_bool(e.rhs):
+    return boolType
+  raise Exception("invalid operands to 'or'")
+
+def check_not(e):
+  #   e1 : Bool
+  # -------------- T-Not
+  # not e1 : Bool
+  if is_bool(e.expr):
+    return boolType
+  raise Exception("invalid operand to 'not'")
+
+def check_if(e):
+  # e1 : Bool   e2 : T   e3 : T
+  # ---------------------------- T-If
+  # if e1 then e2 else e3 : T
+  if not is_bool(e.cond):
+    raise Exception("invalid condition in 'if'")
+  if not has_same_type(e.true, e.false):
+    raise Exception("mismatched branches in 'if'")
+  return check(e.true)
+
+def check_arithmetic(e, op):
   # e1 : Int   e2 : Int
-  # ------------------- T-Add
-  #   e1 + e2 : Int
+  # ------------------- T-Add (and T-Sub, etc.)
+  #   e1 op e2 : Int
   if is_int(e.lhs) and is_int(e.rhs):
     return intType
-  raise Exception("invalid operands to '+'")
+  raise Exception(f"invalid operands to '{op}'")
+
+def check_add(e):
+  return check_arithmetic(e, '+')
 
 def check_sub(e):
-  # e1 : Int   e2 : Int
-  # ------------------- T-Sub
-  #   e1 - e2 : Int
-  if is_int(e.lhs) and is_int(e.rhs):
+  return check_arithmetic(e, '-')
+
+def check_mul(e):
+  return check_arithmetic(e, '*')
+
+def check_div(e):
+  return check_arithmetic(e, '/')
+
+def check_rem(e):
+  return check_arithmetic(e, '%')
+
+def check_neg(e):
+  #  e1 : Int
+  # ---------- T-Neg
+  # -e1 : Int
+  if is_int(e.expr):
     return intType
-  raise Exception("invalid operands to '-'")
+  raise Exception("invalid operand to '-'")
 
 def check_eq(e):
   # e1 : T1   e2 : T2
@@ -94,6 +135,34 @@ def check_eq(e):
     return boolType
   raise Exception("invalid operands to '=='")
 
+def check_ne(e):
+  # e1 : T   e2 : T
+  # --------------- T-Ne
+  # e1 != e2 : Bool
+  if has_same_type(e.lhs, e.rhs):
+    return boolType
+  raise Exception("invalid operands to '!='")
+
+def check_relational(e, op):
+  # e1 : Int   e2 : Int
+  # ------------------- T-Lt (and T-Gt, etc.)
+  #  e1 op e2 : Bool
+  if is_int(e.lhs) and is_int(e.rhs):
+    return boolType
+  raise Exception(f"invalid operands to '{op}'")
+
+def check_lt(e):
+  return check_relational(e, '<')
+
+def check_gt(e):
+  return check_relational(e, '>')
+
+def check_le(e):
+  return check_relational(e, '<=')
+
+def check_ge(e):
+  return check_relational(e, '>=')
+
 def do_check(e):
   # Compute the type of e.
   assert isinstance(e, Expr)
@@ -0,0 +1,226 @@
+from lang import *
+
+# This module implements constant folding and algebraic simplification.
+#
+# Folding rewrites an expression into an equivalent, smaller one by
+# computing the values of its closed subexpressions ahead of time.
+# For example:
+#
+#   (3 + 5) == (11 - 3) => true
+#
+# It also applies algebraic identities that hold for any operand e:
+#
+#   true and e => e     e and true => e     false and e => false
+#   false or e => e     e or false => e     true or e => true
+#   not not e => e      --e => e
+#   e + 0 => e          0 + e => e          e - 0 => e
+#   e * 1 => e          1 * e => e
+#
+# and removes the untaken branch of conditionals whose condition is
+# a literal. Note that the evaluator short-circuits 'and' and 'or',
+# so dropping the right operand of 'false and e' is safe, but the
+# same is not true of 'e and false' (e may fail to evaluate).
+#
+# Folding must preserve the meaning of the program. In particular,
+# division is Python's true division (as in evaluate()), so 7 / 2
+# folds to 3.5, and 'e / 1' is not simplified (the result is not an
+# integer). Division by zero is never folded, so the error happens
+# at runtime, as it would have without folding.
+#
+# The main function is fold, which returns the folded expression and
+# the number of nodes that were removed. The original expression is
+# not modified. Folded expressions keep the types computed by check().
+
+def size(e):
+  # Returns the number of nodes in the expression e.
+  n = 1
+  for v in vars(e).values():
+    if isinstance(v, Expr):
+      n += size(v)
+  return n
+
+def is_literal(e):
+  return type(e) in (BoolExpr, IntExpr)
+
+def is_const(e, v):
+  # Returns true if e is the literal v (and not merely equal to v, so
+  # that 'true' is not mistaken for '1').
+  return is_literal(e) and type(e.value) is type(v) and e.value == v
+
+def literal(v, e):
+  # Returns the literal for the value v, replacing the expression e.
+  if type(v) is bool:
+    x = BoolExpr(v)
+  else:
+    x = IntExpr(v)
+  x.type = e.type
+  return x
+
+def rebuild(e, Node, *parts):
+  # Returns e if none of its parts have changed. Otherwise, returns a
+  # new node with the same type.
+  old = [v for v in vars(e).values() if isinstance(v, Expr)]
+  if all(p is q for p, q in zip(parts, old)):
+    return e
+  x = Node(*parts)
+  x.type = e.type
+  return x
+
+def fold_unary(e, Node, op):
+  # Fold a unary expression.
+  #
+  #   op v1 => [op `v1`]
+  e1 = do_fold(e.expr)
+  if is_literal(e1):
+    return literal(op(e1.value), e)
+  return rebuild(e, Node, e1)
+
+def fold_binary(e, Node, op):
+  # Fold a binary expression.
+  #
+  #   v1 op v2 => [`v1` op `v2`]
+  e1 = do_fold(e.lhs)
+  e2 = do_fold(e.rhs)
+  if is_literal(e1) and is_literal(e2):
+    return literal(op(e1.value, e2.value), e)
+  return rebuild(e, Node, e1, e2)
+
+def fold_and(e):
+  e1 = do_fold(e.lhs)
+  if is_const(e1, False):
+    return e1
+  e2 = do_fold(e.rhs)
+  if is_const(e1, True):
+    return e2
+  if is_const(e2, True):
+    return e1
+  return rebuild(e, AndExpr, e1, e2)
+
+def fold_or(e):
+  e1 = do_fold(e.lhs)
+  if is_const(e1, True):
+    return e1
+  e2 = do_fold(e.rhs)
+  if is_const(e1, False):
+    return e2
+  if is_const(e2, False):
+    return e1
+  return rebuild(e, OrExpr, e1, e2)
+
+def fold_not(e):
+  e1 = fold_unary(e, NotExpr, lambda x: not x)
+  if type(e1) is NotExpr and type(e1.expr) is NotExpr:
+    return e1.expr.expr
+  return e1
+
+def fold_if(e):
+  e1 = do_fold(e.cond)
+  if is_const(e1, True):
+    return do_fold(e.true)
+  if is_const(e1, False):
+    return do_fold(e.false)
+  return rebuild(e, IfExpr, e1, do_fold(e.true), do_fold(e.false))
+
+def fold_add(e):
+  e1 = fold_binary(e, AddExpr, lambda x, y: x + y)
+  if type(e1) is AddExpr:
+    if is_const(e1.rhs, 0):
+      return e1.lhs
+    if is_const(e1.lhs, 0):
+      return e1.rhs
+  return e1
+
+def fold_sub(e):
+  e1 = fold_binary(e, SubExpr, lambda x, y: x - y)
+  if type(e1) is SubExpr and is_const(e1.rhs, 0):
+    return e1.lhs
+  return e1
+
+def fold_mul(e):
+  e1 = fold_binary(e, MulExpr, lambda x, y: x * y)
+  if type(e1) is MulExpr:
+    if is_const(e1.rhs, 1):
+      return e1.lhs
+    if is_const(e1.lhs, 1):
+      return e1.rhs
+  return e1
+
+def fold_division(e, Node, op):
+  # Fold a division or remainder, except by zero.
+  e1 = do_fold(e.lhs)
+  e2 = do_fold(e.rhs)
+  if is_literal(e1) and is_literal(e2) and e2.value != 0:
+    return literal(op(e1.value, e2.value), e)
+  return rebuild(e, Node, e1, e2)
+
+def fold_neg(e):
+  e1 = fold_unary(e, NegExpr, lambda x: -x)
+  if type(e1) is NegExpr and type(e1.expr) is NegExpr:
+    return e1.expr.expr
+  return e1
+
+def do_fold(e):
+  # Returns the folded form of e.
+  assert isinstance(e, Expr)
+
+  if type(e) is BoolExpr:
+    return e
+
+  if type(e) is AndExpr:
+    return fold_and(e)
+
+  if type(e) is OrExpr:
+    return fold_or(e)
+
+  if type(e) is NotExpr:
+    return fold_not(e)
+
+  if type(e) is IfExpr:
+    return fold_if(e)
+
+  if type(e) is IntExpr:
+    return e
+
+  if type(e) is AddExpr:
+    return fold_add(e)
+
+  if type(e) is SubExpr:
+    return fold_sub(e)
+
+  if type(e) is MulExpr:
+    return fold_mul(e)
+
+  if type(e) is DivExpr:
+    return fold_division(e, DivExpr, lambda x, y: x / y)
+
+  if type(e) is RemExpr:
+    return fold_division(e, RemExpr, lambda x, y: x % y)
+
+  if type(e) is NegExpr:
+    return fold_neg(e)
+
+  if type(e) is EqExpr:
+    return fold_binary(e, EqExpr, lambda x, y: x == y)
+
+  if type(e) is NeExpr:
+    return fold_binary(e, NeExpr, lambda x, y: x != y)
+
+  if type(e) is LtExpr:
+    return fold_binary(e, LtExpr, lambda x, y: x < y)
+
+  if type(e) is GtExpr:
+    return fold_binary(e, GtExpr, lambda x, y: x > y)
+
+  if type(e) is LeExpr:
+    return fold_binary(e, LeExpr, lambda x, y: x <= y)
+
+  if type(e) is GeExpr:
+    return fold_binary(e, GeExpr, lambda x, y: x >= y)
+
+  assert False
+
+def fold(e):
+  # Accepts an expression and returns its folded form along with the
+  # number of nodes that were removed.
+  e1 = do_fold(e)
+  return e1, size(e) - size(e1)
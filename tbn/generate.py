@@ -0,0 +1,107 @@
+import pickle
+import random
+
+from lang import *
+from check import boolType, intType
+
+# This module generates random, well-typed expressions.
+#
+# To make an expression of type T (Bool or Int), the generator picks a
+# form whose result has type T and makes its operands at the types the
+# form requires: 'e1 < e2' is a Bool made from two Ints, 'e1 + e2' an
+# Int made from two Ints, and 'if e1 then e2 else e3' a T made from a
+# Bool and two Ts. Every expression generated passes check().
+#
+# Each expression has about size nodes, which are shared at random
+# among the operands of each form. An expression whose share (or
+# depth) runs out is a literal. Divisors are non-zero literals, so
+# evaluation does not fail. The generator is seeded: a seed and a
+# size always produce the same expression.
+
+class Generator:
+  def __init__(self, seed = 0, depth = 40):
+    self.rng = random.Random(seed)
+
+    # The maximum depth of expressions.
+    self.depth = depth
+
+    # The number of nodes generated so far.
+    self.nodes = 0
+
+  def operands(self, ts, size, depth):
+    # Returns an expression of each type in ts, sharing the size of
+    # their parent (less the parent itself) among them.
+    cuts = sorted(self.rng.randrange(size) for i in range(len(ts) - 1))
+    start = self.nodes
+    es = []
+    for t, end in zip(ts, cuts + [size - 1]):
+      es.append(self.expr(t, end - (self.nodes - start), depth))
+    return es
+
+  def expr(self, t, size, depth = 0):
+    # Returns an expression of type t with about size nodes.
+    if size <= 1 or depth >= self.depth:
+      return self.leaf(t)
+    self.nodes += 1
+    if t == boolType:
+      forms = [self.gen_if] + [self.gen_logical] * 3 + [self.gen_not, self.gen_relational] * 2
+    else:
+      forms = [self.gen_if] + [self.gen_arithmetic] * 5 + [self.gen_neg]
+    return self.rng.choice(forms)(t, size, depth + 1)
+
+  def leaf(self, t):
+    # Returns a literal of type t.
+    self.nodes += 1
+    if t == boolType:
+      return BoolExpr(self.rng.random() < 0.5)
+    return IntExpr(self.rng.randrange(10))
+
+  def gen_if(self, t, size, depth):
+    return IfExpr(*self.operands([boolType, t, t], size, depth))
+
+  def gen_logical(self, t, size, depth):
+    op = self.rng.choice([AndExpr, OrExpr])
+    return op(*self.operands([boolType] * 2, size, depth))
+
+  def gen_not(self, t, size, depth):
+    return NotExpr(self.expr(boolType, size - 1, depth))
+
+  def gen_relational(self, t, size, depth):
+    op = self.rng.choice([EqExpr, NeExpr, LtExpr, GtExpr, LeExpr, GeExpr])
+    u = intType
+    if op in (EqExpr, NeExpr) and self.rng.random() < 0.3:
+      u = boolType
+    return op(*self.operands([u] * 2, size, depth))
+
+  def gen_arithmetic(self, t, size, depth):
+    op = self.rng.choice([AddExpr, AddExpr, SubExpr, SubExpr, MulExpr, DivExpr, RemExpr])
+    if op is DivExpr or op is RemExpr:
+      # Divide by a non-zero literal.
+      e1 = self.expr(intType, size - 2, depth)
+      self.nodes += 1
+      return op(e1, IntExpr(self.rng.randint(1, 9)))
+    return op(*self.operands([intType] * 2, size, depth))
+
+  def gen_neg(self, t, size, depth):
+    return NegExpr(self.expr(intType, size - 1, depth))
+
+def generate(size, seed = 0, t = None, depth = 40):
+  # Returns a random expression of type t (by default, Bool or Int)
+  # with about size nodes.
+  g = Generator(seed, depth)
+  if t is None:
+    t = g.rng.choice([boolType, intType])
+  return g.expr(t, size)
+
+def write_corpus(path, count, size, seed = 0):
+  # Writes count expressions of about size nodes to the file path. The
+  # expressions are generated from consecutive seeds, starting with
+  # seed.
+  programs = [generate(size, seed + i) for i in range(count)]
+  with open(path, "wb") as f:
+    pickle.dump(programs, f)
+
+def read_corpus(path):
+  # Returns the list of expressions written to path by write_corpus.
+  with open(path, "rb") as f:
+    return pickle.load(f)
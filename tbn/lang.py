@@ -3,7 +3,16 @@ class Type:
   # Represents a type in the language.
   #
   # T ::= Bool | Int
-  pass
+  #
+  # Types are compared structurally (see same_node below).
+  def __eq__(self, other):
+    return same_node(self, other)
+
+  def __hash__(self):
+    return hash_node(self)
+
+  def __getstate__(self):
+    return node_state(self)
 
 class BoolType(Type):
   # Represents the type 'Bool'
@@ -43,6 +52,15 @@ class Expr:
     # by the check() function.
     self.type = None
 
+  def __eq__(self, other):
+    return same_node(self, other)
+
+  def __hash__(self):
+    return hash_node(self)
+
+  def __getstate__(self):
+    return node_state(self)
+
 ## Boolean expressions
 
 class BoolExpr(Expr):
@@ -83,9 +101,9 @@ class IfExpr(Expr):
   # Represents expressions of the form `if e1 then e2 else e3`.
   def __init__(self, e1, e2, e3):
     Expr.__init__(self)
-    self.cond = express(e1)
-    self.true = express(e2)
-    self.false = express(e3)
+    self.cond = expr(e1)
+    self.true = expr(e2)
+    self.false = expr(e3)
 
   def __str__(self):
     return f"(if {self.cond} then {self.true} else {self.false})"
@@ -223,6 +241,48 @@ class GeExpr(Expr):
     return f"({self.lhs} >= {self.rhs})"
 
 
+# Structural hashing and equality
+#
+# Two expressions (or types) are equal when they are built by the same
+# constructors from equal parts. The type computed by check() is not
+# part of the structure of an expression.
+#
+# The hash of a node is computed once and cached in the node. Nodes
+# should not be modified after they have been hashed. The cached hash
+# is not pickled (see node_state).
+
+def node_state(x):
+  # Returns the attributes of x to be pickled. The cached hash is left
+  # out: it depends on the hashes of classes, which differ from one
+  # process to the next.
+  state = dict(vars(x))
+  state.pop("hash", None)
+  return state
+
+def structure(x):
+  # Returns the structural attributes of x.
+  return [v for k, v in vars(x).items() if k not in ("type", "hash")]
+
+def hash_node(x):
+  # Returns the (cached) structural hash of the node x.
+  h = x.__dict__.get("hash")
+  if h is None:
+    h = hash((type(x), *structure(x)))
+    x.hash = h
+  return h
+
+def same_node(x, y):
+  # Returns true if the nodes x and y are structurally equal. Nodes
+  # with different hashes are rejected without further comparison.
+  if x is y:
+    return True
+  if type(x) is not type(y):
+    return False
+  if hash_node(x) != hash_node(y):
+    return False
+  return all(type(v) is type(w) and v == w
+             for v, w in zip(structure(x), structure(y)))
+
 def expr(x):
   # Turn a Python object into an expression. This is solely
   # used to make simplify the writing expressions.
@@ -237,3 +297,6 @@ def expr(x):
 from reduce import reduce
 from check import check
 from evaluate import evaluate
+from fold import fold
+from vectorize import evaluate_columns
+from generate import generate, write_corpus, read_corpus
@@ -17,6 +17,13 @@ def is_reducible(e):
   # Returns true if the expression is reducible.
   return not is_value(e)
 
+def literal(v):
+  # Returns the literal for the value v. Division is true division, as
+  # in evaluate(), so numbers may be floats.
+  if type(v) is bool:
+    return BoolExpr(v)
+  return IntExpr(v)
+
 def step_unary(e, Node, op):
   # Compute the next step of a unary expression.
   #
@@ -29,7 +36,7 @@ def step_unary(e, Node, op):
   if is_reducible(e.expr):
     return Node(step(e.expr))
 
-  return expr(op(e.expr.value))
+  return literal(op(e.expr.value))
 
 def step_binary(e, Node, op):
   # Compute the next step of a binary expression.
@@ -54,7 +61,7 @@ def step_binary(e, Node, op):
     return Node(e.lhs, step(e.rhs))
 
   # Combine the results.
-  return expr(op(e.lhs.value, e.rhs.value))
+  return literal(op(e.lhs.value, e.rhs.value))
 
 def step_and(e):
   return step_binary(e, AndExpr, lambda x, y: x and y)
@@ -82,9 +89,9 @@ def step_if(e):
   # the selected expression.
 
   if is_reducible(e.cond):
-    return NotExpr(step(e.cond), e.true, e.false)
+    return IfExpr(step(e.cond), e.true, e.false)
 
-  if e.cond.val:
+  if e.cond.value:
     return e.true
   else:
     return e.false
@@ -104,6 +111,9 @@ def step_div(e):
 def step_rem(e):
   return step_binary(e, RemExpr, lambda x, y: x % y)
 
+def step_neg(e):
+  return step_unary(e, NegExpr, lambda x: -x)
+
 def step_eq(e):
   return step_binary(e, EqExpr, lambda x, y: x == y)
 
@@ -24,3 +24,24 @@ try:
 except Exception as err:
   print(f"error: {err}")
 
+
+# Folding computes constant subexpressions once, ahead of evaluation.
+e3, n = fold(e)
+print(f"{e} => {e3} ({n} nodes removed)")
+
+
+# Vectorized evaluation computes an expression for columns of inputs.
+# The literals x and y are placeholders for the columns.
+x = IntExpr(0)
+y = IntExpr(0)
+e4 = IfExpr(GtExpr(AddExpr(x, 1), y), MulExpr(x, 2), RemExpr(y, 3))
+try:
+  print(evaluate_columns(e4, [(x, [1, 2, 3, 4]), (y, [2, 2, 7, 9])]))
+except Exception as err:
+  print(f"error: {err}")
+
+
+# Random well-typed expressions, for benchmarks. The same seed always
+# gives the same expression.
+e5 = generate(25, seed = 7)
+print(f"{e5} : {check(e5)} => {evaluate(e5)}")
@@ -0,0 +1,166 @@
+from lang import *
+from check import is_bool
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# This module evaluates an expression over columns of inputs.
+#
+# Evaluating the same expression for many inputs (say, a scoring rule
+# for a million rows) with evaluate() walks the tree once per row. Here,
+# the inputs are columns (NumPy arrays, one element per row), and each
+# node is evaluated once, for every row at the same time:
+#
+#   (x + 1) > y   with x = [1, 2, 3], y = [2, 2, 2]
+#
+#   x + 1        => [2, 3, 4]
+#   (x + 1) > y  => [false, true, true]
+#
+# The inputs are bound to leaves of the expression. The leaves are
+# literals used as placeholders: the columns argument maps a leaf node
+# to its column, and every occurrence of that node (the same object,
+# not merely an equal one) reads the column instead of its value.
+# Columns are given as a list of pairs (leaf, values), or as a dict
+# when the placeholders are distinct values.
+#
+# The type of each node, computed by check(), determines the dtype of
+# its column: int64 for Int and bool for Bool. The result for each row
+# is the same as evaluate() would compute with the row's values in
+# place of the leaves. In particular:
+#
+#   - Division is true division (as in evaluate()), so its column
+#     holds floats.
+#   - 'and', 'or' and 'if' only evaluate their other operands for the
+#     rows that need them. Division by zero in a row that evaluate()
+#     would not reach is ignored; in any other row, it raises
+#     ZeroDivisionError, as evaluate() does.
+#
+# Integers are 64-bit, so results differ from evaluate() for values
+# that do not fit in 64 bits.
+#
+# NumPy is optional; evaluate_columns raises an exception without it.
+
+def dtype(e):
+  # Returns the dtype of the column of e.
+  if is_bool(e):
+    return numpy.bool_
+  return numpy.int64
+
+def vec_leaf(e, env, n):
+  # A leaf bound to a column reads it. Any other literal is the same in
+  # every row.
+  col = env.get(id(e))
+  if col is not None:
+    return col
+  return numpy.full(n, e.value, dtype = dtype(e))
+
+def vec_and(e, env, n, live):
+  # The right operand is only evaluated where the left is true.
+  lhs = vec(e.lhs, env, n, live)
+  rhs = vec(e.rhs, env, n, live & lhs)
+  return lhs & rhs
+
+def vec_or(e, env, n, live):
+  # The right operand is only evaluated where the left is false.
+  lhs = vec(e.lhs, env, n, live)
+  rhs = vec(e.rhs, env, n, live & ~lhs)
+  return lhs | rhs
+
+def vec_if(e, env, n, live):
+  # Each branch is only evaluated where it is taken.
+  cond = vec(e.cond, env, n, live)
+  true = vec(e.true, env, n, live & cond)
+  false = vec(e.false, env, n, live & ~cond)
+  return numpy.where(cond, true, false)
+
+def vec_div(e, env, n, live, op):
+  # Division and remainder fail for the rows (that are evaluated) where
+  # the divisor is zero.
+  lhs = vec(e.lhs, env, n, live)
+  rhs = vec(e.rhs, env, n, live)
+  zero = rhs == 0
+  if numpy.any(live & zero):
+    raise ZeroDivisionError("division by zero")
+  # The rows that are not evaluated divide by 1 instead, to avoid
+  # warnings.
+  return op(lhs, numpy.where(zero, 1, rhs))
+
+def vec(e, env, n, live):
+  # Returns the column of e. live is the mask of rows in which e is
+  # evaluated.
+  if type(e) is BoolExpr or type(e) is IntExpr:
+    return vec_leaf(e, env, n)
+
+  if type(e) is AndExpr:
+    return vec_and(e, env, n, live)
+
+  if type(e) is OrExpr:
+    return vec_or(e, env, n, live)
+
+  if type(e) is NotExpr:
+    return numpy.logical_not(vec(e.expr, env, n, live))
+
+  if type(e) is IfExpr:
+    return vec_if(e, env, n, live)
+
+  if type(e) is AddExpr:
+    return vec(e.lhs, env, n, live) + vec(e.rhs, env, n, live)
+
+  if type(e) is SubExpr:
+    return vec(e.lhs, env, n, live) - vec(e.rhs, env, n, live)
+
+  if type(e) is MulExpr:
+    return vec(e.lhs, env, n, live) * vec(e.rhs, env, n, live)
+
+  if type(e) is DivExpr:
+    return vec_div(e, env, n, live, numpy.true_divide)
+
+  if type(e) is RemExpr:
+    return vec_div(e, env, n, live, numpy.remainder)
+
+  if type(e) is NegExpr:
+    return -vec(e.expr, env, n, live)
+
+  if type(e) is EqExpr:
+    return vec(e.lhs, env, n, live) == vec(e.rhs, env, n, live)
+
+  if type(e) is NeExpr:
+    return vec(e.lhs, env, n, live) != vec(e.rhs, env, n, live)
+
+  if type(e) is LtExpr:
+    return vec(e.lhs, env, n, live) < vec(e.rhs, env, n, live)
+
+  if type(e) is GtExpr:
+    return vec(e.lhs, env, n, live) > vec(e.rhs, env, n, live)
+
+  if type(e) is LeExpr:
+    return vec(e.lhs, env, n, live) <= vec(e.rhs, env, n, live)
+
+  if type(e) is GeExpr:
+    return vec(e.lhs, env, n, live) >= vec(e.rhs, env, n, live)
+
+  assert False
+
+def evaluate_columns(e, columns = [], n = None):
+  # Evaluates e for every row of columns, returning its column. n is
+  # the number of rows, which is only needed when there are no columns.
+  if numpy is None:
+    raise Exception("evaluate_columns requires NumPy")
+  check(e)
+
+  if isinstance(columns, dict):
+    columns = columns.items()
+  env = {}
+  for leaf, values in columns:
+    values = numpy.asarray(values, dtype = dtype(leaf))
+    if n is None:
+      n = len(values)
+    if values.shape != (n,):
+      raise Exception(f"column for {leaf} has {len(values)} rows, not {n}")
+    env[id(leaf)] = values
+  if n is None:
+    raise Exception("the number of rows is unknown")
+
+  return vec(e, env, n, numpy.ones(n, dtype = numpy.bool_))
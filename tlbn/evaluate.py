@@ -3,7 +3,9 @@ from lookup import *
 
 import copy
 
-clone = copy.deepcopy
+# Stores are copied shallowly. A deep copy would also copy the
+# declarations that key them, so variables could not be found.
+clone = copy.copy
 
 # This module implements implements big-step semantics.
 #
@@ -54,10 +56,10 @@ def eval_not(e, store):
   return not evaluate(e.expr, store)
 
 def eval_cond(e, store):
-  if evaluate(e.cond):
-    return evaluate(e.true);
+  if evaluate(e.cond, store):
+    return evaluate(e.true, store);
   else:
-    return evaluate(e.false);
+    return evaluate(e.false, store);
 
 def eval_id(e, store):
   # Evaluate an id-expression by finding it's stored value.
@@ -98,7 +100,7 @@ def eval_app(e, store):
 
   v = evaluate(e.rhs, store)
 
-  return evaluate(c.abs.expr, c.env + {c.abs.var: v})
+  return evaluate(c.abs.expr, {**c.env, c.abs.var: v})
 
 def eval_lambda(e, store):
   # The evaluation of a lambda abstraction produces a closure.
@@ -141,6 +143,9 @@ def evaluate(e, store = {}):
   if type(e) is NotExpr:
     return eval_not(e, store)
 
+  if type(e) is IfExpr:
+    return eval_cond(e, store)
+
   if type(e) is IdExpr:
     return eval_id(e, store)
 
@@ -0,0 +1,154 @@
+from lang import *
+
+# This module implements constant folding and algebraic simplification.
+#
+# Folding rewrites an expression into an equivalent, smaller one by
+# computing the values of its closed subexpressions ahead of time.
+# For example:
+#
+#   \x:Bool.(not true or x) => \x:Bool.x
+#
+# It applies these identities for any operand e:
+#
+#   true and e => e     e and true => e     false and e => false
+#   false or e => e     e or false => e     true or e => true
+#   not not e => e
+#
+# and removes the untaken branch of conditionals whose condition is
+# a literal. Note that the evaluator short-circuits 'and' and 'or',
+# so dropping the right operand of 'false and e' is safe, but the
+# same is not true of 'e and false' (e may fail to evaluate).
+#
+# Folding applies within the bodies of abstractions and lambdas, and
+# to the operands of applications and calls. Variables are left as
+# they are, so a folded expression does not need to be resolved again.
+#
+# The main function is fold, which returns the folded expression and
+# the number of nodes that were removed. The original expression is
+# not modified.
+
+def size(e):
+  # Returns the number of nodes in the expression e.
+  n = 1
+  for v in vars(e).values():
+    if type(v) is list:
+      n += sum(size(x) for x in v if isinstance(x, Expr))
+    elif isinstance(v, Expr):
+      n += size(v)
+  return n
+
+def is_const(e, v):
+  return type(e) is BoolExpr and e.val == v
+
+def rebuild(e, Node, *parts):
+  # Returns e if none of its parts have changed. Otherwise, returns a
+  # new node.
+  old = [v for v in vars(e).values() if isinstance(v, Expr)]
+  if all(p is q for p, q in zip(parts, old)):
+    return e
+  return Node(*parts)
+
+def fold_and(e):
+  e1 = do_fold(e.lhs)
+  if is_const(e1, False):
+    return e1
+  e2 = do_fold(e.rhs)
+  if is_const(e1, True):
+    return e2
+  if is_const(e2, True):
+    return e1
+  return rebuild(e, AndExpr, e1, e2)
+
+def fold_or(e):
+  e1 = do_fold(e.lhs)
+  if is_const(e1, True):
+    return e1
+  e2 = do_fold(e.rhs)
+  if is_const(e1, False):
+    return e2
+  if is_const(e2, False):
+    return e1
+  return rebuild(e, OrExpr, e1, e2)
+
+def fold_not(e):
+  e1 = do_fold(e.expr)
+  if type(e1) is BoolExpr:
+    return BoolExpr(not e1.val)
+  if type(e1) is NotExpr:
+    return e1.expr
+  return rebuild(e, NotExpr, e1)
+
+def fold_if(e):
+  e1 = do_fold(e.cond)
+  if is_const(e1, True):
+    return do_fold(e.true)
+  if is_const(e1, False):
+    return do_fold(e.false)
+  return rebuild(e, IfExpr, e1, do_fold(e.true), do_fold(e.false))
+
+def fold_abs(e):
+  e1 = do_fold(e.expr)
+  if e1 is e.expr:
+    return e
+  return AbsExpr(e.var, e1)
+
+def fold_app(e):
+  return rebuild(e, AppExpr, do_fold(e.lhs), do_fold(e.rhs))
+
+def fold_lambda(e):
+  e1 = do_fold(e.expr)
+  if e1 is e.expr:
+    return e
+  return LambdaExpr(e.vars, e1)
+
+def fold_call(e):
+  fn = do_fold(e.fn)
+  args = list(map(do_fold, e.args))
+  if fn is e.fn and all(a is b for a, b in zip(args, e.args)):
+    return e
+  return CallExpr(fn, args)
+
+def do_fold(e):
+  # Returns the folded form of e.
+  assert isinstance(e, Expr)
+
+  if type(e) is BoolExpr:
+    return e
+
+  if type(e) is AndExpr:
+    return fold_and(e)
+
+  if type(e) is OrExpr:
+    return fold_or(e)
+
+  if type(e) is NotExpr:
+    return fold_not(e)
+
+  if type(e) is IfExpr:
+    return fold_if(e)
+
+  if type(e) is IdExpr:
+    return e
+
+  if type(e) is AbsExpr:
+    return fold_abs(e)
+
+  if type(e) is AppExpr:
+    return fold_app(e)
+
+  if type(e) is LambdaExpr:
+    return fold_lambda(e)
+
+  if type(e) is CallExpr:
+    return fold_call(e)
+
+  if type(e) is PlaceholderExpr:
+    return e
+
+  assert False
+
+def fold(e):
+  # Accepts an expression and returns its folded form along with the
+  # number of nodes that were removed.
+  e1 = do_fold(e)
+  return e1, size(e) - size(e1)
@@ -0,0 +1,153 @@
+import pickle
+import random
+
+from lang import *
+
+# This module generates random, well-typed programs.
+#
+# To make an expression of type T, the generator picks a form whose
+# result has type T and makes its operands at the types the form
+# requires. Bools are made by logical operators, conditionals, and
+# applications or calls of functions; functions (of type T1 -> T2 or
+# (T1, ..., Tn) -> T0) are made by abstractions and lambdas. Variables
+# are bound by applying a lambda to arguments, and are only used where
+# they are in scope and have the right type.
+#
+# Types have no structural equality here, so the types of variables
+# and functions are drawn from a fixed pool, and two types are the same
+# when they are the same object. This only rules out some programs
+# that would be well-typed.
+#
+# Each program has about size nodes, which are shared at random among
+# the operands of each form. An expression whose share (or depth) runs
+# out is a leaf: a variable or a literal, or for a function type, an
+# abstraction returning a leaf. The generator is seeded: a seed and a
+# size always produce the same program.
+
+class Generator:
+  def __init__(self, seed = 0, depth = 40):
+    self.rng = random.Random(seed)
+
+    # The maximum depth of expressions.
+    self.depth = depth
+
+    # The number of names and nodes generated so far.
+    self.count = 0
+    self.nodes = 0
+
+    # The pool of types. Function types are built from earlier types.
+    self.types = [boolType]
+    for i in range(6):
+      ts = self.types
+      if self.rng.random() < 0.5:
+        self.types.append(ArrowType(self.rng.choice(ts), self.rng.choice(ts)))
+      else:
+        ps = [self.rng.choice(ts) for i in range(self.rng.randint(1, 3))]
+        self.types.append(FnType(ps, self.rng.choice(ts)))
+
+  def fresh(self):
+    # Returns a new variable name.
+    self.count += 1
+    return f"x{self.count}"
+
+  def operands(self, parts, size, depth):
+    # Returns an expression for each pair (t, scope) in parts, sharing
+    # the size of their parent (less the parent itself) among them.
+    cuts = sorted(self.rng.randrange(size) for i in range(len(parts) - 1))
+    start = self.nodes
+    es = []
+    for (t, scope), end in zip(parts, cuts + [size - 1]):
+      es.append(self.expr(t, end - (self.nodes - start), scope, depth))
+    return es
+
+  def expr(self, t, size, scope, depth = 0):
+    # Returns an expression of type t with about size nodes. The scope
+    # is a list of the variables (pairs of names and types) that may
+    # be used.
+    if size <= self.cost(t) or depth >= self.depth:
+      return self.leaf(t, scope)
+    self.nodes += 1
+    fs = [self.gen_let, self.gen_if]
+    if t is boolType:
+      fs += [self.gen_logical] * 3 + [self.gen_not]
+    if type(t) is ArrowType:
+      fs += [self.gen_abs] * 3
+    if type(t) is FnType:
+      fs += [self.gen_lambda] * 3
+    if any(type(u) is not BoolType and u.ret is t for x, u in scope):
+      fs += [self.gen_call] * 2
+    return self.rng.choice(fs)(t, size, scope, depth + 1)
+
+  def cost(self, t):
+    # Returns the number of nodes in the smallest value of type t.
+    if t is boolType:
+      return 1
+    return 1 + self.cost(t.ret)
+
+  def leaf(self, t, scope):
+    # Returns a small expression of type t.
+    self.nodes += 1
+    xs = [x for x, u in scope if u is t]
+    if xs and self.rng.random() < 0.6:
+      return IdExpr(self.rng.choice(xs))
+    if t is boolType:
+      return BoolExpr(self.rng.random() < 0.5)
+    if type(t) is ArrowType:
+      x = self.fresh()
+      return AbsExpr(VarDecl(x, t.parm), self.leaf(t.ret, scope + [(x, t.parm)]))
+    vs = [(self.fresh(), u) for u in t.parms]
+    return LambdaExpr([VarDecl(x, u) for x, u in vs], self.leaf(t.ret, scope + vs))
+
+  def gen_let(self, t, size, scope, depth):
+    # Binds new variables by calling a lambda: \(x1:T1, ...).e0 (e1, ...)
+    vs = [(self.fresh(), self.rng.choice(self.types)) for i in range(self.rng.randint(1, 3))]
+    es = self.operands([(u, scope) for x, u in vs] + [(t, scope + vs)], size, depth)
+    return CallExpr(LambdaExpr([VarDecl(x, u) for x, u in vs], es[-1]), es[:-1])
+
+  def gen_if(self, t, size, scope, depth):
+    e1, e2, e3 = self.operands([(boolType, scope), (t, scope), (t, scope)], size, depth)
+    return IfExpr(e1, e2, e3)
+
+  def gen_logical(self, t, size, scope, depth):
+    op = self.rng.choice([AndExpr, OrExpr])
+    return op(*self.operands([(boolType, scope)] * 2, size, depth))
+
+  def gen_not(self, t, size, scope, depth):
+    return NotExpr(self.expr(boolType, size - 1, scope, depth))
+
+  def gen_abs(self, t, size, scope, depth):
+    x = self.fresh()
+    body = self.expr(t.ret, size - 1, scope + [(x, t.parm)], depth)
+    return AbsExpr(VarDecl(x, t.parm), body)
+
+  def gen_lambda(self, t, size, scope, depth):
+    vs = [(self.fresh(), u) for u in t.parms]
+    body = self.expr(t.ret, size - 1, scope + vs, depth)
+    return LambdaExpr([VarDecl(x, u) for x, u in vs], body)
+
+  def gen_call(self, t, size, scope, depth):
+    # Applies or calls a function in scope that returns t.
+    fs = [(x, u) for x, u in scope if type(u) is not BoolType and u.ret is t]
+    x, u = self.rng.choice(fs)
+    if type(u) is ArrowType:
+      return AppExpr(IdExpr(x), self.expr(u.parm, size - 1, scope, depth))
+    args = self.operands([(p, scope) for p in u.parms], size, depth)
+    return CallExpr(IdExpr(x), args)
+
+def generate(size, seed = 0, depth = 40):
+  # Returns a random program of type Bool with about size nodes. The
+  # program is not resolved.
+  g = Generator(seed, depth)
+  return g.expr(boolType, size, [])
+
+def write_corpus(path, count, size, seed = 0):
+  # Writes count programs of about size nodes to the file path. The
+  # programs are generated from consecutive seeds, starting with seed.
+  programs = [generate(size, seed + i) for i in range(count)]
+  with open(path, "wb") as f:
+    pickle.dump(programs, f)
+
+def read_corpus(path):
+  # Returns the list of programs written to path by write_corpus.
+  with open(path, "rb") as f:
+    return pickle.load(f)
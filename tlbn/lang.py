@@ -194,3 +194,5 @@ from lookup import resolve
 from subst import subst
 from reduce import step, reduce
 from evaluate import evaluate
+from fold import fold
+from generate import generate, write_corpus, read_corpus
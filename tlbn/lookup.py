@@ -77,7 +77,7 @@ def resolve(e, stk = []):
     # Recursively resolve in each subexpression.
     resolve(e.fn, stk)
     for a in e.args:
-      resolve(e.fn, stk)
+      resolve(a, stk)
     return e
 
   assert False
\ No newline at end of file
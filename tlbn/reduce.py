@@ -87,7 +87,7 @@ def step_if(e):
   # if false then e2 else e3 ~> e3
 
   if is_reducible(e.cond):
-    return NotExpr(step(e.cond), e.true, e.false)
+    return IfExpr(step(e.cond), e.true, e.false)
 
   if e.cond.val:
     return e.true
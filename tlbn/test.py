@@ -19,3 +19,16 @@ table = [
 #   print(e)
 #   print(evaluate(e))
 #   # reduce(e)
+
+# Folding simplifies the bodies of lambdas ahead of evaluation.
+# \(p, q).(not (true and p) or (q or false)) => \(p, q).(not p or q)
+e, n = fold(resolve(
+  LambdaExpr([VarDecl("p", boolType), VarDecl("q", boolType)],
+             OrExpr(NotExpr(AndExpr(True, "p")), OrExpr("q", False)))))
+print(f"{e} ({n} nodes removed)")
+
+
+# Random well-typed programs, for benchmarks. The same seed always
+# gives the same program.
+e = resolve(generate(25, seed = 7))
+print(f"{e} => {evaluate(e)}")
@@ -39,13 +39,14 @@ def is_same_type(t1 : Type, t2 : Type):
 
 @checked
 def is_bool(t : Type):
-  # Returns true if t is Bool.
-  return t == boolType;
+  # Returns true if t is Bool. Types are compared structurally, since
+  # copies of the program (e.g., pickled) have copies of boolType.
+  return is_same_type(t, boolType)
 
 @checked
 def is_int(t : Type):
   # Returns true if t is Int.
-  return t == intType;
+  return is_same_type(t, intType)
 
 @checked
 def is_function(t : Type):
@@ -93,7 +94,7 @@ def check_logical_unary(e : Expr, op : str):
   #  G |- e1 : Bool
   # -----------------
   # G |- op e1 : Bool
-  if is_bool(e.expr):
+  if is_bool(check(e.expr)):
     return boolType
 
   raise Exception(f"invalid operands to '{op}'")
@@ -104,7 +105,7 @@ def check_logical_binary(e : Expr, op : str):
   # -------------------------------
   #    G |- e1 op e2 : Bool
   
-  if is_bool(e.lhs) and is_bool(e.rhs):
+  if is_bool(check(e.lhs)) and is_bool(check(e.rhs)):
     return boolType
   
   raise Exception(f"invalid operands to '{op}'")
@@ -117,13 +118,28 @@ def check_and(e : Expr):
 def check_or(e : Expr):
   return check_logical_binary(e, "or")
 
+@checked
+def check_if(e : Expr):
+  # G |- e1 : Bool   G |- e2 : T   G |- e3 : T
+  # ------------------------------------------ T-If
+  #       G |- e1 ? e2 : e3 : T
+  if not is_bool(check(e.cond)):
+    raise Exception("invalid condition in 'if'")
+
+  t2 = check(e.true)
+  t3 = check(e.false)
+  if not is_same_type(t2, t3):
+    raise Exception("mismatched branches in 'if'")
+
+  return t2
+
 @checked
 def check_arithmetic_binary(e : Expr, op : str):
   # G |- e1 : Int   G |- e2 : Int
   # ----------------------------- T-Add
   #      G |- e1 op e2 : Int
   
-  if is_int(e.lhs) and is_int(e.rhs):
+  if is_int(check(e.lhs)) and is_int(check(e.rhs)):
     return intType
   
   raise Exception(f"invalid operands to '{op}'")
@@ -148,6 +164,16 @@ def check_div(e : Expr):
 def check_rem(e : Expr):
   return check_arithmetic_binary(e, "%")
 
+@checked
+def check_neg(e : Expr):
+  #  G |- e1 : Int
+  # ---------------
+  # G |- -e1 : Int
+  if is_int(check(e.expr)):
+    return intType
+
+  raise Exception("invalid operands to '-'")
+
 @checked
 def check_relational(e : Expr, op : str):
   # G |- e1 : T1   G |- e2 : T2
@@ -200,7 +226,7 @@ def check_lambda(e : Expr):
   #  G, xi:Ti :- e0 : T0
   # ---------------------
   # G |- \(xi:Ti).e0 : (Ti) -> T0
-  parms = [check(p) for p in e.vars]
+  parms = [p.type for p in e.vars]
   ret =  check(e.expr)
   return FnType(parms, ret)
 
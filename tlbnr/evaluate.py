@@ -3,7 +3,9 @@ from decorate import *
 
 import copy
 
-clone = copy.deepcopy
+# Stacks are copied shallowly. A deep copy would also copy the
+# declarations that key them, so variables could not be found.
+clone = copy.copy
 
 # This module implements implements big-step semantics.
 #
@@ -50,7 +52,7 @@ def eval_unary(e : Expr, stack : dict, heap : list, fn : object):
   # S |- @e1|s => @ v1|s
   #
   # Operands are inherently evaluated left to right.
-  v1 = evaluate(e.lhs, stack, heap)
+  v1 = evaluate(e.expr, stack, heap)
   return fn(v1)
 
 @checked
@@ -60,7 +62,7 @@ def eval_bool(e : Expr, stack : dict, heap : list):
   #
   # ----------------------- E-False
   # S |- false|s => False|s
-  return e.val
+  return e.value
 
 @checked
 def eval_and(e : Expr, stack : dict, heap : list):
@@ -84,10 +86,10 @@ def eval_cond(e, stack, heap : list):
   # S |- e1|s => false|s'   S |- e3|s' => v3|s''
   #--------------------------------------------- E-If-True
   #         S |- e1 ? e2 : e3|s => v3|s3''
-  if evaluate(e.cond):
-    return evaluate(e.true);
+  if evaluate(e.cond, stack, heap):
+    return evaluate(e.true, stack, heap);
   else:
-    return evaluate(e.false);
+    return evaluate(e.false, stack, heap);
 
 @checked
 def eval_int(e : Expr, stack : dict, heap : list):
@@ -117,7 +119,7 @@ def eval_rem(e : Expr, stack : dict, heap : list):
 
 @checked
 def eval_neg(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1: -v1)
+  return eval_unary(e, stack, heap, lambda v1: -v1)
 
 @checked
 def eval_eq(e : Expr, stack : dict, heap : list):
@@ -185,7 +187,7 @@ def eval_call(e : Expr, stack : dict, heap : list):
   for i in range(len(args)):
     env[c.abs.vars[i]] = args[i]
 
-  return evaluate(c.abs.expr, env)
+  return evaluate(c.abs.expr, env, heap)
 
 @checked
 def eval_new(e : Expr, stack : dict, heap : list):
@@ -242,7 +244,7 @@ def evaluate(e : Expr, stack : dict = {}, heap = []):
     return eval_not(e, stack, heap)
 
   if type(e) is IfExpr:
-    return eval_if(e, stack, heap)
+    return eval_cond(e, stack, heap)
 
   # Arithmetic expressions
 
@@ -289,6 +291,9 @@ def evaluate(e : Expr, stack : dict = {}, heap = []):
 
   # Functional expressions
 
+  if type(e) is IdExpr:
+    return eval_id(e, stack, heap)
+
   if type(e) is LambdaExpr:
     return eval_lambda(e, stack, heap)
 
@@ -0,0 +1,209 @@
+import pickle
+import random
+
+from lang import *
+from check import is_same_type
+
+# This module generates random, well-typed programs.
+#
+# Programs are built from the top down, one type at a time: to make an
+# expression of type T, the generator picks a form whose result has
+# type T and makes its operands at the types the form requires. For
+# example, an Int may be made as 'e1 + e2' (from two Ints), as '*e1'
+# (from a Ref Int), or as a call of a lambda that returns an Int.
+# Variables are only used where they are in scope and have the right
+# type, so every program generated is well-typed.
+#
+# Each program has about size nodes, which are shared at random among
+# the operands of each form. An expression whose share (or depth) runs
+# out is a leaf: a literal or a variable, or for compound types, the
+# smallest value of the type (a lambda returning a leaf, or a new
+# reference to one). Operands are made in order, and each one's share
+# is corrected for the nodes used by those before it.
+#
+# The generator is seeded, so a seed and a size always produce the
+# same program. Programs cover every form of the language except
+# assignment, and divisors are non-zero literals, so evaluation does
+# not fail.
+
+class Generator:
+  def __init__(self, seed = 0, depth = 40):
+    self.rng = random.Random(seed)
+
+    # The maximum depth of expressions.
+    self.depth = depth
+
+    # The number of names and nodes generated so far.
+    self.count = 0
+    self.nodes = 0
+
+    # The types of variables are drawn from a small pool, so that
+    # programs reuse the variables in scope.
+    self.types = [boolType, intType]
+    for i in range(6):
+      self.types.append(self.type(2))
+
+  def fresh(self):
+    # Returns a new variable name.
+    self.count += 1
+    return f"x{self.count}"
+
+  def pick(self):
+    # Returns a type from the pool.
+    return self.rng.choice(self.types)
+
+  def type(self, depth):
+    # Returns a random type whose compound types nest at most depth deep.
+    if depth == 0 or self.rng.random() < 0.3:
+      return self.rng.choice([boolType, intType])
+    if self.rng.random() < 0.5:
+      ts = [self.type(depth - 1) for i in range(self.rng.randint(1, 3))]
+      return FnType(ts, self.type(depth - 1))
+    return RefType(self.type(depth - 1))
+
+  def operands(self, parts, size, depth):
+    # Returns an expression for each pair (t, scope) in parts, sharing
+    # the size of their parent (less the parent itself) among them.
+    cuts = sorted(self.rng.randrange(size) for i in range(len(parts) - 1))
+    start = self.nodes
+    es = []
+    for (t, scope), end in zip(parts, cuts + [size - 1]):
+      es.append(self.expr(t, end - (self.nodes - start), scope, depth))
+    return es
+
+  def expr(self, t, size, scope, depth = 0):
+    # Returns an expression of type t with about size nodes. The scope
+    # is a list of the variables (pairs of names and types) that may
+    # be used.
+    if size <= self.cost(t) or depth >= self.depth:
+      return self.leaf(t, scope)
+    self.nodes += 1
+    forms = self.forms(t, scope)
+    return self.rng.choice(forms)(t, size, scope, depth + 1)
+
+  def forms(self, t, scope):
+    # Returns the forms that can make an expression of type t. Forms
+    # are repeated to make them more likely.
+    fs = [self.gen_let, self.gen_if]
+    if type(t) is BoolType:
+      fs += [self.gen_logical] * 3 + [self.gen_not, self.gen_relational] * 2
+    if type(t) is IntType:
+      fs += [self.gen_arithmetic] * 5 + [self.gen_neg]
+    if type(t) in (BoolType, IntType):
+      # Dereferences are not used for compound types, so the types of
+      # operands stay small.
+      fs += [self.gen_deref]
+    if type(t) is FnType:
+      fs += [self.gen_lambda] * 3
+    if type(t) is RefType:
+      fs += [self.gen_new] * 3
+    if any(type(u) is FnType and is_same_type(u.ret, t) for x, u in scope):
+      fs += [self.gen_call] * 2
+    return fs
+
+  def cost(self, t):
+    # Returns the number of nodes in the smallest value of type t.
+    if type(t) is FnType:
+      return 1 + self.cost(t.ret)
+    if type(t) is RefType:
+      return 1 + self.cost(t.ref)
+    return 1
+
+  def leaf(self, t, scope):
+    # Returns a small expression of type t.
+    self.nodes += 1
+    xs = [x for x, u in scope if is_same_type(u, t)]
+    if xs and self.rng.random() < 0.6:
+      return IdExpr(self.rng.choice(xs))
+    if type(t) is BoolType:
+      return BoolExpr(self.rng.random() < 0.5)
+    if type(t) is IntType:
+      return IntExpr(self.rng.randrange(10))
+    if type(t) is FnType:
+      vs = [(self.fresh(), u) for u in t.parms]
+      return LambdaExpr([VarDecl(x, u) for x, u in vs], self.leaf(t.ret, scope + vs))
+    if type(t) is RefType:
+      return NewExpr(self.leaf(t.ref, scope))
+    assert False
+
+  # Forms for any type
+
+  def gen_let(self, t, size, scope, depth):
+    # Binds new variables by calling a lambda: \(x1:T1, ...).e0 (e1, ...)
+    vs = [(self.fresh(), self.pick()) for i in range(self.rng.randint(1, 3))]
+    es = self.operands([(u, scope) for x, u in vs] + [(t, scope + vs)], size, depth)
+    return CallExpr(LambdaExpr([VarDecl(x, u) for x, u in vs], es[-1]), es[:-1])
+
+  def gen_if(self, t, size, scope, depth):
+    e1, e2, e3 = self.operands([(boolType, scope), (t, scope), (t, scope)], size, depth)
+    return IfExpr(e1, e2, e3)
+
+  def gen_call(self, t, size, scope, depth):
+    # Calls a function in scope that returns t.
+    fs = [(x, u) for x, u in scope if type(u) is FnType and is_same_type(u.ret, t)]
+    x, u = self.rng.choice(fs)
+    args = self.operands([(p, scope) for p in u.parms], size, depth)
+    return CallExpr(IdExpr(x), args)
+
+  # Boolean and arithmetic forms
+
+  def gen_logical(self, t, size, scope, depth):
+    op = self.rng.choice([AndExpr, OrExpr])
+    return op(*self.operands([(boolType, scope)] * 2, size, depth))
+
+  def gen_not(self, t, size, scope, depth):
+    return NotExpr(self.expr(boolType, size - 1, scope, depth))
+
+  def gen_relational(self, t, size, scope, depth):
+    op = self.rng.choice([EqExpr, NeExpr, LtExpr, GtExpr, LeExpr, GeExpr])
+    u = intType
+    if op in (EqExpr, NeExpr) and self.rng.random() < 0.3:
+      u = boolType
+    return op(*self.operands([(u, scope)] * 2, size, depth))
+
+  def gen_arithmetic(self, t, size, scope, depth):
+    op = self.rng.choice([AddExpr, AddExpr, SubExpr, SubExpr, MulExpr, DivExpr, RemExpr])
+    if op is DivExpr or op is RemExpr:
+      # Divide by a non-zero literal.
+      e1 = self.expr(intType, size - 2, scope, depth)
+      self.nodes += 1
+      return op(e1, IntExpr(self.rng.randint(1, 9)))
+    return op(*self.operands([(intType, scope)] * 2, size, depth))
+
+  def gen_neg(self, t, size, scope, depth):
+    return NegExpr(self.expr(intType, size - 1, scope, depth))
+
+  # Lambda forms
+
+  def gen_lambda(self, t, size, scope, depth):
+    vs = [(self.fresh(), u) for u in t.parms]
+    body = self.expr(t.ret, size - 1, scope + vs, depth)
+    return LambdaExpr([VarDecl(x, u) for x, u in vs], body)
+
+  # Reference forms
+
+  def gen_new(self, t, size, scope, depth):
+    return NewExpr(self.expr(t.ref, size - 1, scope, depth))
+
+  def gen_deref(self, t, size, scope, depth):
+    return DerefExpr(self.expr(RefType(t), size - 1, scope, depth))
+
+def generate(size, seed = 0, t = None, depth = 40):
+  # Returns a random program of type t (by default, Bool or Int) with
+  # about size nodes. The program is not resolved.
+  g = Generator(seed, depth)
+  if t is None:
+    t = g.rng.choice([boolType, intType])
+  return g.expr(t, size, [])
+
+def write_corpus(path, count, size, seed = 0):
+  # Writes count programs of about size nodes to the file path. The
+  # programs are generated from consecutive seeds, starting with seed.
+  programs = [generate(size, seed + i) for i in range(count)]
+  with open(path, "wb") as f:
+    pickle.dump(programs, f)
+
+def read_corpus(path):
+  # Returns the list of programs written to path by write_corpus.
+  with open(path, "rb") as f:
+    return pickle.load(f)
@@ -75,7 +75,7 @@ class BoolExpr(Expr):
     self.value = val
 
   def __str__(self):
-    return "true" if self.val else "false"
+    return "true" if self.value else "false"
 
 class AndExpr(Expr):
   # Represents expressions of the form `e1 and e2`.
@@ -367,3 +367,4 @@ from check import check
 from subst import subst
 from reduce import step, reduce
 from evaluate import evaluate
+from generate import generate, write_corpus, read_corpus
@@ -114,7 +114,7 @@ def resolve(e : Expr, stk : list = []):
   if type(e) is CallExpr:
     resolve(e.fn, stk)
     for a in e.args:
-      resolve(e.fn, stk)
+      resolve(a, stk)
     return e
 
   # Reference expressions
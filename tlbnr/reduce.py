@@ -7,6 +7,12 @@ from lang import *
 # are two main functions exported by the module: step, which
 # performs a single transition, and reduce, which performs
 # reduces an expression to a value.
+#
+# NOTE: This module was carried over from tlbn and has not been
+# extended to this language: it only knows the expressions of tlbn
+# (and refers to AbsExpr, which this language does not have), so it
+# cannot reduce programs of this language. It is not benchmarked (see
+# phases in bench.py) or profiled by default (see instrument.py).
 
 def is_value(e):
   # Returns true if e denotes a value.
@@ -87,7 +93,7 @@ def step_if(e):
   # if false then e2 else e3 ~> e3
 
   if is_reducible(e.cond):
-    return NotExpr(step(e.cond), e.true, e.false)
+    return IfExpr(step(e.cond), e.true, e.false)
 
   if e.cond.val:
     return e.true
@@ -27,3 +27,11 @@ check(e1)
 evaluate(e1)
 
 
+
+
+# Random well-typed programs, for benchmarks. The same seed always
+# gives the same program.
+e2 = resolve(generate(25, seed = 7))
+print(e2)
+print(check(e2))
+print(evaluate(e2, {}, []))
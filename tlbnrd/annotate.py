@@ -0,0 +1,95 @@
+# Annotations record the facts computed about a program by name
+# resolution, type checking and effect analysis: the declaration that
+# each identifier refers to (its ref), the type of each expression
+# and its effects. Lambdas also record the effects of calling them
+# (their latent effects).
+#
+# By default, these facts are written directly into the tree (e.ref
+# and e.type). That is simple, but it means that a tree can only be
+# resolved and checked once, so every request that wants to work on
+# a program has to clone it first.
+#
+# A SideTable stores the same facts outside of the tree, keyed by the
+# identity of each node. A single (immutable) tree can then be
+# resolved, checked and evaluated by many requests at the same time,
+# each with its own SideTable. Note that the keys are object ids, so
+# the table is only meaningful while the tree is alive.
+
+class Annotations:
+  # Stores annotations in the tree itself. This is the default
+  # annotation layer used by resolve, check and evaluate.
+
+  def ref(self, x):
+    # Returns the declaration bound to x (an IdExpr, IdType or
+    # MemberExpr), or None if x is unresolved.
+    return x.ref
+
+  def bind(self, x, d):
+    # Binds x to the declaration d.
+    x.ref = d
+
+  def type(self, x):
+    # Returns the type of x (an expression or declaration), or None
+    # if it has not been computed.
+    return x.type
+
+  def assign(self, x, t):
+    # Records that x has type t.
+    x.type = t
+
+  def effect(self, x):
+    # Returns the effects of evaluating the expression x, or None if
+    # they have not been computed.
+    return x.effect
+
+  def set_effect(self, x, f):
+    # Records that evaluating x has the effects f.
+    x.effect = f
+
+  def latent(self, x):
+    # Returns the effects of calling the lambda x, or None if they
+    # have not been computed.
+    return x.latent
+
+  def set_latent(self, x, f):
+    # Records that calling x has the effects f.
+    x.latent = f
+
+class SideTable(Annotations):
+  # Stores annotations in tables beside the tree.
+  #
+  # Lookups fall back to the tree when a node has no entry. This
+  # picks up bindings that are part of the syntax (e.g., an IdExpr
+  # constructed from a VarDecl) and the declared types of variables.
+  def __init__(self):
+    self.refs = {}
+    self.types = {}
+    self.effects = {}
+    self.latents = {}
+
+  def ref(self, x):
+    return self.refs.get(id(x), x.ref)
+
+  def bind(self, x, d):
+    self.refs[id(x)] = d
+
+  def type(self, x):
+    return self.types.get(id(x), x.type)
+
+  def assign(self, x, t):
+    self.types[id(x)] = t
+
+  def effect(self, x):
+    return self.effects.get(id(x))
+
+  def set_effect(self, x, f):
+    self.effects[id(x)] = f
+
+  def latent(self, x):
+    return self.latents.get(id(x))
+
+  def set_latent(self, x, f):
+    self.latents[id(x)] = f
+
+# The default (in-tree) annotation layer.
+inplace = Annotations()
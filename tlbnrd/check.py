@@ -1,5 +1,6 @@
 from lang import *
 from decorate import *
+from annotate import *
 
 # Implements the typing relation G |- e : T, which is to say that 
 # every expression e has some type T. If not, the expression 
@@ -35,6 +36,19 @@ def is_same_type(t1 : Type, t2 : Type):
   if type(t1) is RefType:
     return is_same_type(t1.ref, t2.ref)
 
+  if type(t1) is TupleType:
+    if len(t1.elems) != len(t2.elems):
+      return False
+    return all(map(is_same_type, t1.elems, t2.elems))
+
+  if type(t1) in (RecordType, VariantType):
+    if len(t1.fields) != len(t2.fields):
+      return False
+    for f1, f2 in zip(t1.fields, t2.fields):
+      if f1.id != f2.id or not is_same_type(f1.type, f2.type):
+        return False
+    return True
+
   assert False
 
 @checked
@@ -75,128 +89,153 @@ def is_variant(t : Type):
   return type(t) is VariantType
 
 @checked
-def has_same_type(e1 : Expr, e2 : Expr):
+def has_same_type(e1 : Expr, e2 : Expr, a : Annotations = inplace):
   # Returns true if expressions e1 and e2 have the same type.
-  return is_same_type(check(e1), check(e2))
+  return is_same_type(check(e1, a), check(e2, a))
 
 @checked
-def has_bool(e : Expr):
-  return is_same_type(check(e), boolType)
+def has_bool(e : Expr, a : Annotations = inplace):
+  return is_same_type(check(e, a), boolType)
 
 @checked
-def has_int(e : Expr):
+def has_int(e : Expr, a : Annotations = inplace):
   # Same as above, but for int.
-  return is_same_type(check(e), intType)
+  return is_same_type(check(e, a), intType)
 
 @checked
-def check_bool(e : Expr):
+def check_bool(e : Expr, a : Annotations):
   # ------------- T-Bool
   # G |- b : Bool
   return boolType
 
 @checked
-def check_int(e : Expr):
+def check_int(e : Expr, a : Annotations):
   # ------------ T-Int
   # G |- n : Int
   return intType
 
 @checked
-def check_logical_unary(e : Expr, op : str):
+def check_logical_unary(e : Expr, op : str, a : Annotations):
   #  G |- e1 : Bool
   # -----------------
   # G |- op e1 : Bool
-  if is_bool(e.expr):
+  if is_bool(check(e.expr, a)):
     return boolType
 
   raise Exception(f"invalid operands to '{op}'")
 
 @checked
-def check_logical_binary(e : Expr, op : str):
+def check_logical_binary(e : Expr, op : str, a : Annotations):
   # G |- e1 : Bool   G |- e2 : Bool
   # -------------------------------
   #    G |- e1 op e2 : Bool
   
-  if is_bool(e.lhs) and is_bool(e.rhs):
+  if is_bool(check(e.lhs, a)) and is_bool(check(e.rhs, a)):
     return boolType
   
   raise Exception(f"invalid operands to '{op}'")
 
 @checked
-def check_and(e : Expr):
-  return check_logical_binary(e, "and")
+def check_and(e : Expr, a : Annotations):
+  return check_logical_binary(e, "and", a)
 
 @checked
-def check_or(e : Expr):
-  return check_logical_binary(e, "or")
+def check_or(e : Expr, a : Annotations):
+  return check_logical_binary(e, "or", a)
 
 @checked
-def check_arithmetic_binary(e : Expr, op : str):
+def check_if(e : Expr, a : Annotations):
+  # G |- e1 : Bool   G |- e2 : T   G |- e3 : T
+  # ------------------------------------------ T-If
+  #       G |- e1 ? e2 : e3 : T
+  if not is_bool(check(e.cond, a)):
+    raise Exception("invalid condition in 'if'")
+
+  t2 = check(e.true, a)
+  t3 = check(e.false, a)
+  if not is_same_type(t2, t3):
+    raise Exception("mismatched branches in 'if'")
+
+  return t2
+
+@checked
+def check_arithmetic_binary(e : Expr, op : str, a : Annotations):
   # G |- e1 : Int   G |- e2 : Int
   # ----------------------------- T-Add
   #      G |- e1 op e2 : Int
   
-  if is_int(e.lhs) and is_int(e.rhs):
+  if is_int(check(e.lhs, a)) and is_int(check(e.rhs, a)):
     return intType
   
   raise Exception(f"invalid operands to '{op}'")
 
 @checked
-def check_add(e : Expr):
-  return check_arithmetic_binary(e, "+")
+def check_add(e : Expr, a : Annotations):
+  return check_arithmetic_binary(e, "+", a)
+
+@checked
+def check_sub(e : Expr, a : Annotations):
+  return check_arithmetic_binary(e, "-", a)
 
 @checked
-def check_sub(e : Expr):
-  return check_arithmetic_binary(e, "-")
+def check_mul(e : Expr, a : Annotations):
+  return check_arithmetic_binary(e, "*", a)
 
 @checked
-def check_mul(e : Expr):
-  return check_arithmetic_binary(e, "*")
+def check_div(e : Expr, a : Annotations):
+  return check_arithmetic_binary(e, "/", a)
 
 @checked
-def check_div(e : Expr):
-  return check_arithmetic_binary(e, "/")
+def check_rem(e : Expr, a : Annotations):
+  return check_arithmetic_binary(e, "%", a)
 
 @checked
-def check_rem(e : Expr):
-  return check_arithmetic_binary(e, "%")
+def check_neg(e : Expr, a : Annotations):
+  #  G |- e1 : Int
+  # ---------------
+  # G |- -e1 : Int
+  if is_int(check(e.expr, a)):
+    return intType
+
+  raise Exception("invalid operands to '-'")
 
 @checked
-def check_relational(e : Expr, op : str):
+def check_relational(e : Expr, op : str, a : Annotations):
   # G |- e1 : T1   G |- e2 : T2
   # --------------------------- T-Eq
   #    G |- e1 op e2 : Bool
   
-  if has_same_type(e.lhs, e.rhs):
+  if has_same_type(e.lhs, e.rhs, a):
     return boolType
   
   raise Exception(f"invalid operands to '{op}'")  
 
 @checked
-def check_eq(e : Expr):
-  return check_relational(e, "==")
+def check_eq(e : Expr, a : Annotations):
+  return check_relational(e, "==", a)
 
 @checked
-def check_ne(e : Expr):
-  return check_relational(e, "!=")
+def check_ne(e : Expr, a : Annotations):
+  return check_relational(e, "!=", a)
 
 @checked
-def check_lt(e : Expr):
-  return check_relational(e, "<")
+def check_lt(e : Expr, a : Annotations):
+  return check_relational(e, "<", a)
 
 @checked
-def check_gt(e : Expr):
-  return check_relational(e, ">")
+def check_gt(e : Expr, a : Annotations):
+  return check_relational(e, ">", a)
 
 @checked
-def check_le(e : Expr):
-  return check_relational(e, "<=")
+def check_le(e : Expr, a : Annotations):
+  return check_relational(e, "<=", a)
 
 @checked
-def check_ge(e : Expr):
-  return check_relational(e, ">=")
+def check_ge(e : Expr, a : Annotations):
+  return check_relational(e, ">=", a)
 
 @checked
-def check_id(e : Expr):
+def check_id(e : Expr, a : Annotations):
   #  x : T in G
   # -----------
   # G |- x : T
@@ -205,20 +244,20 @@ def check_id(e : Expr):
   # pair x : T. However, because we've previously bound the id
   # to its declaration, we can simply refer directly to the 
   # type of the variable.
-  return e.ref.type
+  return a.type(a.ref(e))
 
 @checked
-def check_lambda(e : Expr):
+def check_lambda(e : Expr, a : Annotations):
   #  G, xi:Ti :- e0 : T0
   # ---------------------
   # G |- \(xi:Ti).e0 : (Ti) -> T0
-  parms = [check(p) for p in e.vars]
-  ret =  check(e.expr)
+  parms = [a.type(p) for p in e.vars]
+  ret =  check(e.expr, a)
   return FnType(parms, ret)
 
 @checked
-def check_call(e : Expr):
-  t = check(e.fn)
+def check_call(e : Expr, a : Annotations):
+  t = check(e.fn, a)
   if not is_function(t):
     raise Exception("invalid function call")
   
@@ -228,7 +267,7 @@ def check_call(e : Expr):
     raise Exception("too many arguments")
 
   for i in range(len(e.args)):
-    arg = check(e.args[i])
+    arg = check(e.args[i], a)
     parm = t.parms[i]
     if not is_same_type(arg, parm):
       raise Exception("parameter/argument mismatch")
@@ -236,44 +275,44 @@ def check_call(e : Expr):
   return t.ret
 
 @checked
-def check_new(e : Expr):
+def check_new(e : Expr, a : Annotations):
   #    G |- e1 : T1
   # --------------------
   # G |- new e1 : Ref T1
-  t = check(e.expr)
+  t = check(e.expr, a)
   return RefType(t)
 
 @checked
-def check_deref(e : Expr):
+def check_deref(e : Expr, a : Annotations):
   # G |- e1 : Ref T1
   # -----------------
   #  G |- *e1 : T1
-  t = check(e.expr)
+  t = check(e.expr, a)
   if not is_reference(t):
     raise Exception("cannot dereference a non-reference")
 
   return t.ref
 
 @checked
-def check_assign(e : Expr):
-  t1 = check(e.lhs)
+def check_assign(e : Expr, a : Annotations):
+  t1 = check(e.lhs, a)
   if not is_reference(t1):
     raise Exception("operand is not a reference")
 
-  t2 = check(e.rhs)
+  t2 = check(e.rhs, a)
   if not is_reference_to(t1, t2):
     raise Exception("type mismatch in assignment")
 
 @checked
-def check_tuple(e : Expr):
+def check_tuple(e : Expr, a : Annotations):
   ts = []
   for x in e.elems:
-    ts += [check(x)]
+    ts += [check(x, a)]
   return TupleType(ts)
 
 @checked
-def check_proj(e : Expr):
-  t1 = check(e.obj)
+def check_proj(e : Expr, a : Annotations):
+  t1 = check(e.obj, a)
   if not is_tuple(t1):
     raise Exception("operand is not a tuple")
   if e.index < 0:
@@ -284,15 +323,15 @@ def check_proj(e : Expr):
   return t1.elems[e.index]
 
 @checked
-def check_record(e : Expr):
+def check_record(e : Expr, a : Annotations):
   fs = []
   for f in e.fields:
-    fs += [FieldDecl(f.id, check(f.value))]
+    fs += [FieldDecl(f.id, check(f.value, a))]
   return RecordType(fs)
 
 @checked
-def check_member(e : Expr):
-  t1 = check(e.obj)
+def check_member(e : Expr, a : Annotations):
+  t1 = check(e.obj, a)
   if not is_record(t1):
     raise Exception("operand is not a tuple")
   
@@ -301,14 +340,15 @@ def check_member(e : Expr):
   fs = {f.id:f for f in t1.fields}
   if e.id not in fs:
     raise Exception("no such member")
-  e.ref = fs[e.id]
+  f = fs[e.id]
+  a.bind(e, f)
 
   # Return the type of the computed field.
-  return e.ref.type
+  return f.type
 
 @checked
-def check_variant(e : Expr):
-  t1 = check(e.field.value)
+def check_variant(e : Expr, a : Annotations):
+  t1 = check(e.field.value, a)
 
   # Check that a) there is a corresponding label
   # in the type and that b) the type of the value
@@ -323,8 +363,8 @@ def check_variant(e : Expr):
   return e.variant
 
 @checked
-def check_case(e : Expr):
-  t1 = check(e.expr)
+def check_case(e : Expr, a : Annotations):
+  t1 = check(e.expr, a)
   if not is_variant(t1):
     raise Exception("operand is not a variant")
 
@@ -337,10 +377,10 @@ def check_case(e : Expr):
     if c.id not in fs:
       raise Exception("no matching case label in variant")
     f = fs[c.id]
-    c.var.type = f.type
+    a.assign(c.var, f.type)
 
     # Recursively type the expressions
-    t = check(c.expr)
+    t = check(c.expr, a)
     if not t2:
       t2 = t
     else:
@@ -350,120 +390,123 @@ def check_case(e : Expr):
   return t2
 
 @checked
-def do_check(e : Expr):
+def do_check(e : Expr, a : Annotations):
   # Compute the type of e.
 
   # Boolean expressions
   if type(e) is BoolExpr:
-    return check_bool(e)
+    return check_bool(e, a)
 
   if type(e) is AndExpr:
-    return check_logical_binary(e, "and")
+    return check_logical_binary(e, "and", a)
 
   if type(e) is OrExpr:
-    return check_logical_binary(e, "or")
+    return check_logical_binary(e, "or", a)
 
   if type(e) is NotExpr:
-    return check_logical_unary(e, "not")
+    return check_logical_unary(e, "not", a)
 
   if type(e) is IfExpr:
-    return check_if(e)
+    return check_if(e, a)
 
   # Arithmetic expressions
 
   if type(e) is IntExpr:
-    return check_int(e)
+    return check_int(e, a)
 
   if type(e) is AddExpr:
-    return check_add(e)
+    return check_add(e, a)
 
   if type(e) is SubExpr:
-    return check_sub(e)
+    return check_sub(e, a)
 
   if type(e) is MulExpr:
-    return check_mul(e)
+    return check_mul(e, a)
 
   if type(e) is DivExpr:
-    return check_div(e)
+    return check_div(e, a)
 
   if type(e) is RemExpr:
-    return check_rem(e)
+    return check_rem(e, a)
 
   if type(e) is NegExpr:
-    return check_neg(e)
+    return check_neg(e, a)
 
   # Relational expressions
 
   if type(e) is EqExpr:
-    return check_eq(e)
+    return check_eq(e, a)
 
   if type(e) is NeExpr:
-    return check_ne(e)
+    return check_ne(e, a)
 
   if type(e) is LtExpr:
-    return check_lt(e)
+    return check_lt(e, a)
 
   if type(e) is GtExpr:
-    return check_gt(e)
+    return check_gt(e, a)
 
   if type(e) is LeExpr:
-    return check_le(e)
+    return check_le(e, a)
 
   if type(e) is GeExpr:
-    return check_ge(e)
+    return check_ge(e, a)
 
   if type(e) is IdExpr:
-    return check_id(e)
+    return check_id(e, a)
 
   # Functional expressions
 
   if type(e) is LambdaExpr:
-    return check_lambda(e)
+    return check_lambda(e, a)
 
   if type(e) is CallExpr:
-    return check_call(e)
+    return check_call(e, a)
 
   # Reference expressions
 
   if type(e) is NewExpr:
-    return check_new(e)
+    return check_new(e, a)
 
   if type(e) is DerefExpr:
-    return check_deref(e)
+    return check_deref(e, a)
 
   if type(e) is AssignExpr:
-    return check_assign(e)
+    return check_assign(e, a)
 
   # Data expressions
 
   if type(e) is TupleExpr:
-    return check_tuple(e)
+    return check_tuple(e, a)
 
   if type(e) is ProjExpr:
-    return check_proj(e)
+    return check_proj(e, a)
 
   if type(e) is RecordExpr:
-    return check_record(e)
+    return check_record(e, a)
 
   if type(e) is MemberExpr:
-    return check_member(e)
+    return check_member(e, a)
 
   if type(e) is VariantExpr:
-    return check_variant(e)
+    return check_variant(e, a)
 
   if type(e) is CaseExpr:
-    return check_case(e)
+    return check_case(e, a)
 
   assert False
 
 @checked
-def check(e : Expr):
-  # Accepts an expression and returns its type.
+def check(e : Expr, a : Annotations = inplace):
+  # Accepts an expression and returns its type. Types are recorded
+  # in the annotation layer a.
 
   # If we've computed the type already, return it.
-  if not e.type:
-    e.type = do_check(e)
+  t = a.type(e)
+  if not t:
+    t = do_check(e, a)
+    a.assign(e, t)
 
-  return e.type
+  return t
 
 
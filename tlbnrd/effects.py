@@ -0,0 +1,131 @@
+from lang import *
+from decorate import *
+from annotate import *
+
+# Implements an effect analysis, which determines how the evaluation
+# of an expression may interact with the heap. There are three kinds
+# of effect:
+#
+#   - an expression allocates when it may evaluate 'new e1',
+#   - an expression reads when it may evaluate '*e1', and
+#   - an expression writes when it may evaluate 'e1 = e2'.
+#
+# An expression with no effects is pure. The effects of an expression
+# are a set of these flags, represented as an int.
+#
+# Evaluating a lambda only creates a closure, so it is pure. The
+# effects of its body are deferred until the lambda is called; these
+# are its latent effects. The effects of a call are the effects of
+# evaluating the function and its arguments plus the latent effects
+# of the function being called.
+#
+# The analysis is conservative. When the function being called is not
+# a lambda literal (e.g., it is a parameter or the result of another
+# call), we cannot know which closure is called at runtime, so the
+# call is assumed to have every effect. Function types do not record
+# effects, so this is also the case for every closure passed to (or
+# returned from) a function.
+
+PURE = 0
+ALLOCATES = 1
+READS = 2
+WRITES = 4
+
+# The effects of calling an unknown function.
+UNKNOWN = ALLOCATES | READS | WRITES
+
+@checked
+def describe(f : int):
+  # Returns a textual description of the effects f.
+  if f == PURE:
+    return "pure"
+  names = []
+  if f & ALLOCATES:
+    names += ["allocates"]
+  if f & READS:
+    names += ["reads"]
+  if f & WRITES:
+    names += ["writes"]
+  return "|".join(names)
+
+@checked
+def callee(e : Expr):
+  # Returns the lambda that e evaluates to, or None if it is not known.
+  if type(e) is LambdaExpr:
+    return e
+  return None
+
+@checked
+def effects_of_parts(e : Expr, a : Annotations):
+  # Returns the combined effects of the subexpressions of e.
+  f = PURE
+  for x in children(e):
+    f |= effects(x, a)
+  return f
+
+@checked
+def effects_of_lambda(e : Expr, a : Annotations):
+  # Records the latent effects of e, which are the effects of its body.
+  a.set_latent(e, effects(e.expr, a))
+  return PURE
+
+@checked
+def effects_of_call(e : Expr, a : Annotations):
+  f = effects_of_parts(e, a)
+  fn = callee(e.fn)
+  if fn is None:
+    return f | UNKNOWN
+  return f | latent(fn, a)
+
+@checked
+def do_effects(e : Expr, a : Annotations):
+  # Compute the effects of e.
+
+  # Reference expressions
+
+  if type(e) is NewExpr:
+    return ALLOCATES | effects_of_parts(e, a)
+
+  if type(e) is DerefExpr:
+    return READS | effects_of_parts(e, a)
+
+  if type(e) is AssignExpr:
+    return WRITES | effects_of_parts(e, a)
+
+  # Functional expressions
+
+  if type(e) is LambdaExpr:
+    return effects_of_lambda(e, a)
+
+  if type(e) is CallExpr:
+    return effects_of_call(e, a)
+
+  # Every other expression has the effects of its parts.
+  return effects_of_parts(e, a)
+
+@checked
+def effects(e : Expr, a : Annotations = inplace):
+  # Accepts an expression and returns its effects. Effects are recorded
+  # for e and each of its subexpressions (and the latent effects of
+  # each lambda) in the annotation layer a.
+  #
+  # Expressions must be resolved before they are analyzed.
+  f = a.effect(e)
+  if f is None:
+    f = do_effects(e, a)
+    a.set_effect(e, f)
+  return f
+
+@checked
+def latent(e : LambdaExpr, a : Annotations = inplace):
+  # Returns the effects of calling the lambda e.
+  f = a.latent(e)
+  if f is None:
+    effects(e, a)
+    f = a.latent(e)
+  return f
+
+@checked
+def is_pure(e : Expr, a : Annotations = inplace):
+  # Returns true if evaluating e has no effects.
+  return effects(e, a) == PURE
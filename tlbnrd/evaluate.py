@@ -1,9 +1,8 @@
 from lang import *
 from decorate import *
-
-import copy
-
-clone = copy.deepcopy
+from annotate import *
+from memo import *
+from quota import *
 
 # This module implements implements big-step semantics.
 #
@@ -25,7 +24,7 @@ class Closure:
   # during application.
   def __init__(self, abs, env):
     self.abs = abs
-    self.env = clone(env)
+    self.env = dict(env)
 
   def __str__(self):
     # TODO: Write out closed environment?
@@ -91,28 +90,28 @@ class Variant:
     return f"<{self.tag}={self.value}>"
 
 @checked
-def eval_binary(e : Expr, stack : dict, heap : list, fn : object):
+def eval_binary(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota, fn : object):
   # S |- e1|s => v1|s'   S |- e2|s' => v2|s''
   # ----------------------------------------- E-Binary-@
   #       S |- e1 @ e2|s => v1 @ v2|s''
   #
   # Operands are inherently evaluated left to right.
-  v1 = evaluate(e.lhs, stack, heap)
-  v2 = evaluate(e.rhs, stack, heap)
+  v1 = evaluate(e.lhs, stack, heap, a, m, q)
+  v2 = evaluate(e.rhs, stack, heap, a, m, q)
   return fn(v1, v2)
 
 @checked
-def eval_unary(e : Expr, stack : dict, heap : list, fn : object):
+def eval_unary(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota, fn : object):
   #  S |- e1|s => v1|s'
   # -------------------- E-Unary-@
   # S |- @e1|s => @ v1|s
   #
   # Operands are inherently evaluated left to right.
-  v1 = evaluate(e.lhs, stack, heap)
+  v1 = evaluate(e.expr, stack, heap, a, m, q)
   return fn(v1)
 
 @checked
-def eval_bool(e : Expr, stack : dict, heap : list):
+def eval_bool(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # --------------------- E-True
   # S |- true|s => True|s
   #
@@ -121,20 +120,20 @@ def eval_bool(e : Expr, stack : dict, heap : list):
   return e.value
 
 @checked
-def eval_and(e : Expr, stack : dict, heap : list):
+def eval_and(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # NOTE: This is not short-circuiting.
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 and v2)
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 and v2)
 
 @checked
-def eval_or(e : Expr, stack : dict, heap : list):
+def eval_or(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # NOTE: This is not short-circuiting.
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 or v2)
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 or v2)
 
 @checked
-def eval_not(e : Expr, stack : dict, heap : list):
-  return eval_unary(e, stack, heap, lambda v1: not v1)
+def eval_not(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_unary(e, stack, heap, a, m, q, lambda v1: not v1)
 
-def eval_cond(e, stack, heap : list):
+def eval_if(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # S |- e1|s => true|s'   S |- e2|s' => v2|s''
   #-------------------------------------------- E-If-True
   #         S |- e1 ? e2 : e3|s => v2|s''
@@ -142,74 +141,74 @@ def eval_cond(e, stack, heap : list):
   # S |- e1|s => false|s'   S |- e3|s' => v3|s''
   #--------------------------------------------- E-If-True
   #         S |- e1 ? e2 : e3|s => v3|s3''
-  if evaluate(e.cond):
-    return evaluate(e.true);
+  if evaluate(e.cond, stack, heap, a, m, q):
+    return evaluate(e.true, stack, heap, a, m, q)
   else:
-    return evaluate(e.false);
+    return evaluate(e.false, stack, heap, a, m, q)
 
 @checked
-def eval_int(e : Expr, stack : dict, heap : list):
+def eval_int(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # -------------------- E-Int
   # S |- n|s => int(n)|s
   return e.value
 
 @checked
-def eval_add(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 + v2)
+def eval_add(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 + v2)
 
 @checked
-def eval_sub(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 - v2)
+def eval_sub(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 - v2)
 
 @checked
-def eval_mul(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 * v2)
+def eval_mul(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 * v2)
 
 @checked
-def eval_div(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 / v2)
+def eval_div(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 / v2)
 
 @checked
-def eval_rem(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 % v2)
+def eval_rem(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 % v2)
 
 @checked
-def eval_neg(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1: -v1)
+def eval_neg(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_unary(e, stack, heap, a, m, q, lambda v1: -v1)
 
 @checked
-def eval_eq(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 == v2)
+def eval_eq(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 == v2)
 
 @checked
-def eval_ne(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 != v2)
+def eval_ne(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 != v2)
 
 @checked
-def eval_lt(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 < v2)
+def eval_lt(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 < v2)
 
 @checked
-def eval_gt(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 > v2)
+def eval_gt(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 > v2)
 
 @checked
-def eval_le(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 <= v2)
+def eval_le(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 <= v2)
 
 @checked
-def eval_ge(e : Expr, stack : dict, heap : list):
-  return eval_binary(e, stack, heap, lambda v1, v2: v1 >= v2)
+def eval_ge(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  return eval_binary(e, stack, heap, a, m, q, lambda v1, v2: v1 >= v2)
 
 @checked
-def eval_id(e : Expr, stack : dict, heap : list):
+def eval_id(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   #    x1=v1 in S
   # ---------------- E-Id
   # S |- x|s => v1|s
-  return stack[e.ref]
+  return stack[a.ref(e)]
 
 @checked
-def eval_lambda(e : Expr, stack : dict, heap : list):
+def eval_lambda(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # ------------------------------ E-Lambda
   # S |- \(xi).e|s => <\(x1i).e,S>
   #
@@ -219,7 +218,7 @@ def eval_lambda(e : Expr, stack : dict, heap : list):
   # is less than e (i.e., parameters declared outside of e).
   return Closure(e, stack)
 
-def eval_call(e : Expr, stack : dict, heap : list):
+def eval_call(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # Evaluate a call expression.
   #
   # S |- e0|s => \(xi).e1|s'   S |- ei|s'i => vi|s'i   S, si=vi |- e1|s'i => v1|s''i
@@ -228,15 +227,15 @@ def eval_call(e : Expr, stack : dict, heap : list):
   #
   # The arguments are evaluated and then their bindings added to the
   # stack prior to execution.
-  c = evaluate(e.fn, stack, heap)
+  c = evaluate(e.fn, stack, heap, a, m, q)
   
   if type(c) is not Closure:
     raise Exception("cannot apply a non-closure to an argument")
 
   # Evaluate arguments
   args = []
-  for a in e.args:
-    args += [evaluate(a, stack, heap)]
+  for x in e.args:
+    args += [evaluate(x, stack, heap, a, m, q)]
 
   # Build the new environment containing the argument mapping.
   #
@@ -244,79 +243,141 @@ def eval_call(e : Expr, stack : dict, heap : list):
   # the current stack and then evaluating. That also seems a little
   # bit wrong... If the closure has variables with the same name as
   # values on the stack, we end up overwriting them.
-  env = clone(c.env)
+  env = dict(c.env)
   for i in range(len(args)):
     env[c.abs.vars[i]] = args[i]
 
-  return evaluate(c.abs.expr, env, heap)
+  # The body is evaluated one call deeper (see quota.py).
+  q.enter()
+  try:
+    if not m.enabled():
+      return evaluate(c.abs.expr, env, heap, a, m, q)
+
+    # When memoizing, reuse the result of a previous call with the same
+    # closure and arguments, provided that the call is pure.
+    t = m.table(c.abs, a)
+    k = call_key(c, args, a, m)
+    if k is None:
+      return evaluate(c.abs.expr, env, heap, a, m, q)
+    v = t.lookup(k)
+    if v is MISS:
+      v = evaluate(c.abs.expr, env, heap, a, m, q)
+      t.store(k, v)
+    return v
+  except RecursionError:
+    # The calls are nested more deeply than the Python stack allows.
+    # With a limit on depth, that exceeds the depth quota; otherwise,
+    # the error is not the quota's.
+    if q.max_depth is None:
+      raise
+    raise QuotaExceeded("depth", q) from None
+  finally:
+    q.leave()
+
+def is_pure_value(v, a : Annotations, m : Memo):
+  # Returns true if v contains only closures of pure lambdas.
+  if type(v) is Closure:
+    t = m.table(v.abs, a)
+    return t.pure and all(is_pure_value(v.env[d], a, m) for d in t.free)
+  if type(v) is Tuple:
+    return all(is_pure_value(x, a, m) for x in v.values)
+  if type(v) is Record:
+    return all(is_pure_value(f.value, a, m) for f in v.fields)
+  if type(v) is Variant:
+    return is_pure_value(v.value, a, m)
+  return True
+
+def value_key(v):
+  # Returns a hashable key for the value v. Closures and locations
+  # are compared by identity.
+  if type(v) is Tuple:
+    return (Tuple, *map(value_key, v.values))
+  if type(v) is Record:
+    return (Record, *((f.id, value_key(f.value)) for f in v.fields))
+  if type(v) is Variant:
+    return (Variant, v.tag, value_key(v.value))
+  if type(v) in (bool, int, float):
+    return (type(v), v)
+  return v
+
+def call_key(c : Closure, args : list, a : Annotations, m : Memo):
+  # Returns the memo key for calling c with args, or None if the
+  # call cannot be memoized.
+  captured = [c.env[d] for d in m.table(c.abs, a).free]
+  if not is_pure_value(c, a, m):
+    return None
+  if not all(is_pure_value(v, a, m) for v in args):
+    return None
+  return (tuple(map(value_key, captured)), tuple(map(value_key, args)))
 
 @checked
-def eval_new(e : Expr, stack : dict, heap : list):
+def eval_new(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # S |- e1|s => v1|s'   l1 = fresh
   # ------------------------------- E-New
   # S |- new e1|s => l1|[l1->v1]s
-  v1 = evaluate(e.expr, stack, heap)
+  v1 = evaluate(e.expr, stack, heap, a, m, q)
+  q.allocate()
   l1 = Location(len(heap))
   heap += [v1]
   return l1
 
 @checked
-def eval_deref(e : Expr, stack : dict, heap : list):
+def eval_deref(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # S |- e1|s => l1|s'    l1=v1 in s'
   # --------------------------------- E-Deref
   #       S |- *e1|s => v1|s'
   #
   # Note that we'll get an out-of-bounds error if the index is invalid.
-  l1 = evaluate(e.expr, stack, heap)
+  l1 = evaluate(e.expr, stack, heap, a, m, q)
   if type(l1) is not Location:
     raise Exception("invalid reference")
   return heap[l1.index]
 
 @checked
-def eval_assign(e : Expr, stack : dict, heap : list):
+def eval_assign(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # S |- e2|s => v2|s   S |- e1|s' => l1|s''
   # ---------------------------------------- E-Deref
   #    S |- e1 = e2|s => l1|[l1->v2]s''
   #
   # Operands are evaluated right to left. The effect is to update
   # location of e1 to the value of e2.
-  v2 = evaluate(e.rhs, stack, heap)
-  l1 = evaluate(e.lhs, stack, heap)
+  v2 = evaluate(e.rhs, stack, heap, a, m, q)
+  l1 = evaluate(e.lhs, stack, heap, a, m, q)
   if type(l1) is not Location:
     raise Exception("invalid reference")
   heap[l1.index] = v2
 
 @checked
-def eval_tuple(e : Expr, stack : dict, heap : list):
+def eval_tuple(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # FIXME: Document semantics.
   vs = []
   for x in e.elems:
-    vs += [evaluate(x, stack, heap)]
+    vs += [evaluate(x, stack, heap, a, m, q)]
   return Tuple(vs)
 
-def eval_proj(e : Expr, stack : dict, heap : list):
+def eval_proj(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # FIXME: Document semantics.
-  v1 = evaluate(e.obj, stack, heap)
+  v1 = evaluate(e.obj, stack, heap, a, m, q)
   return v1.values[e.index]
 
-def eval_record(e : Expr, stack : dict, heap : list):
+def eval_record(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # FIXME: Document semantics.
   fs = []
   for f in e.fields:
-    fs += [Field(f.id, evaluate(f.value, stack, heap))]
+    fs += [Field(f.id, evaluate(f.value, stack, heap, a, m, q))]
   return Record(fs)
 
-def eval_member(e : Expr, stack : dict, heap : list):
+def eval_member(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
   # FIXME: Document semantics.
-  v1 = evaluate(e.obj, stack, heap)
+  v1 = evaluate(e.obj, stack, heap, a, m, q)
   return v1.select[e.id]
 
-def eval_variant(e : Expr, stack : dict, heap : list):
-  v1 = evaluate(e.field.value)
+def eval_variant(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  v1 = evaluate(e.field.value, stack, heap, a, m, q)
   return Variant(e.field.id, v1)
 
-def eval_case(e : Expr, stack : dict, heap : list):
-  v1 = evaluate(e.expr, stack, heap)
+def eval_case(e : Expr, stack : dict, heap : list, a : Annotations, m : Memo, q : Quota):
+  v1 = evaluate(e.expr, stack, heap, a, m, q)
 
   # Search for the corresponding label.
   #
@@ -330,111 +391,122 @@ def eval_case(e : Expr, stack : dict, heap : list):
   assert case != None
 
   # Execute the case as if calling a function.
-  env = clone(stack)
-  env[c.var] = v1.value
-  return evaluate(c.expr, env, heap)
-
-
-def evaluate(e : Expr, stack : dict = {}, heap = []):
-  # Evaluate an expression. The stack is the calls stack.
+  env = dict(stack)
+  env[case.var] = v1.value
+  return evaluate(c.expr, env, heap, a, m, q)
+
+
+def evaluate(e : Expr, stack : dict = {}, heap = [], a : Annotations = inplace, m : Memo = nomemo,
+             q : Quota = None):
+  # Evaluate an expression. The stack is the calls stack. Bindings
+  # are found in the annotation layer a. Calls to pure lambdas are
+  # memoized in m (see memo.py); by default, nothing is memoized.
+  # Each node evaluated is a step of the quota q (see quota.py); by
+  # default, a new quota without limits.
+  if q is None:
+    q = Quota()
+  q.step()
 
   # Boolean expressions
 
   if type(e) is BoolExpr:
-    return eval_bool(e, stack, heap)
+    return eval_bool(e, stack, heap, a, m, q)
 
   if type(e) is AndExpr:
-    return eval_and(e, stack, heap)
+    return eval_and(e, stack, heap, a, m, q)
 
   if type(e) is OrExpr:
-    return eval_or(e, stack, heap)
+    return eval_or(e, stack, heap, a, m, q)
 
   if type(e) is NotExpr:
-    return eval_not(e, stack, heap)
+    return eval_not(e, stack, heap, a, m, q)
 
   if type(e) is IfExpr:
-    return eval_if(e, stack, heap)
+    return eval_if(e, stack, heap, a, m, q)
 
   # Arithmetic expressions
 
   if type(e) is IntExpr:
-    return eval_int(e, stack, heap)
+    return eval_int(e, stack, heap, a, m, q)
 
   if type(e) is AddExpr:
-    return eval_add(e, stack, heap)
+    return eval_add(e, stack, heap, a, m, q)
 
   if type(e) is SubExpr:
-    return eval_sub(e, stack, heap)
+    return eval_sub(e, stack, heap, a, m, q)
 
   if type(e) is MulExpr:
-    return eval_mul(e, stack, heap)
+    return eval_mul(e, stack, heap, a, m, q)
 
   if type(e) is DivExpr:
-    return eval_div(e, stack, heap)
+    return eval_div(e, stack, heap, a, m, q)
 
   if type(e) is RemExpr:
-    return eval_rem(e, stack, heap)
+    return eval_rem(e, stack, heap, a, m, q)
 
   if type(e) is NegExpr:
-    return eval_neg(e, stack, heap)
+    return eval_neg(e, stack, heap, a, m, q)
 
   # Relational expressions
 
   if type(e) is EqExpr:
-    return eval_eq(e, stack, heap)
+    return eval_eq(e, stack, heap, a, m, q)
 
   if type(e) is NeExpr:
-    return eval_ne(e, stack, heap)
+    return eval_ne(e, stack, heap, a, m, q)
 
   if type(e) is LtExpr:
-    return eval_lt(e, stack, heap)
+    return eval_lt(e, stack, heap, a, m, q)
 
   if type(e) is GtExpr:
-    return eval_gt(e, stack, heap)
+    return eval_gt(e, stack, heap, a, m, q)
 
   if type(e) is LeExpr:
-    return eval_le(e, stack, heap)
+    return eval_le(e, stack, heap, a, m, q)
 
   if type(e) is GeExpr:
-    return eval_ge(e, stack, heap)
+    return eval_ge(e, stack, heap, a, m, q)
 
   # Functional expressions
 
+  if type(e) is IdExpr:
+    return eval_id(e, stack, heap, a, m, q)
+
   if type(e) is LambdaExpr:
-    return eval_lambda(e, stack, heap)
+    return eval_lambda(e, stack, heap, a, m, q)
 
   if type(e) is CallExpr:
-    return eval_call(e, stack, heap)
+    return eval_call(e, stack, heap, a, m, q)
 
   # Reference expressions
 
   if type(e) is NewExpr:
-    return eval_new(e, stack, heap)
+    return eval_new(e, stack, heap, a, m, q)
 
   if type(e) is DerefExpr:
-    return eval_deref(e, stack, heap)
+    return eval_deref(e, stack, heap, a, m, q)
 
   if type(e) is AssignExpr:
-    return eval_assign(e, stack, heap)
+    return eval_assign(e, stack, heap, a, m, q)
 
   # Data expressions
 
   if type(e) is TupleExpr:
-    return eval_tuple(e, stack, heap)
+    return eval_tuple(e, stack, heap, a, m, q)
 
   if type(e) is ProjExpr:
-    return eval_proj(e, stack, heap)
+    return eval_proj(e, stack, heap, a, m, q)
 
   if type(e) is RecordExpr:
-    return eval_record(e, stack, heap)
+    return eval_record(e, stack, heap, a, m, q)
 
   if type(e) is MemberExpr:
-    return eval_member(e, stack, heap)
+    return eval_member(e, stack, heap, a, m, q)
 
   if type(e) is VariantExpr:
-    return eval_variant(e, stack, heap)
+    return eval_variant(e, stack, heap, a, m, q)
 
   if type(e) is CaseExpr:
-    return eval_case(e, stack, heap)
+    return eval_case(e, stack, heap, a, m, q)
 
   assert False
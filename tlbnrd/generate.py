@@ -0,0 +1,278 @@
+import pickle
+import random
+
+from lang import *
+
+# This module generates random, well-typed programs.
+#
+# Programs are built from the top down, one type at a time: to make an
+# expression of type T, the generator picks a form whose result has
+# type T and makes its operands at the types the form requires. For
+# example, an Int may be made as 'e1 + e2' (from two Ints), as 'e1.x'
+# (from a record with an Int field x), or as a call of a lambda that
+# returns an Int. Variables are only used where they are in scope and
+# have the right type, so every program generated passes check().
+#
+# Each program has about size nodes. The nodes of a form are shared
+# among its operands at random, and an expression whose share (or
+# depth) runs out is a leaf. Leaves are literals or variables; for
+# compound types, they are the smallest values of the type (a lambda
+# returning a leaf, a tuple of leaves, and so on). Operands are made in
+# order, and each one's share is corrected for the nodes actually used
+# by those before it, so small leaves that turn out larger than their
+# share do not add up.
+#
+# The generator is seeded, so a seed and a size always produce the
+# same program. Generated programs cover every form of the language
+# except assignment (which has no type in check()). They avoid runtime
+# errors: divisors are non-zero literals and every case expression
+# covers every label of its variant.
+#
+# The main functions are generate, which returns one program, and
+# write_corpus, which writes a set of programs to a file (see
+# read_corpus).
+
+class Generator:
+  def __init__(self, seed = 0, depth = 40):
+    self.rng = random.Random(seed)
+
+    # The maximum depth of expressions.
+    self.depth = depth
+
+    # The number of names and nodes generated so far.
+    self.count = 0
+    self.nodes = 0
+
+    # The types of variables, fields, and so on are drawn from a small
+    # pool, so that programs reuse the variables in scope.
+    self.types = [boolType, intType]
+    for i in range(6):
+      self.types.append(self.type(2))
+
+  def fresh(self):
+    # Returns a new variable name.
+    self.count += 1
+    return f"x{self.count}"
+
+  def pick(self):
+    # Returns a type from the pool.
+    return self.rng.choice(self.types)
+
+  def type(self, depth):
+    # Returns a random type whose compound types nest at most depth deep.
+    if depth == 0 or self.rng.random() < 0.3:
+      return self.rng.choice([boolType, intType])
+    k = self.rng.randrange(5)
+    n = self.rng.randint(1, 3)
+    if k == 0:
+      ts = [self.type(depth - 1) for i in range(n)]
+      return FnType(ts, self.type(depth - 1))
+    if k == 1:
+      return RefType(self.type(depth - 1))
+    if k == 2:
+      return TupleType([self.type(depth - 1) for i in range(n + 1)])
+    if k == 3:
+      return RecordType([(f"f{i}", self.type(depth - 1)) for i in range(n + 1)])
+    return VariantType([(f"v{i}", self.type(depth - 1)) for i in range(n + 1)])
+
+  def operands(self, parts, size, depth):
+    # Returns an expression for each pair (t, scope) in parts, sharing
+    # the size of their parent (less the parent itself) among them.
+    cuts = sorted(self.rng.randrange(size) for i in range(len(parts) - 1))
+    start = self.nodes
+    es = []
+    for (t, scope), end in zip(parts, cuts + [size - 1]):
+      es.append(self.expr(t, end - (self.nodes - start), scope, depth))
+    return es
+
+  def expr(self, t, size, scope, depth = 0):
+    # Returns an expression of type t with about size nodes. The scope
+    # is a list of the variables (pairs of names and types) that may
+    # be used.
+    if size <= self.cost(t) or depth >= self.depth:
+      return self.leaf(t, scope)
+    self.nodes += 1
+    forms = self.forms(t, scope)
+    return self.rng.choice(forms)(t, size, scope, depth + 1)
+
+  def forms(self, t, scope):
+    # Returns the forms that can make an expression of type t. Forms
+    # are repeated to make them more likely.
+    fs = [self.gen_let, self.gen_if]
+    if type(t) is BoolType:
+      fs += [self.gen_logical] * 3 + [self.gen_not, self.gen_relational] * 2
+    if type(t) is IntType:
+      fs += [self.gen_arithmetic] * 5 + [self.gen_neg]
+    if type(t) in (BoolType, IntType):
+      # Data of base types is taken from compound values. These are not
+      # used for compound types, so the types of operands stay small.
+      fs += [self.gen_proj, self.gen_member, self.gen_deref, self.gen_case]
+    if type(t) is FnType:
+      fs += [self.gen_lambda] * 3
+    if type(t) is RefType:
+      fs += [self.gen_new] * 3
+    if type(t) is TupleType:
+      fs += [self.gen_tuple] * 3
+    if type(t) is RecordType:
+      fs += [self.gen_record] * 3
+    if type(t) is VariantType:
+      fs += [self.gen_variant] * 3
+    if any(type(u) is FnType and u.ret == t for x, u in scope):
+      fs += [self.gen_call] * 2
+    return fs
+
+  def cost(self, t):
+    # Returns the number of nodes in the smallest value of type t.
+    if type(t) is FnType:
+      return 1 + self.cost(t.ret)
+    if type(t) is RefType:
+      return 1 + self.cost(t.ref)
+    if type(t) is TupleType:
+      return 1 + sum(self.cost(u) for u in t.elems)
+    if type(t) in (RecordType, VariantType):
+      return 1 + sum(self.cost(f.type) for f in t.fields)
+    return 1
+
+  def leaf(self, t, scope):
+    # Returns a small expression of type t.
+    self.nodes += 1
+    xs = [x for x, u in scope if u == t]
+    if xs and self.rng.random() < 0.6:
+      return IdExpr(self.rng.choice(xs))
+    if type(t) is BoolType:
+      return BoolExpr(self.rng.random() < 0.5)
+    if type(t) is IntType:
+      return IntExpr(self.rng.randrange(10))
+    if type(t) is FnType:
+      vs = [(self.fresh(), u) for u in t.parms]
+      return LambdaExpr([VarDecl(x, u) for x, u in vs], self.leaf(t.ret, scope + vs))
+    if type(t) is RefType:
+      return NewExpr(self.leaf(t.ref, scope))
+    if type(t) is TupleType:
+      return TupleExpr([self.leaf(u, scope) for u in t.elems])
+    if type(t) is RecordType:
+      return RecordExpr([(f.id, self.leaf(f.type, scope)) for f in t.fields])
+    if type(t) is VariantType:
+      f = self.rng.choice(t.fields)
+      return VariantExpr((f.id, self.leaf(f.type, scope)), t)
+    assert False
+
+  # Forms for any type
+
+  def gen_let(self, t, size, scope, depth):
+    # Binds new variables by calling a lambda: \(x1:T1, ...).e0 (e1, ...)
+    vs = [(self.fresh(), self.pick()) for i in range(self.rng.randint(1, 3))]
+    es = self.operands([(u, scope) for x, u in vs] + [(t, scope + vs)], size, depth)
+    return CallExpr(LambdaExpr([VarDecl(x, u) for x, u in vs], es[-1]), es[:-1])
+
+  def gen_if(self, t, size, scope, depth):
+    e1, e2, e3 = self.operands([(boolType, scope), (t, scope), (t, scope)], size, depth)
+    return IfExpr(e1, e2, e3)
+
+  def gen_call(self, t, size, scope, depth):
+    # Calls a function in scope that returns t.
+    fs = [(x, u) for x, u in scope if type(u) is FnType and u.ret == t]
+    x, u = self.rng.choice(fs)
+    args = self.operands([(p, scope) for p in u.parms], size, depth)
+    return CallExpr(IdExpr(x), args)
+
+  # Boolean and arithmetic forms
+
+  def gen_logical(self, t, size, scope, depth):
+    op = self.rng.choice([AndExpr, OrExpr])
+    return op(*self.operands([(boolType, scope)] * 2, size, depth))
+
+  def gen_not(self, t, size, scope, depth):
+    return NotExpr(self.expr(boolType, size - 1, scope, depth))
+
+  def gen_relational(self, t, size, scope, depth):
+    op = self.rng.choice([EqExpr, NeExpr, LtExpr, GtExpr, LeExpr, GeExpr])
+    u = intType
+    if op in (EqExpr, NeExpr) and self.rng.random() < 0.3:
+      u = boolType
+    return op(*self.operands([(u, scope)] * 2, size, depth))
+
+  def gen_arithmetic(self, t, size, scope, depth):
+    op = self.rng.choice([AddExpr, AddExpr, SubExpr, SubExpr, MulExpr, DivExpr, RemExpr])
+    if op is DivExpr or op is RemExpr:
+      # Divide by a non-zero literal.
+      e1 = self.expr(intType, size - 2, scope, depth)
+      self.nodes += 1
+      return op(e1, IntExpr(self.rng.randint(1, 9)))
+    return op(*self.operands([(intType, scope)] * 2, size, depth))
+
+  def gen_neg(self, t, size, scope, depth):
+    return NegExpr(self.expr(intType, size - 1, scope, depth))
+
+  # Lambda forms
+
+  def gen_lambda(self, t, size, scope, depth):
+    vs = [(self.fresh(), u) for u in t.parms]
+    body = self.expr(t.ret, size - 1, scope + vs, depth)
+    return LambdaExpr([VarDecl(x, u) for x, u in vs], body)
+
+  # Reference forms
+
+  def gen_new(self, t, size, scope, depth):
+    return NewExpr(self.expr(t.ref, size - 1, scope, depth))
+
+  def gen_deref(self, t, size, scope, depth):
+    return DerefExpr(self.expr(RefType(t), size - 1, scope, depth))
+
+  # Data forms
+
+  def gen_tuple(self, t, size, scope, depth):
+    return TupleExpr(self.operands([(u, scope) for u in t.elems], size, depth))
+
+  def gen_proj(self, t, size, scope, depth):
+    # Projects t from a tuple of pool types.
+    ts = [self.pick() for i in range(self.rng.randint(1, 3))]
+    n = self.rng.randrange(len(ts) + 1)
+    ts.insert(n, t)
+    return ProjExpr(self.expr(TupleType(ts), size - 1, scope, depth), n)
+
+  def gen_record(self, t, size, scope, depth):
+    es = self.operands([(f.type, scope) for f in t.fields], size, depth)
+    return RecordExpr([(f.id, e) for f, e in zip(t.fields, es)])
+
+  def gen_member(self, t, size, scope, depth):
+    # Selects t from a record of pool types.
+    ts = [self.pick() for i in range(self.rng.randint(1, 3))]
+    n = self.rng.randrange(len(ts) + 1)
+    ts.insert(n, t)
+    u = RecordType([(f"f{i}", u) for i, u in enumerate(ts)])
+    return MemberExpr(self.expr(u, size - 1, scope, depth), f"f{n}")
+
+  def gen_variant(self, t, size, scope, depth):
+    f = self.rng.choice(t.fields)
+    return VariantExpr((f.id, self.expr(f.type, size - 1, scope, depth)), t)
+
+  def gen_case(self, t, size, scope, depth):
+    # Cases over a variant of pool types, with one case per label.
+    ts = [self.pick() for i in range(self.rng.randint(1, 3))]
+    u = VariantType([(f"v{i}", u) for i, u in enumerate(ts)])
+    xs = [self.fresh() for f in u.fields]
+    parts = [(u, scope)] + [(t, scope + [(x, f.type)]) for x, f in zip(xs, u.fields)]
+    es = self.operands(parts, size, depth)
+    cs = [(f.id, x, e) for f, x, e in zip(u.fields, xs, es[1:])]
+    return CaseExpr(es[0], cs)
+
+def generate(size, seed = 0, t = None, depth = 40):
+  # Returns a random program of type t (by default, Bool or Int) with
+  # about size nodes. The program is not resolved or checked.
+  g = Generator(seed, depth)
+  if t is None:
+    t = g.rng.choice([boolType, intType])
+  return g.expr(t, size, [])
+
+def write_corpus(path, count, size, seed = 0):
+  # Writes count programs of about size nodes to the file path. The
+  # programs are generated from consecutive seeds, starting with seed.
+  programs = [generate(size, seed + i) for i in range(count)]
+  with open(path, "wb") as f:
+    pickle.dump(programs, f)
+
+def read_corpus(path):
+  # Returns the list of programs written to path by write_corpus.
+  with open(path, "rb") as f:
+    return pickle.load(f)
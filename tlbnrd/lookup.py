@@ -1,5 +1,6 @@
 from lang import *
 from decorate import *
+from annotate import *
 
 @checked
 def lookup(id : str, stk : list):
@@ -12,22 +13,25 @@ def lookup(id : str, stk : list):
   return None
 
 @checked
-def resolve_unary(e : Expr, stk : list):
-  resolve(e.expr, stk)
+def resolve_unary(e : Expr, stk : list, a : Annotations):
+  resolve(e.expr, stk, a)
   return e
 
 @checked
-def resolve_binary(e : Expr, stk : list):
-  resolve(e.lhs, stk)
-  resolve(e.rhs, stk)
+def resolve_binary(e : Expr, stk : list, a : Annotations):
+  resolve(e.lhs, stk, a)
+  resolve(e.rhs, stk, a)
   return e
 
 @checked
-def resolve(e : Expr, stk : list = []):
+def resolve(e : Expr, stk : list = [], a : Annotations = inplace):
   # Resolve references to declared variables. This requires a scope
   # stack. A scope is a mappings from names to their declarations.
   #
-  # Returns the modified (in-place) tree.
+  # Bindings are recorded in the annotation layer a. By default, that
+  # modifies the tree in place.
+  #
+  # Returns the tree.
 
   # Boolean expressions
 
@@ -35,18 +39,18 @@ def resolve(e : Expr, stk : list = []):
     return e
 
   if type(e) is AndExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is OrExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is NotExpr:
-    return resolve_unary(e, stk)
+    return resolve_unary(e, stk, a)
 
   if type(e) is IfExpr:
-    resolve(e.cond, stk)
-    resolve(e.true, stk)
-    resolve(e.false, stk)
+    resolve(e.cond, stk, a)
+    resolve(e.true, stk, a)
+    resolve(e.false, stk, a)
     return e
 
   # Arithmetic expressions
@@ -55,42 +59,42 @@ def resolve(e : Expr, stk : list = []):
     return e
 
   if type(e) is AddExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is SubExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is MulExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is DivExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is RemExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is NegExpr:
-    return resolve_unary(e, stk)
+    return resolve_unary(e, stk, a)
 
   # Relational expressions
 
   if type(e) is EqExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is NeExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is LtExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is GtExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is LeExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   if type(e) is GeExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   # Lambda expressions
 
@@ -101,71 +105,71 @@ def resolve(e : Expr, stk : list = []):
       raise Exception("name lookup error")
 
     # Bind the expression to its declaration.
-    e.ref = decl
+    a.bind(e, decl)
     return e
 
   if type(e) is LambdaExpr:
     # Create a new stack for resolving identifiers in
     # the lambda's definition.
     newstk = stk + [{var.id:var for var in e.vars}]
-    resolve(e.expr, newstk)
+    resolve(e.expr, newstk, a)
     return e
 
   if type(e) is CallExpr:
-    resolve(e.fn, stk)
-    for a in e.args:
-      resolve(e.fn, stk)
+    resolve(e.fn, stk, a)
+    for x in e.args:
+      resolve(x, stk, a)
     return e
 
   # Reference expressions
 
   if type(e) is NewExpr:
-    return resolve_unary(e, stk)
+    return resolve_unary(e, stk, a)
 
   if type(e) is DerefExpr:
-    return resolve_unary(e, stk)
+    return resolve_unary(e, stk, a)
 
   if type(e) is AssignExpr:
-    return resolve_binary(e, stk)
+    return resolve_binary(e, stk, a)
 
   # Data expressions
 
   if type(e) is TupleExpr:
     for x in e.elems:
-      resolve(x)
+      resolve(x, stk, a)
     return e
 
   if type(e) is ProjExpr:
     # We can't check the validity of the index because
     # we don't haver the type of the object, only the
     # expression that computes the tuple.
-    resolve(e.obj)
+    resolve(e.obj, stk, a)
     return e
 
   if type(e) is RecordExpr:
     for f in e.fields:
-      resolve(f.value)
+      resolve(f.value, stk, a)
     return e
 
   if type(e) is MemberExpr:
     # We can't check the validity of the index because
     # we don't haver the type of the object, only the
     # expression that computes the tuple.
-    resolve(e.obj)
+    resolve(e.obj, stk, a)
     return e
 
   if type(e) is VariantExpr:
     # We could hypothetically check the label against the
     # type, but we'll defer until typing so that all of
     # these operations are done at the same time.
-    resolve(e.field.value)
+    resolve(e.field.value, stk, a)
     return e
 
   if type(e) is CaseExpr:
-    resolve(e.expr)
+    resolve(e.expr, stk, a)
     for c in e.cases:
-      newstk = stk + [{c.var.id, c.var}]
-      resolve(c.expr, newstk)
+      newstk = stk + [{c.var.id:c.var}]
+      resolve(c.expr, newstk, a)
     return e
 
 
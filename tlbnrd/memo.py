@@ -0,0 +1,129 @@
+from lang import *
+from annotate import *
+
+from collections import OrderedDict
+
+# This module implements the memoization of calls to pure lambdas.
+#
+# A lambda is pure when its body does not allocate, read or write
+# references (i.e., it contains no new, deref or assignment). Calling
+# a closure of a pure lambda with the same arguments always produces
+# the same value, so its result can be cached. The key of a call is
+# the values of the lambda's free variables (i.e., the part of the
+# closure's environment that the body can observe) and the values of
+# the arguments.
+#
+# Note that the body of a pure lambda may still call other closures
+# (e.g., those passed as arguments). A call is only memoized when all
+# closures reachable from its key are also pure. See eval_call.
+#
+# Each lambda has its own table. Tables have a bounded size and evict
+# the least recently used entry when full.
+
+# Returned by lookup when there is no entry, since None may be the
+# cached value.
+MISS = object()
+
+class Table:
+  # The memo table of a single lambda.
+  def __init__(self, fn : LambdaExpr, size : int, a : Annotations):
+    # The lambda whose calls are cached.
+    self.fn = fn
+
+    # True if the body of fn is pure.
+    self.pure = not uses_heap(fn.expr)
+
+    # The free variables of fn, in order of first use.
+    self.free = free_vars(fn, a)
+
+    # The maximum number of entries.
+    self.size = size
+
+    # Maps keys to values, ordered from least to most recently used.
+    self.entries = OrderedDict()
+
+    # Statistics.
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def lookup(self, k):
+    # Returns the cached value for k or MISS if there is no entry.
+    v = self.entries.get(k)
+    if v is None:
+      self.misses += 1
+      return MISS
+    self.hits += 1
+    self.entries.move_to_end(k)
+    return v[0]
+
+  def store(self, k, v):
+    # Cache the value v for the key k. The value is boxed so that
+    # None can be distinguished from a missing entry.
+    self.entries[k] = (v,)
+    if len(self.entries) > self.size:
+      self.entries.popitem(last = False)
+      self.evictions += 1
+
+  def __str__(self):
+    return f"{self.fn}: {self.hits} hits, {self.misses} misses, " \
+           f"{self.evictions} evictions"
+
+class Memo:
+  # The memo tables of an evaluation.
+  #
+  # The size is the maximum number of entries per table. A size of 0
+  # disables memoization.
+  def __init__(self, size : int = 1024):
+    self.size = size
+
+    # Maps the identity of a lambda to its table.
+    self.tables = {}
+
+  def enabled(self):
+    return self.size > 0
+
+  def table(self, fn : LambdaExpr, a : Annotations):
+    # Returns the table for fn, creating it if needed.
+    t = self.tables.get(id(fn))
+    if t is None:
+      t = Table(fn, self.size, a)
+      self.tables[id(fn)] = t
+    return t
+
+  def stats(self):
+    # Returns the list of tables, most used first.
+    return sorted(self.tables.values(), key = lambda t: -(t.hits + t.misses))
+
+  def clear(self):
+    self.tables = {}
+
+# The default (disabled) memoization.
+nomemo = Memo(0)
+
+def uses_heap(e : Expr):
+  # Returns true if e itself allocates, reads or writes references.
+  # Unlike effects() (see effects.py), this ignores the effects of the
+  # closures that e calls; those are checked when the call happens.
+  if type(e) in (NewExpr, DerefExpr, AssignExpr):
+    return True
+  return any(map(uses_heap, children(e)))
+
+def free_vars(fn : LambdaExpr, a : Annotations):
+  # Returns the declarations referred to in the body of fn that are
+  # not declared within fn.
+  bound = set()
+  free = []
+  def walk(e):
+    if type(e) is LambdaExpr:
+      bound.update(map(id, e.vars))
+    if type(e) is CaseExpr:
+      bound.update(id(c.var) for c in e.cases)
+    if type(e) is IdExpr:
+      d = a.ref(e)
+      if d not in free:
+        free.append(d)
+    for x in children(e):
+      walk(x)
+  walk(fn)
+  return [d for d in free if id(d) not in bound]
@@ -0,0 +1,372 @@
+import re
+
+from lang import *
+
+# This module parses the text of programs.
+#
+# The syntax is the one expressions and types are printed in, e.g.:
+#
+#   (\(r:Ref Int).r = (*r + 1)) (new 1)
+#   (\(a:Int,b:Int).(a < b)) (1,2)
+#   case <v1=2> as <v0:Bool,v1:Int> of <v0=x> => 0 | <v1=y> => y
+#
+# so str(e) parses back to an expression equal to e. 'λ' may be used
+# instead of '\'. Text from '#' to the end of a line is a comment.
+#
+# Operators bind, from the loosest to the tightest:
+#
+#   e1 = e2                        -- right to left
+#   or
+#   and
+#   == != < > <= >=
+#   + -
+#   * / %
+#   -e1  not e1  *e1  new e1       -- prefix
+#   e0(e1, ...)  e1.n  e1.x
+#
+# A lambda, case or if extends as far to the right as it can. In
+# '{...}', a leading 'x=' makes a record; otherwise, it is a tuple.
+#
+# The source is split into tokens by a single regular expression, and
+# parsed by recursive descent (with precedence climbing for binary
+# operators), so parsing takes time linear in the length of the text.
+# Errors are reported as a ParseError, with the line and column (from
+# 1) at which they were found.
+#
+# Usage:
+#
+#   e = parse("(\\(a:Int,b:Int).(a < b)) (1,2)")
+#   t = parse_type("(Int,Int)->Bool")
+
+# The tokens: comments, integers, names, operators and (for errors)
+# any other character.
+TOKEN = re.compile(r"#[^\n]*|[0-9]+|[A-Za-z_][A-Za-z0-9_']*|->|=>|==|!=|<=|>=|\S")
+
+# The keywords and operators, whose tokens are their own kinds.
+KINDS = {k: k for k in [
+  "true", "false", "and", "or", "not", "if", "then", "else", "new",
+  "case", "of", "as", "Bool", "Int", "Ref",
+  "->", "=>", "==", "!=", "<=", ">=", "λ", "\\", "(", ")",
+  "{", "}", "[", "]", "<", ">", ",", ".", ":", "=", "+", "-", "*", "/",
+  "%", "|",
+]}
+
+# The binary operators, with their precedence and class.
+BINARY = {
+  "or": (1, OrExpr),
+  "and": (2, AndExpr),
+  "==": (3, EqExpr),
+  "!=": (3, NeExpr),
+  "<": (3, LtExpr),
+  ">": (3, GtExpr),
+  "<=": (3, LeExpr),
+  ">=": (3, GeExpr),
+  "+": (4, AddExpr),
+  "-": (4, SubExpr),
+  "*": (5, MulExpr),
+  "/": (5, DivExpr),
+  "%": (5, RemExpr),
+}
+
+# The prefix operators and their classes.
+PREFIX = {
+  "-": NegExpr,
+  "not": NotExpr,
+  "*": DerefExpr,
+  "new": NewExpr,
+}
+
+LAMBDA = ("λ", "\\")
+
+class ParseError(Exception):
+  # Raised for text that is not a program. The line and column are
+  # those of the token at which the error was found.
+  def __init__(self, message, name, line, column):
+    self.line = line
+    self.column = column
+    Exception.__init__(self, f"{name}:{line}:{column}: {message}")
+
+class Parser:
+  def __init__(self, text, name = "<string>"):
+    self.text = text
+    self.name = name
+
+    # The tokens: the text of each, and its kind (the text of operators
+    # and keywords, or 'id', 'int', 'bad' or 'end'). The offsets of the
+    # tokens are only found when an error is reported.
+    ts = TOKEN.findall(text)
+    if "#" in text:
+      ts = [t for t in ts if t[0] != "#"]
+    get = KINDS.get
+    self.texts = ts + [""]
+    self.kinds = [get(t) or ("int" if t[0] <= "9" and t[0] >= "0" else
+                             "id" if t[0] == "_" or t[0].isascii() and t[0].isalpha() else "bad")
+                  for t in ts] + ["end"]
+
+    # The position of the next token.
+    self.pos = 0
+    if "bad" in self.kinds:
+      self.pos = self.kinds.index("bad")
+      self.error(f"unexpected character '{self.texts[self.pos]}'")
+
+    # True while '>' closes a variant rather than being an operator.
+    self.variant = False
+
+  def start(self, i):
+    # Returns the offset of the token i in the text.
+    n = 0
+    for m in TOKEN.finditer(self.text):
+      if m.group()[0] != "#":
+        if n == i:
+          return m.start()
+        n += 1
+    return len(self.text)
+
+  def error(self, message):
+    # Raises a ParseError at the next token.
+    at = self.start(self.pos)
+    line = self.text.count("\n", 0, at) + 1
+    column = at - self.text.rfind("\n", 0, at)
+    raise ParseError(message, self.name, line, column)
+
+  def describe(self):
+    # Returns a description of the next token, for errors.
+    k = self.kinds[self.pos]
+    if k == "end":
+      return "end of input"
+    return f"'{self.texts[self.pos]}'"
+
+  def accept(self, kind):
+    # Skips the next token if it is of the given kind.
+    if self.kinds[self.pos] == kind:
+      self.pos += 1
+      return True
+    return False
+
+  def expect(self, kind):
+    # Skips the next token, which must be of the given kind, and returns
+    # its text.
+    if self.kinds[self.pos] != kind:
+      self.error(f"expected '{kind}', found {self.describe()}")
+    self.pos += 1
+    return self.texts[self.pos - 1]
+
+  def ident(self):
+    if self.kinds[self.pos] != "id":
+      self.error(f"expected a name, found {self.describe()}")
+    self.pos += 1
+    return self.texts[self.pos - 1]
+
+  def list(self, item, close):
+    # Parses items separated by commas, up to the token close.
+    xs = []
+    if not self.accept(close):
+      xs.append(item())
+      while self.accept(","):
+        xs.append(item())
+      self.expect(close)
+    return xs
+
+  def nested(self, fn, *args):
+    # Calls fn within brackets, where '>' is an operator again.
+    variant = self.variant
+    self.variant = False
+    try:
+      return fn(*args)
+    finally:
+      self.variant = variant
+
+  def all(self, fn):
+    # Parses the whole text with fn.
+    try:
+      x = fn()
+    except RecursionError:
+      self.error("program is nested too deeply")
+    if self.kinds[self.pos] != "end":
+      self.error(f"unexpected {self.describe()}")
+    return x
+
+  # Expressions
+
+  def expr(self):
+    e = self.binary(1)
+    if self.accept("="):
+      return AssignExpr(e, self.expr())
+    return e
+
+  def binary(self, prec):
+    # Parses operands of operators that bind at least as tightly as
+    # prec.
+    e = self.unary()
+    while True:
+      k = self.kinds[self.pos]
+      op = BINARY.get(k)
+      if op is None or op[0] < prec or (k == ">" and self.variant):
+        return e
+      self.pos += 1
+      e = op[1](e, self.binary(op[0] + 1))
+
+  def unary(self):
+    cls = PREFIX.get(self.kinds[self.pos])
+    if cls is not None:
+      self.pos += 1
+      return cls(self.unary())
+    return self.postfix()
+
+  def postfix(self):
+    e = self.primary()
+    while True:
+      k = self.kinds[self.pos]
+      if k == "(":
+        self.pos += 1
+        e = CallExpr(e, self.nested(self.list, self.expr, ")"))
+      elif k == ".":
+        self.pos += 1
+        if self.kinds[self.pos] == "int":
+          e = ProjExpr(e, int(self.expect("int")))
+        else:
+          e = MemberExpr(e, self.ident())
+      else:
+        return e
+
+  def primary(self):
+    k = self.kinds[self.pos]
+    if k == "id":
+      self.pos += 1
+      x = self.texts[self.pos - 1]
+      return PlaceholderExpr() if x == "_" else IdExpr(x)
+    if k == "int":
+      self.pos += 1
+      return IntExpr(int(self.texts[self.pos - 1]))
+    if k == "true" or k == "false":
+      self.pos += 1
+      return BoolExpr(k == "true")
+    if k == "(":
+      self.pos += 1
+      e = self.nested(self.expr)
+      self.expect(")")
+      return e
+    if k == "{":
+      self.pos += 1
+      return self.nested(self.braces)
+    if k == "<":
+      self.pos += 1
+      return self.variant_expr()
+    if k in LAMBDA:
+      self.pos += 1
+      return self.lambda_expr()
+    if k == "if":
+      self.pos += 1
+      c = self.expr()
+      self.expect("then")
+      e1 = self.expr()
+      self.expect("else")
+      return IfExpr(c, e1, self.expr())
+    if k == "case":
+      self.pos += 1
+      return self.case_expr()
+    self.error(f"expected an expression, found {self.describe()}")
+
+  def braces(self):
+    # Parses a tuple or record, after '{'.
+    if self.kinds[self.pos] == "id" and self.kinds[self.pos + 1] == "=":
+      return RecordExpr(self.list(self.field_init, "}"))
+    return TupleExpr(self.list(self.expr, "}"))
+
+  def field_init(self):
+    x = self.ident()
+    self.expect("=")
+    return FieldInit(x, self.expr())
+
+  def variant_expr(self):
+    # Parses '<x=e> as T', after '<'.
+    x = self.ident()
+    self.expect("=")
+    variant = self.variant
+    self.variant = True
+    try:
+      e = self.expr()
+    finally:
+      self.variant = variant
+    self.expect(">")
+    self.expect("as")
+    return VariantExpr(FieldInit(x, e), self.type())
+
+  def lambda_expr(self):
+    # Parses a lambda, after '\\'.
+    self.expect("(")
+    vs = self.list(self.var_decl, ")")
+    self.expect(".")
+    return LambdaExpr(vs, self.expr())
+
+  def var_decl(self):
+    # Parses 'x:T', or 'x' for an untyped variable.
+    x = self.ident()
+    t = self.type() if self.accept(":") else None
+    return VarDecl(x, t)
+
+  def case_expr(self):
+    # Parses 'e of <l1=x1> => e1 | ...', after 'case'.
+    e = self.expr()
+    self.expect("of")
+    cs = [self.case()]
+    while self.accept("|"):
+      cs.append(self.case())
+    return CaseExpr(e, cs)
+
+  def case(self):
+    self.expect("<")
+    x = self.ident()
+    self.expect("=")
+    n = self.ident()
+    self.expect(">")
+    self.expect("=>")
+    return Case(x, n, self.expr())
+
+  # Types
+
+  def type(self):
+    k = self.kinds[self.pos]
+    self.pos += 1
+    if k == "Bool":
+      return boolType
+    if k == "Int":
+      return intType
+    if k == "Ref":
+      return RefType(self.type())
+    if k == "(":
+      ts = self.list(self.type, ")")
+      if self.accept("->"):
+        return FnType(ts, self.type())
+      if len(ts) != 1:
+        self.error(f"expected '->', found {self.describe()}")
+      return ts[0]
+    if k == "{":
+      if self.kinds[self.pos] == "id" and self.kinds[self.pos + 1] == ":":
+        return RecordType(self.list(self.field_decl, "}"))
+      return TupleType(self.list(self.type, "}"))
+    if k == "<":
+      return VariantType(self.list(self.field_decl, ">"))
+    self.pos -= 1
+    self.error(f"expected a type, found {self.describe()}")
+
+  def field_decl(self):
+    x = self.ident()
+    self.expect(":")
+    return FieldDecl(x, self.type())
+
+def parse(text, name = "<string>"):
+  # Returns the expression in text. The name (e.g., of a file) is used
+  # in errors.
+  p = Parser(text, name)
+  return p.all(p.expr)
+
+def parse_type(text, name = "<string>"):
+  # Returns the type in text.
+  p = Parser(text, name)
+  return p.all(p.type)
+
+def parse_file(path):
+  # Returns the expression in the file path.
+  with open(path, encoding = "utf-8") as f:
+    return parse(f.read(), path)
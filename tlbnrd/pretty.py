@@ -0,0 +1,309 @@
+from lang import *
+from evaluate import Closure, Location, Tuple, Field, Record, Variant
+
+# This module prints expressions, types and values without recursion.
+#
+# The __str__ methods of the language build the text of each node from
+# the text of its parts, so the text of a node is copied once for each
+# node it is nested within: printing a deep tree takes time and memory
+# quadratic in its depth, and a tree deeper than the recursion limit
+# cannot be printed at all. The printer here keeps a stack of the parts
+# left to print, and writes each piece of text to its output once, so
+# printing takes time linear in the size of the text.
+#
+# By default, the text is the same as that of str(), and so can be
+# parsed back (see parse.py). Optionally:
+#
+#   width  -- nodes whose text does not fit in the rest of the line are
+#             broken over several lines, indented by indent spaces for
+#             each level (e.g., after the commas of a tuple, or before
+#             the body of a lambda)
+#   limit  -- the text is cut short, with '...', after limit characters
+#   depth  -- nodes nested more deeply than depth are printed as '...'
+#
+# To tell whether a node fits, the length of the text of every node is
+# computed first, in a single pass over the tree.
+#
+# Usage:
+#
+#   print(pretty(e, width = 80))
+#   render(e, sys.stdout, limit = 1000)
+
+class Line:
+  # A place where a node may be broken. When the node is printed on one
+  # line, the text flat is printed instead.
+  def __init__(self, flat):
+    self.flat = flat
+
+# A break with nothing, or a space, in its place.
+BREAK = Line("")
+SPACE = Line(" ")
+
+# Marks where the indentation of a broken node increases and decreases.
+INDENT = object()
+DEDENT = object()
+
+# Marks the end of a node.
+END = object()
+
+def grouped(e, forms = loose):
+  # Returns the parts of e, in parentheses if it is one of the forms
+  # (see group in lang.py).
+  if isinstance(e, forms):
+    return ["(", e, ")"]
+  return [e]
+
+def joined(xs, line = None, forms = ()):
+  # Returns the parts of the list xs, separated by commas and, if given,
+  # by the break line. Elements that are among the forms are grouped.
+  ps = []
+  for x in xs:
+    if ps:
+      ps.append(",")
+      if line is not None:
+        ps.append(line)
+    if isinstance(x, forms):
+      ps += ["(", x, ")"]
+    else:
+      ps.append(x)
+  return ps
+
+def listed(open, xs, close, forms = ()):
+  # Returns the parts of a bracketed list of expressions, which is
+  # broken with one element on each line.
+  if not xs:
+    return [open, close]
+  return [open, INDENT, BREAK, *joined(xs, BREAK, forms), DEDENT, BREAK, close]
+
+def binary(e, op):
+  return ["(", *grouped(e.lhs, opened), f" {op}", INDENT, SPACE, e.rhs, DEDENT, ")"]
+
+def body(e):
+  # Returns the parts of the body e of a lambda, which is broken onto a
+  # line of its own.
+  return [INDENT, BREAK, e, DEDENT]
+
+def parts(x):
+  # Returns the parts of the text of x: strings, the nodes (or values)
+  # within it and the marks above.
+  t = type(x)
+
+  # Expressions
+  if t is IdExpr:
+    return [x.id]
+  if t is IntExpr:
+    return [str(x.value)]
+  if t is BoolExpr:
+    return ["true" if x.value else "false"]
+  if t is AndExpr:
+    return binary(x, "and")
+  if t is OrExpr:
+    return binary(x, "or")
+  if t is NotExpr:
+    return ["(not ", x.expr, ")"]
+  if t is IfExpr:
+    return ["(if ", x.cond, INDENT, SPACE, "then ", x.true, SPACE, "else ", x.false, DEDENT, ")"]
+  if t is AddExpr:
+    return binary(x, "+")
+  if t is SubExpr:
+    return binary(x, "-")
+  if t is MulExpr:
+    return binary(x, "*")
+  if t is DivExpr:
+    return binary(x, "/")
+  if t is RemExpr:
+    return binary(x, "%")
+  if t is NegExpr:
+    return ["(-", x.expr, ")"]
+  if t is EqExpr:
+    return binary(x, "==")
+  if t is NeExpr:
+    return binary(x, "!=")
+  if t is LtExpr:
+    return binary(x, "<")
+  if t is GtExpr:
+    return binary(x, ">")
+  if t is LeExpr:
+    return binary(x, "<=")
+  if t is GeExpr:
+    return binary(x, ">=")
+  if t is LambdaExpr:
+    return ["\\(", *joined(x.vars), ").", *body(x.expr)]
+  if t is CallExpr:
+    return [*grouped(x.fn), " ", *listed("(", x.args, ")")]
+  if t is PlaceholderExpr:
+    return ["_"]
+  if t is NewExpr:
+    return ["new ", *grouped(x.expr)]
+  if t is DerefExpr:
+    return ["*", *grouped(x.expr)]
+  if t is AssignExpr:
+    return [*grouped(x.lhs, opened), " =", INDENT, SPACE, x.rhs, DEDENT]
+  if t is TupleExpr:
+    return listed("{", x.elems, "}", (AssignExpr,))
+  if t is ProjExpr:
+    return [*grouped(x.obj), f".{x.index}"]
+  if t is RecordExpr:
+    return listed("{", x.fields, "}")
+  if t is MemberExpr:
+    return [*grouped(x.obj), f".{x.id}"]
+  if t is VariantExpr:
+    return ["<", x.field, "> as ", x.variant]
+  if t is CaseExpr:
+    cs = []
+    for c in x.cases[:-1]:
+      cs += [f"<{c.id}={c.var.id}> => ", *grouped(c.expr, opened), " |", SPACE]
+    cs += [x.cases[-1]] if x.cases else []
+    return ["case ", x.expr, " of", INDENT, SPACE, *cs, DEDENT]
+
+  # Declarations
+  if t is VarDecl or t is FieldDecl:
+    return [f"{x.id}:", x.type]
+  if t is FieldInit:
+    return [f"{x.id}=", x.value]
+  if t is Case:
+    return [f"<{x.id}={x.var.id}> => ", x.expr]
+
+  # Types
+  if t is BoolType:
+    return ["Bool"]
+  if t is IntType:
+    return ["Int"]
+  if t is FnType:
+    return ["(", *joined(x.parms), ")->", x.ret]
+  if t is RefType:
+    return ["Ref ", x.ref]
+  if t is TupleType:
+    return ["{", *joined(x.elems), "}"]
+  if t is RecordType:
+    return ["{", *joined(x.fields), "}"]
+  if t is VariantType:
+    return ["<", *joined(x.fields), ">"]
+
+  # Values
+  if t is Closure:
+    return ["<", x.abs, ">"]
+  if t is Location:
+    return [f"@{x.index}"]
+  if t is Tuple:
+    return listed("{", x.values, "}")
+  if t is Field:
+    return [f"{x.id}=", x.value]
+  if t is Record:
+    return listed("{", x.fields, "}")
+  if t is Variant:
+    return [f"<{x.tag}=", x.value, ">"]
+
+  return [str(x)]
+
+def node(p):
+  # Returns true if the part p is a node (or value) rather than text or
+  # a mark.
+  return type(p) is not str and type(p) is not Line and p is not INDENT and p is not DEDENT
+
+def measure(x):
+  # Returns the length of the text of x and of each node within it, and
+  # the parts of each, by the ids of the nodes.
+  sizes = {}
+  memo = {}
+  todo = [x]
+  while todo:
+    y = todo[-1]
+    k = id(y)
+    ps = memo.get(k)
+    if ps is None:
+      # The parts are measured before the node.
+      ps = memo[k] = parts(y)
+      todo += [p for p in ps if node(p) and id(p) not in memo]
+      continue
+    todo.pop()
+    if k not in sizes:
+      n = 0
+      for p in ps:
+        if type(p) is str:
+          n += len(p)
+        elif type(p) is Line:
+          n += len(p.flat)
+        elif p is not INDENT and p is not DEDENT:
+          n += sizes[id(p)]
+      sizes[k] = n
+  return sizes, memo
+
+class Stop(Exception):
+  # Raised when the limit of the text is reached.
+  pass
+
+def render(x, out, width = None, indent = 2, limit = None, depth = None):
+  # Writes the text of x to out, which is a list (that the pieces of
+  # text are appended to) or a file.
+  write = out.append if type(out) is list else out.write
+  if width is not None:
+    sizes, memo = measure(x)
+  else:
+    memo = {}
+
+  # The column, the indentation and the number of characters written,
+  # the depth of nodes, and whether the current node is printed on one
+  # line (which all are, without a width).
+  column = 0
+  margin = 0
+  written = 0
+  level = 0
+  flat = width is None
+
+  def emit(s):
+    nonlocal column, written
+    if limit is not None and written + len(s) > limit:
+      write(s[:limit - written])
+      write("...")
+      raise Stop()
+    write(s)
+    column += len(s)
+    written += len(s)
+
+  stack = [x]
+  try:
+    while stack:
+      p = stack.pop()
+      t = type(p)
+      if t is str:
+        emit(p)
+      elif t is Line:
+        if flat:
+          emit(p.flat)
+        else:
+          emit("\n")
+          column = 0
+          emit(" " * margin)
+      elif p is INDENT:
+        if not flat:
+          margin += indent
+      elif p is DEDENT:
+        if not flat:
+          margin -= indent
+      elif p is END:
+        # The end of a node, and of the line it is printed on, if the
+        # node started it.
+        level -= 1
+        if stack.pop():
+          flat = False
+      elif depth is not None and level >= depth:
+        emit("...")
+      else:
+        level += 1
+        starts = not flat and sizes[id(p)] <= width - column
+        if starts:
+          flat = True
+        stack += [starts, END]
+        ps = memo.get(id(p))
+        if ps is None:
+          ps = parts(p)
+        stack += reversed(ps)
+  except Stop:
+    pass
+
+def pretty(x, width = None, indent = 2, limit = None, depth = None):
+  # Returns the text of x (see render).
+  out = []
+  render(x, out, width, indent, limit, depth)
+  return "".join(out)
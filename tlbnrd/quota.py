@@ -0,0 +1,111 @@
+import time
+
+# This module bounds the cost of evaluating (or reducing) a program.
+#
+# A Quota limits:
+#
+#   steps   -- the number of evaluation (or reduction) steps
+#   depth   -- the depth of nested calls
+#   cells   -- the number of heap cells allocated (by 'new e1')
+#   seconds -- the wall time since the quota was created
+#
+# Any limit may be None, which means there is none. The evaluator
+# calls step() once per node, enter() and leave() around the body of
+# each call, and allocate() for each heap cell. When a limit is
+# exceeded, a QuotaExceeded is raised, which records the resources
+# consumed so far. When the depth is limited, calls nested more deeply
+# than the Python stack allows (see sys.setrecursionlimit) also exceed
+# the depth quota; otherwise, they raise a RecursionError.
+#
+# Steps are counted down with a single counter, the fuel. The clock is
+# only read when the fuel runs out, which happens every 'every' steps
+# (or sooner, when fewer steps are left). The deadline may thus be
+# overrun by as much as 'every' steps.
+#
+# A quota is used up by the evaluations it is passed to. To run a new
+# program with the same limits, make a new quota. Evaluations that are
+# not passed a quota each make their own, without limits.
+
+class QuotaExceeded(Exception):
+  # Raised when a quota is exceeded. The resource is the name of the
+  # limit that was exceeded (steps, depth, cells or seconds).
+  def __init__(self, resource, q):
+    self.resource = resource
+
+    # The resources consumed when the limit was exceeded.
+    self.steps = q.used()
+    self.depth = q.deepest
+    self.cells = q.cells
+    self.seconds = q.elapsed()
+
+    Exception.__init__(self, f"{resource} quota exceeded after {self.steps} steps, "
+                             f"depth {self.depth}, {self.cells} cells, "
+                             f"{self.seconds:.3f} seconds")
+
+class Quota:
+  def __init__(self, steps = None, depth = None, cells = None, seconds = None, every = 1000):
+    # The limits.
+    self.max_steps = steps
+    self.max_depth = depth
+    self.max_cells = cells
+    self.max_seconds = seconds
+    self.every = every
+
+    self.start = time.monotonic()
+
+    # The steps that may be taken before the limits are checked again,
+    # and the steps taken or allowed so far (including the fuel).
+    self.fuel = 0
+    self.taken = 0
+
+    # The current and greatest depth of calls, and the cells allocated.
+    self.depth = 0
+    self.deepest = 0
+    self.cells = 0
+
+  def used(self):
+    # Returns the number of steps taken.
+    return self.taken - self.fuel
+
+  def elapsed(self):
+    return time.monotonic() - self.start
+
+  def refuel(self):
+    # Checks the limits on steps and time, once the fuel has run out,
+    # and refills it.
+    if self.max_steps is not None and self.taken >= self.max_steps:
+      raise QuotaExceeded("steps", self)
+    if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+      raise QuotaExceeded("seconds", self)
+    if self.max_steps is not None:
+      self.fuel = min(self.every, self.max_steps - self.taken)
+    elif self.max_seconds is not None:
+      self.fuel = self.every
+    else:
+      self.fuel = 1 << 62
+    self.taken += self.fuel
+
+  def step(self):
+    # Takes a step.
+    if self.fuel == 0:
+      self.refuel()
+    self.fuel -= 1
+
+  def enter(self):
+    # Enters the body of a call.
+    self.depth += 1
+    if self.depth > self.deepest:
+      self.deepest = self.depth
+    if self.max_depth is not None and self.depth > self.max_depth:
+      self.depth -= 1
+      raise QuotaExceeded("depth", self)
+
+  def leave(self):
+    # Leaves the body of a call.
+    self.depth -= 1
+
+  def allocate(self, n = 1):
+    # Allocates n heap cells.
+    self.cells += n
+    if self.max_cells is not None and self.cells > self.max_cells:
+      raise QuotaExceeded("cells", self)
@@ -1,8 +1,7 @@
 
 from lang import *
-import copy
 
-clone = copy.deepcopy
+clone = instantiate_template
 
 print("---- types ----")
 f1 = FnType([int, int], bool)
@@ -72,3 +71,107 @@ check(e10)
 print(f"* expr:  {e10}")
 print(f"* value: {evaluate(e10)}")
 
+# A single tree can be shared by many requests when each request keeps
+# its annotations in its own side table.
+shared = RecordExpr([("x", 0), ("y", True)])
+for n in ["x", "y"]:
+  a = SideTable()
+  e11 = resolve(MemberExpr(shared, n), [], a)
+  print(f"* expr:  {e11}")
+  print(f"* type:  {check(e11, a)}")
+  print(f"* value: {evaluate(e11, {}, [], a)}")
+
+# Calls to pure lambdas can be memoized. Without memoization, this
+# naive fib makes an exponential number of calls; with it, the body
+# is evaluated once for each n.
+#
+# fib = \(f, n). if n < 2 then n else f(f, n - 1) + f(f, n - 2)
+#
+# fib recurses by applying f to itself, which needs a recursive type
+# that tlbnrd does not have, so f is declared as an Int: fib (and every
+# program below that uses it) is ill-typed, and is deliberately never
+# checked. The evaluator does not need types.
+fib = LambdaExpr([VarDecl("f", int), VarDecl("n", int)],
+  IfExpr(LtExpr("n", 2), "n",
+    AddExpr(CallExpr("f", ["f", SubExpr("n", 1)]),
+            CallExpr("f", ["f", SubExpr("n", 2)]))))
+m = Memo(64)
+e12 = resolve(CallExpr(fib, [fib, 30]))
+print(f"* value: {evaluate(e12, {}, [], Annotations(), m)}")
+for t in m.stats():
+  print(f"* memo:  {t.hits} hits, {t.misses} misses, {t.evictions} evictions")
+
+# Effects record how an expression uses the heap. Calls to unknown
+# closures (here, the parameter f) are assumed to have every effect.
+# (Effects do not need types, so e13 is not checked; see fib.)
+apply = LambdaExpr([VarDecl("f", FnType([int], int))], CallExpr("f", [1]))
+e13 = resolve(TupleExpr([CallExpr(apply, [fib]), AddExpr(1, 2)]))
+print(f"* expr:    {e13}")
+print(f"* effects: {describe(effects(e13))}")
+for x in e13.elems:
+  print(f"* part:    {describe(effects(x))}")
+
+# Random well-typed programs, for benchmarks. The same seed always
+# gives the same program.
+e14 = resolve(generate(30, seed = 7))
+print(f"* expr:  {e14}")
+print(f"* type:  {check(e14)}")
+print(f"* value: {evaluate(e14, {}, [])}")
+
+# Profile the checker and evaluator by handler and by class of node.
+with Profiler() as p:
+  e15 = resolve(generate(200, seed = 7))
+  check(e15)
+  evaluate(e15, {}, [])
+print(p.report(key = "calls", limit = 3))
+
+# Sample the lambdas of a program, every 100 evaluation steps.
+with Sampler(steps = 100) as s:
+  evaluate(resolve(CallExpr(fib, [fib, 12])), {}, [])
+print(s.report(limit = 3))
+
+# Quotas bound the cost of evaluation. This loop allocates a new cell
+# on every call, until it runs out of cells.
+#
+# loop = \(f, n). {new n, f(f, n + 1)}
+#
+# Like fib, loop applies f to itself, so it is ill-typed and is
+# deliberately not checked.
+loop = LambdaExpr([VarDecl("f", int), VarDecl("n", int)],
+  TupleExpr([NewExpr("n"), CallExpr("f", ["f", AddExpr("n", 1)])]))
+try:
+  evaluate(resolve(CallExpr(loop, [loop, 0])), {}, [], Annotations(), Memo(0), Quota(cells = 100))
+except QuotaExceeded as x:
+  print(f"{x.resource}: {x.steps} steps, {x.cells} cells")
+
+# Write a checked program in the binary format and read it back. Its
+# annotations are read with it, so it need not be checked again.
+e16 = resolve(generate(200, seed = 7))
+check(e16)
+b = dump(e16)
+e17 = load(b)
+print(f"* bytes: {len(b)}")
+print(f"* same:  {e17 == e16 and e17.type == e16.type}")
+print(f"* value: {evaluate(e17, {}, [])}")
+
+print("---- parsing ----")
+# Programs are printed in a syntax that can be parsed back.
+e18 = parse("(\\(a:Int,b:Int).(a < b)) (1,2)")
+print(f"* expr:  {e18}")
+print(f"* value: {evaluate(resolve(e18), {}, [])}")
+e19 = generate(200, seed = 7)
+print(f"* same:  {parse(str(e19)) == e19}")
+# Checking only adds annotations, so the program is still equal to it.
+check(resolve(e19))
+print(f"* same:  {parse(str(e19)) == e19}")
+try:
+  parse("\\(x:Int).\n  (x + )")
+except ParseError as x:
+  print(f"* error: {x}")
+
+print("---- printing ----")
+# Large programs can be printed without recursion, broken over lines
+# of a given width, or cut short.
+e22 = generate(60, seed = 3)
+print(pretty(e22, width = 60))
+print(pretty(e22, limit = 40))
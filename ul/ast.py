@@ -53,29 +53,34 @@ class AppExpr(Expr):
   def __str__(self):
     return f"({self.lhs} {self.rhs})"
 
-class LambdaExpr(Expr)
+class LambdaExpr(Expr):
   # Represents multi-argument lambda abstractions.
   # Note that '\(x, y, z).e' is syntactic sugar for
   # '\x.\y.\z.e'.
   def __init__(self, vars, e1):
     self.vars = []
-    for v in vars:
-    if type(var) is str:
-      self.vars[] += [VarDecl(var)]
-    else:
-      self.vars += [var]
+    for var in vars:
+      if type(var) is str:
+        self.vars += [VarDecl(var)]
+      else:
+        self.vars += [var]
     self.expr = e1
 
   def __str__(self):
-    return f"\\({",".join([str(v) for v in self.vars])}).{self.expr}"
+    vs = ",".join([str(v) for v in self.vars])
+    return f"\\({vs}).{self.expr}"
 
-class CallExpr:
+class CallExpr(Expr):
   # Represents calls of multi-argument lambda 
   # abstractions.
   def __init__(self, fn, args):
     self.fn = fn
     self.args = args
 
+  def __str__(self):
+    args = ",".join([str(a) for a in self.args])
+    return f"{self.fn}({args})"
+
 def is_value(e):
   return type(e) in (IdExpr, AbsExpr, LambdaExpr)
 
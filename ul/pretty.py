@@ -0,0 +1,87 @@
+from ast import *
+
+# This module prints expressions without recursion.
+#
+# The __str__ methods build the text of each expression from the text
+# of its parts, which takes time quadratic in the depth of the tree,
+# and fails for trees deeper than the recursion limit. The printer
+# here keeps a stack of the parts left to print, and writes each piece
+# of text to its output once. Its text is the same as that of str(),
+# unless it is cut short:
+#
+#   limit  -- the text is cut short, with '...', after limit characters
+#   depth  -- expressions nested more deeply than depth are printed
+#             as '...'
+#
+# Usage:
+#
+#   print(pretty(e, limit = 1000))
+#   render(e, sys.stdout)
+
+# Marks the end of an expression.
+END = object()
+
+def parts(e):
+  # Returns the parts of the text of e: strings and the expressions
+  # within it.
+  if type(e) is IdExpr or type(e) is VarDecl:
+    return [e.id]
+  if type(e) is AbsExpr:
+    return ["\\", e.var, ".", e.expr]
+  if type(e) is AppExpr:
+    return ["(", e.lhs, " ", e.rhs, ")"]
+  if type(e) is LambdaExpr:
+    ps = ["\\("]
+    for v in e.vars:
+      if len(ps) > 1:
+        ps.append(",")
+      ps.append(v)
+    return ps + [").", e.expr]
+  if type(e) is CallExpr:
+    ps = [e.fn, "("]
+    for a in e.args:
+      if len(ps) > 2:
+        ps.append(",")
+      ps.append(a)
+    return ps + [")"]
+  return [str(e)]
+
+class Stop(Exception):
+  # Raised when the limit of the text is reached.
+  pass
+
+def render(e, out, limit = None, depth = None):
+  # Writes the text of e to out, which is a list (that the pieces of
+  # text are appended to) or a file.
+  write = out.append if type(out) is list else out.write
+  written = 0
+  level = 0
+  stack = [e]
+  try:
+    while stack:
+      p = stack.pop()
+      if p is END:
+        level -= 1
+        continue
+      if type(p) is not str:
+        if depth is not None and level >= depth:
+          p = "..."
+        else:
+          level += 1
+          stack.append(END)
+          stack += reversed(parts(p))
+          continue
+      if limit is not None and written + len(p) > limit:
+        write(p[:limit - written])
+        write("...")
+        raise Stop()
+      write(p)
+      written += len(p)
+  except Stop:
+    pass
+
+def pretty(e, limit = None, depth = None):
+  # Returns the text of e (see render).
+  out = []
+  render(e, out, limit, depth)
+  return "".join(out)
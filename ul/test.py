@@ -1,5 +1,6 @@
 
 from ast import *
+from pretty import pretty
 
 # \x.x
 id = AbsExpr("x", IdExpr("x"))
@@ -29,4 +30,10 @@ e = e1
 resolve(e)
 while is_reducible(e):
   e = step(e)
-  print(e)
+  print(pretty(e))
+
+# Deep terms are printed without recursion.
+d = IdExpr("x")
+for i in range(5000):
+  d = AbsExpr("x", d)
+print(len(pretty(d)), pretty(d, limit = 20), pretty(LambdaExpr(["x", "y"], CallExpr(IdExpr("x"), [IdExpr("y")]))))
@@ -0,0 +1,44 @@
+# Annotations record the facts computed about a program by name
+# resolution: the declaration that each identifier refers to (its ref).
+#
+# By default, bindings are written directly into the tree (e.ref).
+# That is simple, but it means that a tree can only be resolved once,
+# so every request that wants to work on a program has to clone it
+# first.
+#
+# A SideTable stores bindings outside of the tree, keyed by the
+# identity of each node. A single (immutable) tree can then be
+# resolved and evaluated by many requests at the same time, each with
+# its own SideTable. Note that the keys are object ids, so the table
+# is only meaningful while the tree is alive.
+
+class Annotations:
+  # Stores annotations in the tree itself. This is the default
+  # annotation layer used by resolve, subst, reduce and evaluate.
+
+  def ref(self, x):
+    # Returns the declaration bound to the IdExpr x, or None if x is
+    # unresolved.
+    return x.ref
+
+  def bind(self, x, d):
+    # Binds x to the declaration d.
+    x.ref = d
+
+class SideTable(Annotations):
+  # Stores bindings in a table beside the tree.
+  #
+  # Lookups fall back to the tree when a node has no entry. This
+  # picks up bindings that are part of the syntax (e.g., an IdExpr
+  # constructed from a VarDecl, as produced by curry).
+  def __init__(self):
+    self.refs = {}
+
+  def ref(self, x):
+    return self.refs.get(id(x), x.ref)
+
+  def bind(self, x, d):
+    self.refs[id(x)] = d
+
+# The default (in-tree) annotation layer.
+inplace = Annotations()
@@ -1,9 +1,7 @@
 from lang import *
 from lookup import *
-
-import copy
-
-clone = copy.deepcopy
+from annotate import *
+from quota import *
 
 # This module implements implements big-step semantics.
 #
@@ -22,9 +20,9 @@ class Closure:
   # during application.
   def __init__(self, abs, env):
     self.abs = abs
-    self.env = clone(env)
+    self.env = dict(env)
 
-def eval_bool(e, store):
+def eval_bool(e, store, a, q):
   # Evaluate a boolean literal:
   #
   # ---------------- E-True
@@ -34,39 +32,39 @@ def eval_bool(e, store):
   # S |- false ! False
   return e.val
 
-def eval_and(e, store):
+def eval_and(e, store, a, q):
   # Evaluate an and-expression.
   #
   # S |- e1 ! v1   S |- e2 ! v2
   # --------------------------- E-And
   # S |- e1 and e2 ! v1 and v2
-  return evaluate(e.lhs, store) and evaluate(e.rhs, store)
+  return evaluate(e.lhs, store, a, q) and evaluate(e.rhs, store, a, q)
 
-def eval_or(e, store):
+def eval_or(e, store, a, q):
   # Evaluate an or-expression.
   #
   # S |- e1 ! v1   S |- e2 ! v2
   # --------------------------- E-Or
   # S |- e1 or e2 ! v1 or v2
-  return evaluate(e.lhs, store) or evaluate(e.rhs, store)
+  return evaluate(e.lhs, store, a, q) or evaluate(e.rhs, store, a, q)
 
-def eval_not(e, store):
-  return not evaluate(e.expr, store)
+def eval_not(e, store, a, q):
+  return not evaluate(e.expr, store, a, q)
 
-def eval_cond(e, store):
-  if evaluate(e.cond):
-    return evaluate(e.true);
+def eval_if(e, store, a, q):
+  if evaluate(e.cond, store, a, q):
+    return evaluate(e.true, store, a, q)
   else:
-    return evaluate(e.false);
+    return evaluate(e.false, store, a, q)
 
-def eval_id(e, store):
+def eval_id(e, store, a, q):
   # Evaluate an id-expression by finding it's stored value.
   #
   # ------------- E-Id
   # S |- x ! S[x]
-  return store[e.ref]
+  return store[a.ref(e)]
 
-def eval_abs(e, store):
+def eval_abs(e, store, a, q):
   # The evaluation of an abstraction produces a closure.
   #
   # --------------------- E-Abs
@@ -78,7 +76,7 @@ def eval_abs(e, store):
   # a single mapping of those values.
   return Closure(e, store)
 
-def eval_app(e, store):
+def eval_app(e, store, a, q):
   # Evaluate an application.
   #
   # S |- e1 ! <\x.e3, S'>   S |- e2 ! v1   S', x=v1 |- e3 ! v2
@@ -91,67 +89,98 @@ def eval_app(e, store):
   #
   # Note that this does not handle recursion correctly because the 
   # store flat. 
-  c = evaluate(e.lhs, store)
+  c = evaluate(e.lhs, store, a, q)
 
   if type(c) is not Closure:
     raise Exception("cannot apply a non-closure to an argument")
 
-  v = evaluate(e.rhs, store)
-
-  return evaluate(c.abs.expr, c.env + {c.abs.var: v})
-
-def eval_lambda(e, store):
+  v = evaluate(e.rhs, store, a, q)
+
+  # The body is evaluated one call deeper (see quota.py).
+  q.enter()
+  try:
+    return evaluate(c.abs.expr, {**c.env, c.abs.var: v}, a, q)
+  except RecursionError:
+    # The calls are nested more deeply than the Python stack allows.
+    # With a limit on depth, that exceeds the depth quota; otherwise,
+    # the error is not the quota's.
+    if q.max_depth is None:
+      raise
+    raise QuotaExceeded("depth", q) from None
+  finally:
+    q.leave()
+
+def eval_lambda(e, store, a, q):
   # The evaluation of a lambda abstraction produces a closure.
   #
   # ----------------------------------------------------- E-Lambda
   # S |- \(x1, x2, ..., xn).e ! <\(x1, x2, ..., xn).e, S>
   return Closure(e, store)
 
-def eval_call(e, store):
-  c = evaluate(e.fn, store)
+def eval_call(e, store, a, q):
+  c = evaluate(e.fn, store, a, q)
   
   if type(c) is not Closure:
     raise Exception("cannot apply a non-closure to an argument")
 
   # Evaluate arguments
   args = []
-  for a in e.args:
-    args += [evaluate(a, store)]
+  for x in e.args:
+    args += [evaluate(x, store, a, q)]
 
   # Build the new environment.
-  env = clone(c.env)
+  env = dict(c.env)
   for i in range(len(args)):
     env[c.abs.vars[i]] = args[i]
 
-  return evaluate(c.abs.expr, env)
-
-def evaluate(e, store = {}):
+  q.enter()
+  try:
+    return evaluate(c.abs.expr, env, a, q)
+  except RecursionError:
+    # The calls are nested more deeply than the Python stack allows.
+    # With a limit on depth, that exceeds the depth quota; otherwise,
+    # the error is not the quota's.
+    if q.max_depth is None:
+      raise
+    raise QuotaExceeded("depth", q) from None
+  finally:
+    q.leave()
+
+def evaluate(e, store = {}, a = inplace, q = None):
   # Evaluate an expression. The store is a stack of mappings from
-  # variables to values.
+  # variables to values. Bindings are found in the annotation layer a.
+  # Each node evaluated is a step of the quota q (see quota.py); by
+  # default, a new quota without limits.
+  if q is None:
+    q = Quota()
+  q.step()
 
   if type(e) is BoolExpr:
-    return eval_bool(e, store)
+    return eval_bool(e, store, a, q)
 
   if type(e) is AndExpr:
-    return eval_and(e, store)
+    return eval_and(e, store, a, q)
 
   if type(e) is OrExpr:
-    return eval_or(e, store)
+    return eval_or(e, store, a, q)
 
   if type(e) is NotExpr:
-    return eval_not(e, store)
+    return eval_not(e, store, a, q)
+
+  if type(e) is IfExpr:
+    return eval_if(e, store, a, q)
 
   if type(e) is IdExpr:
-    return eval_id(e, store)
+    return eval_id(e, store, a, q)
 
   if type(e) is AbsExpr:
-    return eval_abs(e, store)
+    return eval_abs(e, store, a, q)
 
   if type(e) is AppExpr:
-    return eval_app(e, store)
+    return eval_app(e, store, a, q)
 
   if type(e) is LambdaExpr:
-    return eval_lambda(e, store)
+    return eval_lambda(e, store, a, q)
 
   if type(e) is CallExpr:
-    return eval_call(e, store)
+    return eval_call(e, store, a, q)
@@ -15,7 +15,16 @@ class Expr:
   #         \(x1, x2, ..., xn).e1 -- lambda expressions
   #         e0(e1, e2, ..., en)   -- call expressions
   #         _                     -- Placeholders
-  pass
+  #
+  # Expressions are compared structurally (see same_node below).
+  def __eq__(self, other):
+    return same_node(self, other)
+
+  def __hash__(self):
+    return hash_node(self)
+
+  def __getstate__(self):
+    return node_state(self)
 
 class BoolExpr(Expr):
   # Represents the literals 'true' and 'false'.
@@ -133,6 +142,66 @@ class PlaceholderExpr(Expr):
   def __str__(self):
     return "_"
 
+# Structural hashing and equality
+#
+# Two expressions are equal when they are built by the same
+# constructors from equal parts. The declaration that an identifier
+# is bound to (computed by resolve()) is not part of the structure.
+#
+# The hash of a node is computed once and cached in the node. Nodes
+# should not be modified after they have been hashed. The cached hash
+# is not pickled (see node_state).
+
+def node_state(x):
+  # Returns the attributes of x to be pickled. The cached hash is left
+  # out: it depends on the hashes of classes, which differ from one
+  # process to the next.
+  state = dict(vars(x))
+  state.pop("hash", None)
+  return state
+
+def structure(x):
+  # Returns the structural attributes of x.
+  return [v for k, v in vars(x).items() if k not in ("ref", "hash")]
+
+def hash_node(x):
+  # Returns the (cached) structural hash of the node x.
+  h = x.__dict__.get("hash")
+  if h is None:
+    h = hash((type(x), *map(hash_part, structure(x))))
+    x.hash = h
+  return h
+
+def hash_part(v):
+  # Returns the structural hash of a part of a node. Variable
+  # declarations are compared by name.
+  if type(v) is list:
+    return hash(tuple(map(hash_part, v)))
+  if type(v) is VarDecl:
+    return hash((VarDecl, v.id))
+  return hash(v)
+
+def same_node(x, y):
+  # Returns true if the nodes x and y are structurally equal. Nodes
+  # with different hashes are rejected without further comparison.
+  if x is y:
+    return True
+  if type(x) is not type(y):
+    return False
+  if hash_node(x) != hash_node(y):
+    return False
+  return all(map(same_part, structure(x), structure(y)))
+
+def same_part(v, w):
+  # Returns true if two parts of a node are structurally equal.
+  if type(v) is not type(w):
+    return False
+  if type(v) is list:
+    return len(v) == len(w) and all(map(same_part, v, w))
+  if type(v) is VarDecl:
+    return v.id == w.id
+  return v == w
+
 def expr(x):
   # Turn a Python object into an expression. This is solely
   # used to make simplify the writing expressions.
@@ -148,8 +217,13 @@ def decl(x):
     return VarDecl(x)
   return x
 
+from annotate import Annotations, SideTable
 from lookup import resolve
 from subst import subst
 from reduce import step, reduce
 from evaluate import evaluate
 from curry import curry
+from template import instantiate_template
+from truth import truth_table
+from generate import generate, write_corpus, read_corpus
+from quota import Quota, QuotaExceeded
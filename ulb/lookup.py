@@ -1,4 +1,5 @@
 from lang import *
+from annotate import *
 
 def lookup(id, stk):
   # Perform name lookup. Search the scope stack for the first
@@ -9,11 +10,14 @@ def lookup(id, stk):
       return scope[id]
   return None
 
-def resolve(e, stk = []):
+def resolve(e, stk = [], a = inplace):
   # Resolve references to declared variables. This requires a scope
   # stack. A scope is a mappings from names to their declarations.
   #
-  # Returns the modified tree.
+  # Bindings are recorded in the annotation layer a. By default, that
+  # modifies the tree.
+  #
+  # Returns the tree.
 
   if type(e) is BoolExpr:
     # No ids here.
@@ -21,26 +25,26 @@ def resolve(e, stk = []):
 
   if type(e) is AndExpr:
     # Recursively resolve in subexpressions.
-    resolve(e.lhs, stk)
-    resolve(e.rhs, stk)
+    resolve(e.lhs, stk, a)
+    resolve(e.rhs, stk, a)
     return e 
 
   if type(e) is OrExpr:
     # Recursively resolve in subexpressions.
-    resolve(e.lhs, stk)
-    resolve(e.rhs, stk)
+    resolve(e.lhs, stk, a)
+    resolve(e.rhs, stk, a)
     return e 
 
   if type(e) is NotExpr:
     # Recursively resolve in subexpressions.
-    resolve(e.expr, stk)
+    resolve(e.expr, stk, a)
     return e
 
   if type(e) is IfExpr:
     # Recursively resolve in subexpressions.
-    resolve(e.cond, stk)
-    resolve(e.true, stk)
-    resolve(e.false, stk)
+    resolve(e.cond, stk, a)
+    resolve(e.true, stk, a)
+    resolve(e.false, stk, a)
     return e
 
   if type(e) is IdExpr:
@@ -50,7 +54,7 @@ def resolve(e, stk = []):
       raise Exception("name lookup error")
 
     # Bind the expression to its declaration.
-    e.ref = decl
+    a.bind(e, decl)
     return e
 
   if type(e) is AbsExpr:
@@ -58,26 +62,30 @@ def resolve(e, stk = []):
     # We could alternatively push the scope here and
     # then pop the scope after the recursive call (i.e.,
     # bracket the call with push/pop).
-    resolve(e.expr, stk + [{e.var.id : e.var}])
+    resolve(e.expr, stk + [{e.var.id : e.var}], a)
     return e
 
   if type(e) is AppExpr:
     # Recursively resolve in subexpressions.
-    resolve(e.lhs, stk)
-    resolve(e.rhs, stk)
+    resolve(e.lhs, stk, a)
+    resolve(e.rhs, stk, a)
     return e
 
   if type(e) is LambdaExpr:
     # Do the same as with abstractions, but declare
     # all variables simultaneously.
-    resolve(e.expr, stk + [{var.id : var for var in e.vars}])
+    resolve(e.expr, stk + [{var.id : var for var in e.vars}], a)
     return e
 
   if type(e) is CallExpr:
     # Recursively resolve in each subexpression.
-    resolve(e.fn, stk)
-    for a in e.args:
-      resolve(e.fn, stk)
+    resolve(e.fn, stk, a)
+    for x in e.args:
+      resolve(x, stk, a)
+    return e
+
+  if type(e) is PlaceholderExpr:
+    # Placeholders are replaced by parameters during currying.
     return e
 
   assert False
\ No newline at end of file
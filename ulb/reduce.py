@@ -1,4 +1,6 @@
 from lang import *
+from annotate import *
+from quota import *
 
 # This module implements implements small-step semantics.
 #
@@ -16,7 +18,7 @@ def is_reducible(e):
   # Returns true if e can be reduced.
   return not is_value(e)
 
-def step_and(e):
+def step_and(e, a):
   # Compute the next step of an and-expression.
   #
   #   --------------------------- And-V
@@ -30,14 +32,14 @@ def step_and(e):
   #   ----------------------- And-R
   #   v1 and e2 ~> v1 and e2'
   if is_reducible(e.lhs):
-    return AndExpr(step(e.lhs), e.rhs)
+    return AndExpr(step(e.lhs, a), e.rhs)
 
   if is_reducible(e.rhs):
-    return AndExpr(e.lhs, step(e.rhs))
+    return AndExpr(e.lhs, step(e.rhs, a))
 
   return BoolExpr(e.lhs.val and e.rhs.val)
 
-def step_or(e):
+def step_or(e, a):
   # Compute the next step of an or-expression.
   #
   #          e1 ~> e1'
@@ -52,14 +54,14 @@ def step_or(e):
   #   v1 or v2 ~> [`v1` or `v2`]
   #
   if is_reducible(e.lhs):
-    return OrExpr(step(e.lhs), e.rhs)
+    return OrExpr(step(e.lhs, a), e.rhs)
 
   if is_reducible(e.rhs):
-    return OrExpr(e.lhs, step(e.rhs))
+    return OrExpr(e.lhs, step(e.rhs, a))
 
   return BoolExpr(e.lhs.val or e.rhs.val)
 
-def step_not(e):
+def step_not(e, a):
   # Compute the next step of a not expression.
   #
   #     e1 ~> e1'
@@ -69,11 +71,11 @@ def step_not(e):
   # -------------------- Not-1
   # not v1 ~> [not `v1`]
   if is_reducible(e.expr):
-    return NotExpr(step(e.expr))
+    return NotExpr(step(e.expr, a))
 
   return BoolExpr(not e.expr.val)
 
-def step_if(e):
+def step_if(e, a):
   # Compute the next step of a not expression.
   #
   #                     e1 ~> e1'
@@ -87,14 +89,14 @@ def step_if(e):
   # if false then e2 else e3 ~> e3
 
   if is_reducible(e.cond):
-    return NotExpr(step(e.cond), e.true, e.false)
+    return IfExpr(step(e.cond, a), e.true, e.false)
 
   if e.cond.val:
     return e.true
   else:
     return e.false
 
-def step_app(e):
+def step_app(e, a):
   # Apply an abstraction to an operand.
   #
   #     e1 ~> e1'
@@ -111,20 +113,20 @@ def step_app(e):
   # This implements call by value.
   
   if is_reducible(e.lhs): # App-1
-    return AppExpr(step(e.lhs), e.rhs)
+    return AppExpr(step(e.lhs, a), e.rhs)
 
   if type(e.lhs) is not AbsExpr:
     raise Exception("application of non-lambda")
 
   if is_reducible(e.rhs): # App-2
-    return AppExpr(e.lhs, step(e.rhs))
+    return AppExpr(e.lhs, step(e.rhs, a))
 
   s = {
     e.lhs.var: e.rhs
   }
-  return subst(e.lhs.expr, s);
+  return subst(e.lhs.expr, s, a)
 
-def step_call(e):
+def step_call(e, a):
   # Call a lambda function with arguments.
   #
   #                 e0 ~> e0'
@@ -144,7 +146,7 @@ def step_call(e):
   #     [x1->e1, x2->e2, ..., xn->en]e1
 
   if is_reducible(e.fn):
-    return CallExpr(step(e.fn), e.args)
+    return CallExpr(step(e.fn, a), e.args)
 
   if len(e.args) < len(e.fn.vars):
     raise Exception("too few arguments")
@@ -153,7 +155,7 @@ def step_call(e):
 
   for i in range(len(e.args)):
     if is_reducible(e.args[i]):
-      return CallExpr(e.fn, e.args[:i] + [step(e.args[i])] + e.args[i+1:])
+      return CallExpr(e.fn, e.args[:i] + [step(e.args[i], a)] + e.args[i+1:])
 
   # Map parameters to arguments.
   s = {}
@@ -161,35 +163,39 @@ def step_call(e):
     s[e.fn.vars[i]] = e.args[i]
 
   # Substitute through the definition.
-  return subst(e.fn.expr, s);
+  return subst(e.fn.expr, s, a)
 
 
-def step(e):
+def step(e, a = inplace):
   assert isinstance(e, Expr)
   assert is_reducible(e)
 
   if type(e) is AndExpr:
-    return step_and(e)
+    return step_and(e, a)
 
   if type(e) is OrExpr:
-    return step_or(e)
+    return step_or(e, a)
 
   if type(e) is NotExpr:
-    return step_not(e)
+    return step_not(e, a)
 
   if type(e) is IfExpr:
-    return step_if(e)
+    return step_if(e, a)
 
   if type(e) is AppExpr:
-    return step_app(e)
+    return step_app(e, a)
 
   if type(e) is CallExpr:
-    return step_call(e)
+    return step_call(e, a)
 
   assert False
 
-def reduce(e):
+def reduce(e, a = inplace, q = None):
+  # Each step is a step of the quota q (see quota.py).
+  if q is None:
+    q = Quota()
   while not is_value(e):
-    e = step(e)
+    q.step()
+    e = step(e, a)
     print(e)
   return e
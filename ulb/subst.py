@@ -1,6 +1,7 @@
 from lang import *
+from annotate import *
 
-def subst(e, s):
+def subst(e, s, a = inplace):
   # Rewrite the expression 'e' by substituting references to variables
   # in 's' with their corresponding value.
   
@@ -10,33 +11,34 @@ def subst(e, s):
 
   if type(e) is AndExpr:
     # [x->s](e1 and e2) = [x->s]e1 and [x->s]e2
-    e1 = subst(e.lhs, s)
-    e2 = subst(e.rhs, s)
+    e1 = subst(e.lhs, s, a)
+    e2 = subst(e.rhs, s, a)
     return AndExpr(e1, e2)
 
   if type(e) is OrExpr:
     # [x->s](e1 or e2) = [x->s]e1 or [x->s]e2
-    e1 = subst(e.lhs, s)
-    e2 = subst(e.rhs, s)
+    e1 = subst(e.lhs, s, a)
+    e2 = subst(e.rhs, s, a)
     return OrExpr(e1, e2)
 
   if type(e) is NotExpr:
     # [x->s](not e1) = not [x->s]e1
-    e1 = subst(e.expr, s)
+    e1 = subst(e.expr, s, a)
     return NotExpr(e1)
 
   if type(e) is IfExpr:
     # [x->s](if e1 then e2 else e3) = if [x->s]e1 then [x->s]e2 else [x->s]e3
-    e1 = subst(e.cond, s)
-    e2 = subst(e.true, s)
-    e3 = subst(e.false, s)
+    e1 = subst(e.cond, s, a)
+    e2 = subst(e.true, s, a)
+    e3 = subst(e.false, s, a)
     return IfExpr(e1, e2, e3)
 
   if type(e) is IdExpr:
     # [x->s]x = v
     # [x->s]y = y (y != x)
-    if e.ref in s:
-      return s[e.ref]
+    d = a.ref(e)
+    if d in s:
+      return s[d]
     else:
       return e
 
@@ -48,24 +50,24 @@ def subst(e, s):
     #
     # Alternatively, we could create a new variable and redo 
     # resolution on the resulting expression.
-    e1 = subst(e.expr, s)
+    e1 = subst(e.expr, s, a)
     return AbsExpr(e.var, e1)
 
   if type(e) is AppExpr:
     # [x->s](e1 e2) = [x->s]e1 [x->s]e2
-    e1 = subst(e.lhs, s)
-    e2 = subst(e.rhs, s)
+    e1 = subst(e.lhs, s, a)
+    e2 = subst(e.rhs, s, a)
     return AppExpr(e1, e2)
 
   if type(e) is LambdaExpr:
     # [x->s]\(x1, x2, ...).e1 = \(x1, x2, ...).[x->s]e1
-    e1 = subst(e.expr, s)
+    e1 = subst(e.expr, s, a)
     return LambdaExpr(e.vars, e1)
 
   if type(e) is CallExpr:
     # [x->s]e0(e1, e2, ...)
-    e0 = subst(e.fn, s)
-    args = list(map(lambda x: subst(x, s), e.args))
+    e0 = subst(e.fn, s, a)
+    args = list(map(lambda x: subst(x, s, a), e.args))
     return CallExpr(e0, args)
 
   assert False
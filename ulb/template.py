@@ -0,0 +1,40 @@
+from lang import *
+
+# Programs are often written once (as a template) and then resolved
+# and evaluated many times. Because resolution binds identifiers in
+# place by default, each use needs its own copy of the template.
+#
+# Copying with copy.deepcopy is expensive: it goes through the generic
+# copy protocol for every object reachable from the tree.
+# instantiate_template copies only expressions and declarations and
+# shares everything else (i.e., names and literal values) with the
+# template.
+#
+# Note that sharing a tree between requests with a SideTable (see
+# annotate.py) avoids copying altogether.
+
+def copy_node(x, memo):
+  # Returns a copy of the expression or declaration x. The memo maps
+  # the ids of copied declarations to their copies so that bound
+  # identifiers refer to the new declarations.
+  if id(x) in memo:
+    return memo[id(x)]
+
+  y = object.__new__(type(x))
+  memo[id(x)] = y
+  for k, v in vars(x).items():
+    setattr(y, k, copy_value(v, memo))
+  return y
+
+def copy_value(v, memo):
+  # Copy an attribute value of a node.
+  if type(v) is list:
+    return [copy_value(x, memo) for x in v]
+  if isinstance(v, (Expr, VarDecl)):
+    return copy_node(v, memo)
+  return v
+
+def instantiate_template(e):
+  # Returns a fresh copy of the expression e that can be resolved
+  # independently of e.
+  return copy_node(e, {})
@@ -1,8 +1,7 @@
 
 from lang import *
-import copy
 
-clone = copy.deepcopy
+clone = instantiate_template
 
 # impl = \(p, q).(not p or q)
 impl = \
@@ -20,6 +19,13 @@ table = [
 #   print(evaluate(e))
 #   # reduce(e)
 
+# The same table, sharing a single tree. Each call keeps its bindings
+# in its own side table.
+for args in [[True, True], [True, False], [False, True], [False, False]]:
+  a = SideTable()
+  e = resolve(CallExpr(impl, args), [], a)
+  print(f"{e} = {evaluate(e, {}, a)}")
+
 ## Curry test
 
 # impl (true, _)
@@ -39,3 +45,34 @@ reduce(c)
 
 
 
+## Truth tables
+
+# The truth table of impl, evaluating its body once for all four rows.
+# Bit i is the value for row i, where p is bit 0 of i and q is bit 1.
+print(f"{impl}: {truth_table(impl):04b}")
+
+# Calls to other lambdas are evaluated once as well.
+# iff = \(p, q).(impl(p, q) and impl(q, p))
+iff = LambdaExpr(["p", "q"],
+  AndExpr(CallExpr(clone(impl), ["p", "q"]), CallExpr(clone(impl), ["q", "p"])))
+print(f"{iff}: {truth_table(iff):04b}")
+
+# Quotas bound the cost of evaluation. Omega never terminates, but it
+# is stopped once its calls are nested too deeply.
+omega = AbsExpr("x", AppExpr("x", "x"))
+try:
+  evaluate(resolve(AppExpr(omega, clone(omega))), {}, Annotations(), Quota(depth = 100))
+except QuotaExceeded as x:
+  print(f"{x.resource}: {x.steps} steps, depth {x.depth}")
+
+# With only a limit on steps, omega is stopped by it, provided that
+# its calls do not outgrow the Python stack first. Without a limit on
+# depth, that is a RecursionError rather than a quota.
+try:
+  evaluate(resolve(AppExpr(omega, clone(omega))), {}, Annotations(), Quota(steps = 1000))
+except QuotaExceeded as x:
+  print(f"{x.resource}: {x.steps} steps")
+try:
+  evaluate(resolve(AppExpr(omega, clone(omega))), {}, Annotations(), Quota(steps = 100000))
+except RecursionError:
+  print("recursion: no limit on depth")
@@ -0,0 +1,131 @@
+from lang import *
+from lookup import *
+from annotate import *
+from evaluate import Closure
+
+# This module computes the truth tables of boolean lambdas.
+#
+# The truth table of a lambda with n boolean parameters has 2^n rows.
+# Rather than call the lambda once per row, we evaluate its body once,
+# with each parameter bound to a bit vector (a Python int) holding its
+# value in every row. An 'and' of two such vectors computes the 'and'
+# for all rows at once:
+#
+#   p       = 1010
+#   q       = 1100
+#   not p   = 0101
+#   (not p) or q = 1101
+#
+# In row i, the k-th parameter is true when bit k of i is set, so for
+# \(p, q).e the rows are:
+#
+#   i   p     q
+#   0   false false
+#   1   true  false
+#   2   false true
+#   3   true  true
+#
+# The body may contain conditionals and calls (or applications) of
+# other lambdas. A call binds the parameters of the callee to the
+# vectors of its arguments and evaluates the callee's body in the same
+# way, so each call is evaluated once, not once per row. Lambdas are
+# represented by closures, as in evaluate(). The value of the body
+# must be boolean.
+#
+# The main function is truth_table, which returns the table as a bit
+# vector (an int) in which bit i is the value of the lambda in row i.
+
+def column(k, n):
+  # Returns the bit vector of the k-th of n parameters: bit i is set
+  # when bit k of i is set.
+  width = 1 << (k + 1)
+  bits = ((1 << (1 << k)) - 1) << (1 << k)
+  while width < (1 << n):
+    bits |= bits << width
+    width <<= 1
+  return bits
+
+def boolean(v):
+  # Returns v, which must be a bit vector.
+  if type(v) is not int:
+    raise Exception("expected a boolean value")
+  return v
+
+def vec_if(e, store, a, ones):
+  # Select the rows of each branch. Both branches must be boolean,
+  # since a closure cannot be split by rows.
+  c = boolean(vec(e.cond, store, a, ones))
+  t = boolean(vec(e.true, store, a, ones))
+  f = boolean(vec(e.false, store, a, ones))
+  return (c & t) | ((ones ^ c) & f)
+
+def vec_app(e, store, a, ones):
+  # Apply a closure to one argument vector.
+  c = vec(e.lhs, store, a, ones)
+  if type(c) is not Closure:
+    raise Exception("cannot apply a non-closure to an argument")
+  v = vec(e.rhs, store, a, ones)
+  return vec(c.abs.expr, {**c.env, c.abs.var: v}, a, ones)
+
+def vec_call(e, store, a, ones):
+  # Call a closure with a list of argument vectors.
+  c = vec(e.fn, store, a, ones)
+  if type(c) is not Closure:
+    raise Exception("cannot apply a non-closure to an argument")
+  env = dict(c.env)
+  for var, x in zip(c.abs.vars, e.args):
+    env[var] = vec(x, store, a, ones)
+  return vec(c.abs.expr, env, a, ones)
+
+def vec(e, store, a, ones):
+  # Evaluate e for every row. Boolean values are bit vectors, and ones
+  # is the vector that is true in every row.
+
+  if type(e) is BoolExpr:
+    return ones if e.val else 0
+
+  if type(e) is AndExpr:
+    return boolean(vec(e.lhs, store, a, ones)) & \
+           boolean(vec(e.rhs, store, a, ones))
+
+  if type(e) is OrExpr:
+    return boolean(vec(e.lhs, store, a, ones)) | \
+           boolean(vec(e.rhs, store, a, ones))
+
+  if type(e) is NotExpr:
+    return ones ^ boolean(vec(e.expr, store, a, ones))
+
+  if type(e) is IfExpr:
+    return vec_if(e, store, a, ones)
+
+  if type(e) is IdExpr:
+    return store[a.ref(e)]
+
+  if type(e) is AbsExpr or type(e) is LambdaExpr:
+    return Closure(e, store)
+
+  if type(e) is AppExpr:
+    return vec_app(e, store, a, ones)
+
+  if type(e) is CallExpr:
+    return vec_call(e, store, a, ones)
+
+  raise Exception(f"cannot evaluate {e}")
+
+def truth_table(fn):
+  # Returns the truth table of the lambda fn, whose parameters are
+  # boolean. The names in fn are resolved in a side table, so the tree
+  # is not modified.
+  if type(fn) is not LambdaExpr:
+    raise Exception("expected a lambda expression")
+  a = SideTable()
+  resolve(fn, [], a)
+
+  n = len(fn.vars)
+  ones = (1 << (1 << n)) - 1
+  store = {var: column(k, n) for k, var in enumerate(fn.vars)}
+  return boolean(vec(fn.expr, store, a, ones))
+
+def row(i, n):
+  # Returns the arguments of row i of a table with n parameters.
+  return [bool((i >> k) & 1) for k in range(n)]